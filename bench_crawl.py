@@ -0,0 +1,189 @@
+# /// script
+# requires-python = ">=3.13"
+# dependencies = [
+#     "beautifulsoup4>=4.14.3",
+#     "httpx>=0.28.1",
+#     "lxml>=6.0.2",
+#     "pyarrow>=22.0.0",
+#     "pyogrio>=0.11.1",
+# ]
+# [tool.uv]
+# exclude-newer = "2026-02-04T00:00:00Z"
+# ///
+
+"""
+End-to-end crawl throughput without the network: get_castles, get_palaces and get_pages_data run
+against pages recorded in a response archive (run the scrapers once with --archive to record them),
+served with an injected latency. Every source runs in its own process, so the peak RSS is its own,
+and in its own temporary directory, so nothing stored in .cache answers in place of the fetches.
+"""
+
+import argparse
+import asyncio
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import dictionary_cache
+import http_client
+import metrics
+import parsing
+import rate_control
+from parsing import BACKENDS
+from parser_pool import PARSE_WORKERS
+from response_archive import ARCHIVE_PATH, ReplayTransport, ResponseArchive
+
+
+SOURCES = ["zamkisp", "dworysp", "zamkinet"]
+# round trip of a typical detail page from the live sites
+LATENCY = 0.05
+BASELINE_PATH = Path("bench_baseline.json")
+# slower than the baseline by more than this fraction counts as a regression
+TOLERANCE = 0.2
+# metric, higher is better
+METRICS = {
+    "seconds": False,
+    "pages_per_second": True,
+    "parse_ms_per_page": False,
+    "peak_rss_mb": False,
+}
+
+
+def crawl(source: str, workers: int | None, parse_workers: int) -> int:
+    """Runs one source end to end, returns the number of rows."""
+    match source:
+        case "zamkisp":
+            import zamkisp
+
+            return len(asyncio.run(zamkisp.get_castles(workers=workers or zamkisp.DEFAULT_WORKERS, parse_workers=parse_workers)))
+        case "dworysp":
+            import dworysp
+
+            return len(asyncio.run(dworysp.get_palaces(workers=workers or dworysp.DEFAULT_WORKERS, parse_workers=parse_workers)))
+        case "zamkinet":
+            import zamkinet
+
+            return len(asyncio.run(zamkinet.get_pages_data(workers=workers or zamkinet.DEFAULT_WORKERS, parse_workers=parse_workers)))
+    raise ValueError(f"Unknown source: {source}")
+
+
+def run_source(source: str, recording: Path, latency: float, workers: int | None, parse_workers: int) -> dict:
+    transport = ReplayTransport(archive=ResponseArchive(path=recording, read_only=True), latency=latency)
+    http_client.TRANSPORT = transport
+    # the fetch path is what is measured, the cache would answer everything before the transport
+    http_client.USE_CACHE = False
+    # and the dictionaries are fetched every run, not read from a fresh copy
+    dictionary_cache.REFRESH = True
+    rate_control.CONTROLLERS.clear()
+    start = time.perf_counter()
+    rows = crawl(source=source, workers=workers, parse_workers=parse_workers)
+    seconds = time.perf_counter() - start
+    parse = metrics.METRICS.parse.values()
+    pages = sum(histogram.count for histogram in parse)
+    if transport.missing:
+        print(f"{source}: {len(transport.missing)} URLs not recorded, e.g. {transport.missing[0]}", file=sys.stderr)
+    return dict(
+        rows=rows,
+        pages=transport.served,
+        missing=len(transport.missing),
+        seconds=seconds,
+        pages_per_second=transport.served / seconds,
+        # as seen by the crawl, including the trip to a parser process
+        parse_ms_per_page=sum(histogram.total_ms for histogram in parse) / pages if pages else None,
+        # kilobytes on Linux
+        peak_rss_mb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    )
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Descriptions of the metrics worse than the baseline by more than tolerance."""
+    regressions = []
+    for source, result in results.items():
+        for metric, higher_is_better in METRICS.items():
+            before = baseline.get(source, {}).get(metric)
+            after = result.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(f"{source} {metric}: {before:.2f} -> {after:.2f} ({change:+.0%})")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recording", type=Path, default=ARCHIVE_PATH, help="response archive to serve the pages from")
+    parser.add_argument("--sources", nargs="*", choices=SOURCES, default=SOURCES)
+    parser.add_argument("--latency", type=float, default=LATENCY, help="seconds added to every response")
+    parser.add_argument("--workers", type=int, help="most pages fetched concurrently, defaults to each source's DEFAULT_WORKERS")
+    parser.add_argument("--parser", choices=BACKENDS, default=parsing.BACKEND, help="BeautifulSoup tree builder")
+    parser.add_argument("--parse-workers", type=int, default=PARSE_WORKERS)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH, help="results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--run-source", choices=SOURCES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    parsing.BACKEND = args.parser
+    if args.run_source:
+        result = run_source(
+            source=args.run_source,
+            recording=args.recording,
+            latency=args.latency,
+            workers=args.workers,
+            parse_workers=args.parse_workers,
+        )
+        print(json.dumps(result))
+        return
+    results = {}
+    for source in args.sources:
+        with tempfile.TemporaryDirectory() as directory:
+            completed = subprocess.run(
+                [
+                    sys.executable,
+                    Path(__file__).resolve(),
+                    f"--run-source={source}",
+                    f"--recording={args.recording.resolve()}",
+                    f"--latency={args.latency}",
+                    f"--parser={args.parser}",
+                    f"--parse-workers={args.parse_workers}",
+                ]
+                + ([f"--workers={args.workers}"] if args.workers is not None else []),
+                stdout=subprocess.PIPE,
+                text=True,
+                check=True,
+                cwd=directory,
+            )
+        # the scrapers print progress, the result is the last line
+        results[source] = json.loads(completed.stdout.strip().splitlines()[-1])
+    print(f"{'źródło':<10} {'wiersze':>8} {'strony':>7} {'s':>8} {'strony/s':>9} {'parse ms':>9} {'RSS MB':>8}")
+    for source, result in results.items():
+        parse_ms = f"{result['parse_ms_per_page']:.2f}" if result["parse_ms_per_page"] is not None else "-"
+        print(
+            f"{source:<10} {result['rows']:>8} {result['pages']:>7} {result['seconds']:>8.2f} "
+            f"{result['pages_per_second']:>9.1f} {parse_ms:>9} {result['peak_rss_mb']:>8.1f}"
+        )
+    settings = dict(latency=args.latency, workers=args.workers, parser=args.parser, parse_workers=args.parse_workers)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(dict(settings=settings, results=results), f, indent=2)
+        print(f"Saved baseline to {args.baseline}.")
+    elif args.baseline.exists():
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["settings"] != settings:
+            print(f"Baseline {args.baseline} was measured with {baseline['settings']}, not comparing.")
+            return
+        regressions = compare(results=results, baseline=baseline["results"], tolerance=args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# /// script
+# requires-python = ">=3.13"
+# dependencies = [
+#     "beautifulsoup4>=4.14.3",
+#     "httpx>=0.28.1",
+#     "lxml>=6.0.2",
+# ]
+# [tool.uv]
+# exclude-newer = "2026-02-04T00:00:00Z"
+# ///
+
+"""
+Parse time per page for every parsing backend, whole document vs scoped to the container the scrapers read.
+Pages are taken from the on-disk HTTP cache, so run any of the scrapers first.
+"""
+
+import argparse
+import json
+import re
+import sqlite3
+import time
+from pathlib import Path
+
+import httpx
+
+from http_cache import CACHE_PATH
+from parsing import BACKENDS, parse
+
+
+# page type, url pattern, what the scraper parses out of it
+PAGE_TYPES = [
+    ("zamkisp lista", re.compile(r"//zamkisp\.pl/.*view=(zamki|powiaty|gminy)&"), dict(id="main_full")),
+    ("zamkisp szczegóły", re.compile(r"//zamkisp\.pl/"), dict(id="main_full")),
+    ("dworysp lista", re.compile(r"//dworyipalace\.zamkisp\.pl/.*view=(dip|powiaty|gminy)&"), dict(id="ja-content")),
+    ("dworysp szczegóły", re.compile(r"//dworyipalace\.zamkisp\.pl/"), dict(id="userForm")),
+    ("zamkinet lista", re.compile(r"//zamki\.net\.pl/alfabetycznie\.php"), dict(class_="srodek-zp-srodek")),
+    ("zamkinet opis", re.compile(r"//zamki\.net\.pl/.*[?&]z=1"), dict(class_=["srodek-zp-gorap", "srodek-zp-srodek"])),
+    ("zamkinet lokalizacja", re.compile(r"//zamki\.net\.pl/.*[?&]z=2"), dict(id="licznik")),
+]
+
+
+def load_pages(path: Path, limit: int) -> dict[str, tuple[dict, list[str]]]:
+    pages = {name: (scope, []) for name, _, scope in PAGE_TYPES}
+    with sqlite3.connect(path) as connection:
+        for url, headers, body in connection.execute("select url, headers, body from responses"):
+            for name, pattern, _ in PAGE_TYPES:
+                if pattern.search(url):
+                    if len(pages[name][1]) < limit:
+                        response = httpx.Response(status_code=200, headers=json.loads(headers), content=body)
+                        pages[name][1].append(response.text)
+                    break
+    return {name: value for name, value in pages.items() if value[1]}
+
+
+def measure(markups: list[str], backend: str, scope: dict, repeat: int) -> float:
+    """Average milliseconds per page."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for markup in markups:
+            parse(markup=markup, backend=backend, **scope)
+    return (time.perf_counter() - start) * 1000 / (repeat * len(markups))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cache", type=Path, default=CACHE_PATH, help="HTTP cache to take the pages from")
+    parser.add_argument("--limit", type=int, default=50, help="pages per page type")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    pages = load_pages(path=args.cache, limit=args.limit)
+    if not pages:
+        print(f"No cached pages found in {args.cache}.")
+        return
+    print(f"{'typ strony':<22} {'stron':>6} {'backend':<12} {'cała strona ms':>15} {'zawężone ms':>12}")
+    for name, (scope, markups) in pages.items():
+        for backend in BACKENDS:
+            full = measure(markups=markups, backend=backend, scope={}, repeat=args.repeat)
+            scoped = measure(markups=markups, backend=backend, scope=scope, repeat=args.repeat)
+            print(f"{name:<22} {len(markups):>6} {backend:<12} {full:>15.2f} {scoped:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
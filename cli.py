@@ -0,0 +1,57 @@
+import argparse
+from pathlib import Path
+
+import dictionary_cache
+import http_client
+import parsing
+from geoexport import EXPORT_FORMATS
+from parser_pool import PARSE_WORKERS
+from parsing import BACKENDS
+from response_archive import ARCHIVE_PATH, get_replay_workers
+from sinks import FORMATS
+from snapshot import REFRESH_DAYS
+
+
+def add_common_arguments(parser: argparse.ArgumentParser, workers: int | None = None, zamkisp_pl: bool = True) -> None:
+    """
+    The flags shared by zamkisp.py, dworysp.py, zamkinet.py and crawl.py. --workers defaults to workers,
+    None leaves it to each source (crawl.py). zamkisp_pl adds the flags of the zamkisp.pl crawls.
+    """
+    workers_help = "most pages fetched concurrently per source" + (", defaults to each source's DEFAULT_WORKERS" if workers is None else "")
+    parser.add_argument("--workers", type=int, default=workers, help=workers_help)
+    parser.add_argument("--no-cache", action="store_true", help="do not use the on-disk HTTP cache")
+    parser.add_argument("--parser", choices=BACKENDS, default=parsing.BACKEND, help="BeautifulSoup tree builder")
+    parser.add_argument("--parse-workers", type=int, default=PARSE_WORKERS, help="processes parsing pages per source, 0 parses on the event loop")
+    if zamkisp_pl:
+        parser.add_argument("--refresh-days", type=int, default=REFRESH_DAYS, help="re-fetch entries updated this many days before the previous output")
+    parser.add_argument("--format", choices=FORMATS, default="geojson", help="output format, the sequence formats are written while crawling")
+    parser.add_argument("--wrap", action="store_true", help="also write a FeatureCollection after a sequence format")
+    parser.add_argument("--export", nargs="*", choices=EXPORT_FORMATS, default=[], help="also write typed columnar/indexed copies")
+    parser.add_argument("--resume", action="store_true", help="continue interrupted crawls from their journals")
+    parser.add_argument("--progress", type=float, default=0, help="print a progress line every this many seconds")
+    parser.add_argument("--archive", type=Path, nargs="?", const=ARCHIVE_PATH, help="append every fetched page to a response archive")
+    parser.add_argument("--replay", type=Path, nargs="?", const=ARCHIVE_PATH, help="parse the pages of a response archive instead of fetching them")
+    if zamkisp_pl:
+        parser.add_argument("--refresh-dictionaries", action="store_true", help="fetch powiaty/gminy even if the stored ones are fresh")
+
+
+def apply_common_arguments(args: argparse.Namespace) -> None:
+    """Sets the module flags from the parsed common arguments, and the workers of a replay."""
+    http_client.USE_CACHE = not args.no_cache
+    http_client.ARCHIVE = args.archive
+    http_client.REPLAY = args.replay
+    if args.replay is not None:
+        workers, args.parse_workers = get_replay_workers(workers=args.workers or 0, parse_workers=args.parse_workers)
+        if args.workers is not None:
+            args.workers = workers
+    dictionary_cache.REFRESH = getattr(args, "refresh_dictionaries", False)
+    parsing.BACKEND = args.parser
+
+
+def get_workers(args: argparse.Namespace, default: int) -> int:
+    """--workers, or default when it was left to each source, raised for a replay like get_replay_workers."""
+    if args.workers is not None:
+        return args.workers
+    if args.replay is not None:
+        return get_replay_workers(workers=default, parse_workers=args.parse_workers)[0]
+    return default
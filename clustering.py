@@ -0,0 +1,217 @@
+# /// script
+# requires-python = ">=3.13"
+# dependencies = [
+#     "numpy>=2.3.0",
+# ]
+# [tool.uv]
+# exclude-newer = "2026-02-04T00:00:00Z"
+# ///
+
+"""
+N-way conflation of any number of point sources, instead of the sp/net, result/Overture and
+dworysp/Overture joins of zamki.sql and dwory.sql. All points go into one spatial_index.GridIndex,
+every source queries it once for the points of the sources before it within the pair's distance
+(sources attached like Overture for the closest point of the others), and the pairs are merged
+into clusters with a union-find. Each cluster becomes one feature at the mean of its points, with
+the attributes of every source present in it.
+"""
+
+import argparse
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+from overture_index import read_gpkg_points
+from sinks import FORMATS, FeatureWriter, load_features
+from spatial_index import GridIndex
+
+
+DEFAULT_DISTANCE = 200.0
+# a pair is within the smaller distance of its two sources: 200 m between castles as in zamki.sql,
+# 100 m around palaces as in dwory.sql
+DISTANCES = {
+    "zamkisp": 200.0,
+    "zamkinet": 200.0,
+    "dworysp": 100.0,
+    "overture": 200.0,
+}
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class Source:
+    name: str
+    lon: np.ndarray
+    lat: np.ndarray
+    properties: list[dict]
+    distance: float = DEFAULT_DISTANCE
+    # sources only attached to clusters of the others, like Overture places, never make a cluster alone
+    attached: bool = False
+
+    def get_column(self, name: str) -> str:
+        """Output column of a property: prefixed with the source name unless it already is (overture_id)."""
+        return name if name.startswith(f"{self.name}_") else f"{self.name}_{name}"
+
+    def get_columns(self) -> list[str]:
+        names = dict.fromkeys(name for properties in self.properties for name in properties)
+        return [self.get_column(name) for name in names]
+
+
+class UnionFind:
+    """Disjoint sets of 0..size-1, with path halving and union by size."""
+
+    def __init__(self, size: int) -> None:
+        self.parent = list(range(size))
+        self.size = [1] * size
+
+    def find(self, i: int) -> int:
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, i: int, j: int) -> None:
+        i = self.find(i)
+        j = self.find(j)
+        if i == j:
+            return
+        if self.size[i] < self.size[j]:
+            i, j = j, i
+        self.parent[j] = i
+        self.size[i] += self.size[j]
+
+    def roots(self) -> np.ndarray:
+        return np.array([self.find(i) for i in range(len(self.parent))], dtype=np.int64)
+
+
+def load_source(name: str, path: Path, attached: bool = False) -> Source:
+    """A source from any of the sinks formats or a GeoPackage, its located points only."""
+    if path.suffix == ".gpkg":
+        lon, lat, properties = read_gpkg_points(path)
+    else:
+        features = [feature for feature in load_features(path) if feature.get("geometry")]
+        coordinates = np.array([feature["geometry"]["coordinates"][:2] for feature in features], dtype=np.float64).reshape(-1, 2)
+        lon, lat = coordinates[:, 0], coordinates[:, 1]
+        properties = [feature["properties"] for feature in features]
+    located = np.isfinite(lon) & np.isfinite(lat)
+    print(f"{name}: {int(located.sum())} points from {path}.")
+    return Source(
+        name=name,
+        lon=lon[located],
+        lat=lat[located],
+        properties=[p for p, keep in zip(properties, located.tolist()) if keep],
+        distance=DISTANCES.get(name, DEFAULT_DISTANCE),
+        attached=attached,
+    )
+
+
+def find_clusters(sources: list[Source]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Source index and cluster root of every point, the points of all sources one after another.
+    Points of one source are never paired directly, though a cluster may hold several through others.
+    Points of attached sources are paired with their closest point of the others only.
+    """
+    source_ids = np.concatenate([np.full(len(source.lon), s, dtype=np.int64) for s, source in enumerate(sources)])
+    lon = np.concatenate([source.lon for source in sources])
+    lat = np.concatenate([source.lat for source in sources])
+    distances = np.array([source.distance for source in sources], dtype=np.float64)
+    attached = np.array([source.attached for source in sources], dtype=bool)
+    offsets = np.concatenate([[0], np.cumsum([len(source.lon) for source in sources])])
+    index = GridIndex(lon=lon, lat=lat, cell_size=float(distances.max()) if len(sources) else DEFAULT_DISTANCE)
+    clusters = UnionFind(len(lon))
+    for s, source in enumerate(sources):
+        # one pass per source, against the sources before it, or all of the others for an attached one
+        points, queries, pair_distances = index.query_radius(lon=source.lon, lat=source.lat, radius=source.distance)
+        other = source_ids[points]
+        candidates = ~attached[other] & (other < s if not source.attached else True)
+        within = np.flatnonzero(candidates & (pair_distances <= np.minimum(distances[other], source.distance)))
+        if source.attached:
+            # only to the closest point, so attached points never chain clusters together
+            within = within[np.lexsort((pair_distances[within], queries[within]))]
+            within = within[np.unique(queries[within], return_index=True)[1]]
+        for i, j in zip(points[within].tolist(), (queries[within] + offsets[s]).tolist()):
+            clusters.union(i, j)
+    return source_ids, clusters.roots()
+
+
+def to_cluster_features(sources: list[Source], source_ids: np.ndarray, roots: np.ndarray) -> Iterable[dict]:
+    """
+    A feature per cluster with a point of a not attached source, in the order of their first points.
+    Per source it carries the number of its points and the properties of the one closest to the cluster's centre.
+    """
+    lon = np.concatenate([source.lon for source in sources])
+    lat = np.concatenate([source.lat for source in sources])
+    offsets = np.concatenate([[0], np.cumsum([len(source.lon) for source in sources])]).tolist()
+    columns = {source.name: source.get_columns() for source in sources}
+    # points grouped by cluster, in their order within each group
+    order = np.lexsort((np.arange(len(roots)), roots))
+    starts = np.flatnonzero(np.diff(roots[order], prepend=-1))
+    groups = sorted(np.split(order, starts[1:]) if len(order) else [], key=lambda group: group[0])
+    cluster_id = 0
+    for members in groups:
+        member_sources = source_ids[members]
+        if all(sources[s].attached for s in member_sources.tolist()):
+            continue
+        center_lon = float(lon[members].mean())
+        center_lat = float(lat[members].mean())
+        # closeness in degrees is enough to pick the central point of a cluster this small
+        closeness = (lon[members] - center_lon) ** 2 + (lat[members] - center_lat) ** 2
+        properties = dict(
+            klaster_id=cluster_id,
+            zrodla=", ".join(source.name for s, source in enumerate(sources) if s in member_sources),
+        )
+        for s, source in enumerate(sources):
+            in_source = member_sources == s
+            properties[f"liczba_{source.name}"] = int(in_source.sum())
+            values = dict.fromkeys(columns[source.name])
+            if in_source.any():
+                central = int(members[in_source][np.argmin(closeness[in_source])]) - offsets[s]
+                values.update({source.get_column(k): v for k, v in source.properties[central].items()})
+            properties.update(values)
+        cluster_id += 1
+        yield dict(
+            type="Feature",
+            properties=properties,
+            geometry=dict(
+                type="Point",
+                coordinates=[center_lon, center_lat],
+            ),
+        )
+
+
+def parse_source(value: str) -> tuple[str, Path]:
+    name, separator, path = value.partition("=")
+    if not separator or not name or not path:
+        raise argparse.ArgumentTypeError(f"Expected NAME=PATH, got: {value}")
+    return name, Path(path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", type=parse_source, action="append", default=[], metavar="NAME=PATH", help="e.g. zamkisp=zamkisp_2026-02-16.geojson")
+    parser.add_argument("--attach", type=parse_source, action="append", default=[], metavar="NAME=PATH", help="source only attached to clusters of the others, e.g. overture=overture_places_2026-01-21.gpkg")
+    parser.add_argument("--format", choices=FORMATS, default="geojson")
+    parser.add_argument("--output", type=Path, help="defaults to klastry_<today>")
+    args = parser.parse_args()
+    if not args.source:
+        parser.error("at least one --source is needed")
+    names = [name for name, _ in args.source + args.attach]
+    if len(set(names)) != len(names):
+        parser.error("source names must be unique")
+    sources = [load_source(name=name, path=path) for name, path in args.source]
+    sources += [load_source(name=name, path=path, attached=True) for name, path in args.attach]
+    source_ids, roots = find_clusters(sources)
+    output_path = args.output or Path(f"klastry_{date.today().isoformat()}{FORMATS[args.format]}")
+    count = 0
+    with FeatureWriter(path=output_path, format=args.format) as writer:
+        for feature in to_cluster_features(sources=sources, source_ids=source_ids, roots=roots):
+            writer.write(feature)
+            count += 1
+    print(f"Written {count} clusters of {len(roots)} points to {output_path}.")
+
+
+if __name__ == "__main__":
+    main()
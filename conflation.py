@@ -0,0 +1,352 @@
+# /// script
+# requires-python = ">=3.13"
+# dependencies = [
+#     "numpy>=2.3.0",
+# ]
+# [tool.uv]
+# exclude-newer = "2026-02-04T00:00:00Z"
+# ///
+
+"""
+Conflation of zamkisp and zamkinet outputs, the Python counterpart of the castles table in zamki.sql.
+Points are bucketed into a spatial_index.GridIndex with cells as large as the match distance,
+so only points in neighbouring cells are compared instead of every pair.
+
+With --match names pairs are scored by distance and by the similarity of their names instead, and
+every feature is matched at most once, the best scored pairs first. Candidates are the pairs within
+the match distance and those sharing name n-grams within --name-distance, found in an inverted index
+of n-grams per grid cell, so close namesakes are matched even when their coordinates disagree.
+"""
+
+import argparse
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+from overture_index import OvertureIndex, attach_nearest
+from sinks import FORMATS, FeatureWriter, load_features
+from spatial_index import GridIndex, get_cell_span, haversine
+
+
+MATCH_DISTANCE = 200.0
+# zamki.sql attaches Overture places within the same distance as the sp/net match
+OVERTURE_DISTANCE = 200.0
+
+# columns of the castles table, in the order of zamki.sql
+CASTLE_COLUMNS = [
+    "nazwa_sp",
+    "nazwa_net",
+    "url_sp",
+    "url_net",
+    "zamek_id_sp",
+    "wojewodztwo",
+    "powiat",
+    "gmina",
+    "typ_oryginalny",
+    "typ_interpretowany",
+    "data_wprowadzenia",
+    "data_aktualizacji",
+    "opis",
+    "stan_tekst",
+    "stan_opis",
+    "wstep",
+    "parking",
+    "trudnosc_odnalezienia_skala",
+    "trudnosc_odnalezienia_tekst",
+    "trudnosc_odnalezienia_opis",
+    "trudnosc_dojscia_skala",
+    "trudnosc_dojscia_tekst",
+    "trudnosc_dojscia_opis",
+    "ocena_skala",
+    "ocena_tekst",
+    "ocena_opis",
+]
+MATCH_MODES = ["distance", "names"]
+# name matches are looked for this far apart
+NAME_DISTANCE = 2000.0
+NGRAM_SIZE = 3
+# confidence = NAME_WEIGHT * name similarity + (1 - NAME_WEIGHT) * (1 - distance / name distance)
+NAME_WEIGHT = 0.6
+# above 1 - NAME_WEIGHT, so no pair is matched on distance alone
+MIN_CONFIDENCE = 0.5
+# letters NFKD does not decompose into a base letter and a diacritic
+FOLDED_LETTERS = str.maketrans({"ł": "l"})
+RE_NOT_ALNUM = re.compile(r"[^0-9a-z]+")
+SP_RENAMES = {"nazwa": "nazwa_sp", "url": "url_sp", "zamek_id": "zamek_id_sp"}
+NET_RENAMES = {"nazwa": "nazwa_net", "url": "url_net"}
+
+
+def get_coordinates(features: list[dict]) -> tuple[np.ndarray, np.ndarray]:
+    coordinates = np.array([feature["geometry"]["coordinates"][:2] for feature in features], dtype=np.float64).reshape(-1, 2)
+    return coordinates[:, 0], coordinates[:, 1]
+
+
+def find_pairs(
+    lon_a: np.ndarray,
+    lat_a: np.ndarray,
+    lon_b: np.ndarray,
+    lat_b: np.ndarray,
+    distance: float,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """All pairs (index in a, index in b, distance) not further apart than distance meters."""
+    index = GridIndex(lon=lon_a, lat=lat_a, cell_size=distance)
+    return index.query_radius(lon=lon_b, lat=lat_b, radius=distance)
+
+
+def distinct_on_geometry(features: list[dict]) -> list[dict]:
+    """Keeps the first feature of each exact location, like `select distinct on(geom)`."""
+    seen = set()
+    result = []
+    for feature in features:
+        key = tuple(feature["geometry"]["coordinates"])
+        if key not in seen:
+            seen.add(key)
+            result.append(feature)
+    return result
+
+
+def fold_name(name: str | None) -> str:
+    """Lowercase name without diacritics and punctuation, e.g. "Piotrków Tryb.I z.Byki" -> "piotrkow tryb i z byki"."""
+    if not name:
+        return ""
+    name = unicodedata.normalize("NFKD", name.lower().translate(FOLDED_LETTERS))
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    return RE_NOT_ALNUM.sub(" ", name).strip()
+
+
+def get_ngrams(name: str | None, size: int = NGRAM_SIZE) -> frozenset[str]:
+    """Character n-grams of the folded name, padded so that word starts and ends count too."""
+    folded = fold_name(name)
+    if not folded:
+        return frozenset()
+    padded = f" {folded} "
+    return frozenset(padded[i:i + size] for i in range(len(padded) - size + 1))
+
+
+def name_similarity(shared: int, count_a: int, count_b: int) -> float:
+    """
+    Mean of the Dice and overlap coefficients of two n-gram sets, so that a name contained in the
+    other (e.g. "Lipowiec" in "Babice - Zamek Lipowiec") still scores high.
+    """
+    if not shared:
+        return 0.0
+    return (2 * shared / (count_a + count_b) + shared / min(count_a, count_b)) / 2
+
+
+class NgramIndex:
+    """
+    Inverted index of name n-grams per grid cell: (cell x, cell y, n-gram) -> features. The cells are
+    at least distance wide, so a query looking at the 3x3 cells around a point finds every feature
+    within distance sharing an n-gram with it, counting the n-grams shared.
+    """
+
+    def __init__(self, ngrams: list[frozenset[str]], lon: np.ndarray, lat: np.ndarray, cell_lon: float, cell_lat: float) -> None:
+        self.cell_lon = cell_lon
+        self.cell_lat = cell_lat
+        self.postings: dict[tuple[int, int, str], list[int]] = defaultdict(list)
+        for i, (cell_x, cell_y) in enumerate(self.get_cells(lon, lat)):
+            for ngram in ngrams[i]:
+                self.postings[(cell_x, cell_y, ngram)].append(i)
+
+    def get_cells(self, lon: np.ndarray, lat: np.ndarray) -> list[tuple[int, int]]:
+        cell_x = np.floor(lon / self.cell_lon).astype(np.int64).tolist()
+        cell_y = np.floor(lat / self.cell_lat).astype(np.int64).tolist()
+        return list(zip(cell_x, cell_y))
+
+    def query(self, ngrams: list[frozenset[str]], lon: np.ndarray, lat: np.ndarray) -> dict[tuple[int, int], int]:
+        """(index of indexed feature, index of query feature) -> n-grams shared, for the features sharing any."""
+        shared = Counter()
+        for j, (cell_x, cell_y) in enumerate(self.get_cells(lon, lat)):
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    for ngram in ngrams[j]:
+                        for i in self.postings.get((cell_x + dx, cell_y + dy, ngram), ()):
+                            shared[(i, j)] += 1
+        return shared
+
+
+def match_by_distance(
+    lon_sp: np.ndarray,
+    lat_sp: np.ndarray,
+    lon_net: np.ndarray,
+    lat_net: np.ndarray,
+    distance: float,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray | None]:
+    """Every pair within distance, like zamki.sql, without a confidence."""
+    index_sp, index_net, _ = find_pairs(lon_a=lon_sp, lat_a=lat_sp, lon_b=lon_net, lat_b=lat_net, distance=distance)
+    return index_sp, index_net, None
+
+
+def match_by_name(
+    sp: list[dict],
+    net: list[dict],
+    lon_sp: np.ndarray,
+    lat_sp: np.ndarray,
+    lon_net: np.ndarray,
+    lat_net: np.ndarray,
+    distance: float,
+    name_distance: float = NAME_DISTANCE,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    One-to-one pairs by confidence, from the candidates within distance or sharing name n-grams
+    within name_distance, best first; pairs below MIN_CONFIDENCE are left unmatched, so a pair always
+    needs similar names, however close.
+    """
+    ngrams_sp = [get_ngrams(feature["properties"].get("nazwa")) for feature in sp]
+    ngrams_net = [get_ngrams(feature["properties"].get("nazwa")) for feature in net]
+    cell_lon, cell_lat = get_cell_span(lat=np.concatenate([lat_sp, lat_net]), distance=max(distance, name_distance))
+    shared = NgramIndex(ngrams=ngrams_sp, lon=lon_sp, lat=lat_sp, cell_lon=cell_lon, cell_lat=cell_lat).query(
+        ngrams=ngrams_net, lon=lon_net, lat=lat_net
+    )
+    # close pairs are scored even without a shared n-gram, but distance alone weighs at most
+    # 1 - NAME_WEIGHT < MIN_CONFIDENCE, so they are only accepted with a name match too
+    index_sp, index_net, _ = find_pairs(lon_a=lon_sp, lat_a=lat_sp, lon_b=lon_net, lat_b=lat_net, distance=distance)
+    for i, j in zip(index_sp.tolist(), index_net.tolist()):
+        shared.setdefault((i, j), len(ngrams_sp[i] & ngrams_net[j]))
+    if not shared:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.float64)
+    pairs = np.array(list(shared), dtype=np.int64)
+    index_sp, index_net = pairs[:, 0], pairs[:, 1]
+    distances = haversine(lon_sp[index_sp], lat_sp[index_sp], lon_net[index_net], lat_net[index_net])
+    similarity = np.array(
+        [name_similarity(count, len(ngrams_sp[i]), len(ngrams_net[j])) for (i, j), count in shared.items()],
+        dtype=np.float64,
+    )
+    confidence = NAME_WEIGHT * similarity + (1 - NAME_WEIGHT) * np.clip(1 - distances / name_distance, 0, 1)
+    candidates = np.flatnonzero((confidence >= MIN_CONFIDENCE) & (distances <= max(distance, name_distance)))
+    # best first, ties in the order of the features
+    candidates = candidates[np.lexsort((index_net[candidates], index_sp[candidates], -confidence[candidates]))]
+    matched_sp = set()
+    matched_net = set()
+    accepted = []
+    for k, i, j in zip(candidates.tolist(), index_sp[candidates].tolist(), index_net[candidates].tolist()):
+        if i not in matched_sp and j not in matched_net:
+            matched_sp.add(i)
+            matched_net.add(j)
+            accepted.append(k)
+    accepted = np.array(sorted(accepted, key=lambda k: (index_sp[k], index_net[k])), dtype=np.int64)
+    return index_sp[accepted], index_net[accepted], np.round(confidence[accepted], 3)
+
+
+def get_ckkp_status(properties: dict) -> str | None:
+    if properties.get("typ_interpretowany") == "zniszczony" or properties.get("stan_tekst") == "Brak śladów":
+        return "odrzucony"
+    return None
+
+
+def to_castle_feature(properties: dict, lon: float, lat: float, confidence: float | None = None) -> dict:
+    properties = {column: properties.get(column) for column in CASTLE_COLUMNS}
+    properties["ckkp_status"] = get_ckkp_status(properties)
+    if confidence is not None:
+        properties["pewnosc_dopasowania"] = confidence
+    return dict(
+        type="Feature",
+        properties=properties,
+        geometry=dict(
+            type="Point",
+            coordinates=[lon, lat],
+        ),
+    )
+
+
+def conflate_castles(
+    sp: list[dict],
+    net: list[dict],
+    distance: float = MATCH_DISTANCE,
+    match: str = "distance",
+    name_distance: float = NAME_DISTANCE,
+) -> list[dict]:
+    """
+    Every matched sp/net pair becomes one feature at their midpoint carrying the attributes of both,
+    unmatched features of either source are kept with their own attributes. By distance every pair
+    within distance is matched, by names see match_by_name; those features get their confidence.
+    """
+    sp = distinct_on_geometry(sp)
+    net = distinct_on_geometry(net)
+    lon_sp, lat_sp = get_coordinates(sp)
+    lon_net, lat_net = get_coordinates(net)
+    match match:
+        case "distance":
+            index_sp, index_net, confidence = match_by_distance(
+                lon_sp=lon_sp, lat_sp=lat_sp, lon_net=lon_net, lat_net=lat_net, distance=distance
+            )
+        case "names":
+            index_sp, index_net, confidence = match_by_name(
+                sp=sp,
+                net=net,
+                lon_sp=lon_sp,
+                lat_sp=lat_sp,
+                lon_net=lon_net,
+                lat_net=lat_net,
+                distance=distance,
+                name_distance=name_distance,
+            )
+        case _:
+            raise ValueError(f"Unknown match mode: {match}")
+    results = []
+    for pair_no, (i, j) in enumerate(zip(index_sp.tolist(), index_net.tolist())):
+        properties = {
+            **{SP_RENAMES.get(k, k): v for k, v in sp[i]["properties"].items()},
+            **{NET_RENAMES.get(k, k): v for k, v in net[j]["properties"].items()},
+        }
+        # st_centroid of the two points, in degrees like in the SQL
+        results.append(
+            to_castle_feature(
+                properties=properties,
+                lon=(lon_sp[i] + lon_net[j]) / 2,
+                lat=(lat_sp[i] + lat_net[j]) / 2,
+                confidence=float(confidence[pair_no]) if confidence is not None else None,
+            )
+        )
+    matched_sp = set(index_sp.tolist())
+    matched_net = set(index_net.tolist())
+    for i, feature in enumerate(sp):
+        if i not in matched_sp:
+            properties = {SP_RENAMES.get(k, k): v for k, v in feature["properties"].items()}
+            results.append(to_castle_feature(properties=properties, lon=lon_sp[i], lat=lat_sp[i]))
+    for j, feature in enumerate(net):
+        if j not in matched_net:
+            properties = {NET_RENAMES.get(k, k): v for k, v in feature["properties"].items()}
+            results.append(to_castle_feature(properties=properties, lon=lon_net[j], lat=lat_net[j]))
+    print(
+        f"Matched {len(index_sp)} pairs, not matched: {len(sp) - len(matched_sp)} from zamkisp, "
+        f"{len(net) - len(matched_net)} from zamkinet."
+    )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sp", type=Path, required=True, help="zamkisp output")
+    parser.add_argument("--net", type=Path, required=True, help="zamkinet output")
+    parser.add_argument("--distance", type=float, default=MATCH_DISTANCE, help="match distance in meters")
+    parser.add_argument("--match", choices=MATCH_MODES, default="distance", help="every pair within distance, or scored by distance and names")
+    parser.add_argument("--name-distance", type=float, default=NAME_DISTANCE, help="how far apart --match names pairs namesakes, in meters")
+    parser.add_argument("--format", choices=FORMATS, default="geojson")
+    parser.add_argument("--output", type=Path, help="defaults to zamki_deduplikowane_<today>")
+    parser.add_argument("--overture", type=Path, help="Overture places GeoPackage, attaches the closest place to every castle")
+    args = parser.parse_args()
+    output_path = args.output or Path(f"zamki_deduplikowane_{date.today().isoformat()}{FORMATS[args.format]}")
+    castles = conflate_castles(
+        sp=load_features(args.sp),
+        net=load_features(args.net),
+        distance=args.distance,
+        match=args.match,
+        name_distance=args.name_distance,
+    )
+    if args.overture:
+        overture_index = OvertureIndex.load_or_build(source=args.overture)
+        castles = attach_nearest(features=castles, overture_index=overture_index, radius=OVERTURE_DISTANCE)
+    with FeatureWriter(path=output_path, format=args.format) as writer:
+        for feature in castles:
+            writer.write(feature)
+    print(f"Written {len(castles)} castles to {output_path}.")
+
+
+if __name__ == "__main__":
+    main()
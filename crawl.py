@@ -0,0 +1,176 @@
+# /// script
+# requires-python = ">=3.13"
+# dependencies = [
+#     "beautifulsoup4>=4.14.3",
+#     "duckdb>=1.4.0",
+#     "httpx[http2]>=0.28.1",
+#     "lxml>=6.0.2",
+#     "pyarrow>=22.0.0",
+#     "pyogrio>=0.11.1",
+# ]
+# [tool.uv]
+# exclude-newer = "2026-02-04T00:00:00Z"
+# ///
+
+"""
+Crawls any of zamkisp, dworysp and zamkinet concurrently in one event loop, writing the same
+outputs as the separate scripts. Clients are shared per host through a ClientPool, zamkisp and
+dworysp load their powiaty/gminy dictionaries side by side and share one rate_control budget,
+so a full refresh takes about as long as its slowest source.
+"""
+
+import argparse
+import asyncio
+from datetime import date
+from pathlib import Path
+
+import duckdb_conflation
+import dworysp
+import zamkinet
+import zamkisp
+from cli import add_common_arguments, apply_common_arguments, get_workers
+from geoexport import export
+from http_client import ClientPool
+from journal import JOURNAL_DIR, CrawlJournal
+from metrics import METRICS
+from overture_index import OVERTURE_PATH
+from record_store import RecordStore
+from sinks import FORMATS, FeatureWriter, wrap_feature_collection
+from snapshot import Snapshot, load_snapshot, save_fingerprints
+
+
+SOURCES = {
+    "zamkisp": zamkisp,
+    "dworysp": dworysp,
+    "zamkinet": zamkinet,
+}
+# property identifying the features of a --since snapshot, zamkinet is always crawled whole
+SNAPSHOT_IDS = {
+    "zamkisp": "zamek_id",
+    "dworysp": "dwor_id_sp",
+}
+
+
+def load_snapshots(paths: list[Path]) -> dict[str, Snapshot]:
+    """Previous outputs by source, told apart by their file names (e.g. dworysp_2026-02-19.geojson)."""
+    snapshots = {}
+    for path in paths:
+        source = next((source for source in SNAPSHOT_IDS if path.name.startswith(f"{source}_")), None)
+        if source is None:
+            raise ValueError(f"Cannot tell the source of snapshot {path}, expected one of: {', '.join(SNAPSHOT_IDS)}")
+        snapshots[source] = load_snapshot(path=path, id_property=SNAPSHOT_IDS[source])
+    return snapshots
+
+
+async def crawl_source(source: str, args: argparse.Namespace, snapshot: Snapshot | None, clients: ClientPool) -> RecordStore:
+    module = SOURCES[source]
+    workers = get_workers(args, default=module.DEFAULT_WORKERS)
+    output_path = Path(f"{source}_{date.today().isoformat()}{FORMATS[args.format]}")
+    streaming = args.format != "geojson"
+    # the rows as columns, the only copy kept once they are written
+    store = RecordStore(column_types=module.COLUMN_TYPES)
+    # dworysp's listing fingerprints, saved next to the output for the next crawl --since it
+    fingerprints = {}
+
+    def write_row(writer: FeatureWriter, row: object) -> None:
+        feature = module.to_feature(row)
+        writer.write(feature)
+        if args.export or args.conflate:
+            store.append(feature)
+
+    with CrawlJournal(path=JOURNAL_DIR / f"{source}.journal.sqlite", resume=args.resume) as journal:
+        with FeatureWriter(path=output_path, format=args.format) as writer:
+            on_row = (lambda row: write_row(writer, row)) if streaming else None
+            match source:
+                case "zamkisp":
+                    result = await zamkisp.get_castles(
+                        workers=workers,
+                        snapshot=snapshot,
+                        refresh_days=args.refresh_days,
+                        parse_workers=args.parse_workers,
+                        on_row=on_row,
+                        journal=journal,
+                        clients=clients,
+                    )
+                case "dworysp":
+                    result = await dworysp.get_palaces(
+                        workers=workers,
+                        snapshot=snapshot,
+                        refresh_days=args.refresh_days,
+                        parse_workers=args.parse_workers,
+                        on_row=on_row,
+                        journal=journal,
+                        clients=clients,
+                        fingerprints=fingerprints,
+                    )
+                case "zamkinet":
+                    result = await zamkinet.get_pages_data(
+                        workers=workers,
+                        parse_workers=args.parse_workers,
+                        on_row=on_row,
+                        journal=journal,
+                        clients=clients,
+                    )
+            # streamed rows were written by on_row, only their number comes back
+            count = result if streaming else len(result)
+            if not streaming:
+                for row in result:
+                    write_row(writer, row)
+                # the FeatureCollection needed the rows sorted, export and conflation only need the store
+                result.clear()
+    print(f"{source}: written {count} rows to {output_path}.")
+    if source == "dworysp":
+        save_fingerprints(output_path, fingerprints)
+    # file work off the event loop, the other sources may still be crawling
+    if streaming and args.wrap:
+        await asyncio.to_thread(wrap_feature_collection, path=output_path, output_path=output_path.with_suffix(".geojson"))
+        if source == "dworysp":
+            save_fingerprints(output_path.with_suffix(".geojson"), fingerprints)
+    if args.export:
+        await asyncio.to_thread(export, store=store, path=output_path, formats=args.export)
+    return store
+
+
+async def crawl(sources: list[str], args: argparse.Namespace, snapshots: dict[str, Snapshot]) -> dict[str, RecordStore]:
+    """The rows of every source, kept only with --export or --conflate."""
+    async with ClientPool() as clients:
+        async with asyncio.TaskGroup() as tg:
+            tasks = {
+                source: tg.create_task(crawl_source(source=source, args=args, snapshot=snapshots.get(source), clients=clients))
+                for source in sources
+            }
+    return {source: task.result() for source, task in tasks.items()}
+
+
+def conflate(stores: dict[str, RecordStore], overture: Path) -> None:
+    """Castles from zamkisp and zamkinet, palaces from dworysp, whichever were crawled."""
+    with duckdb_conflation.connect(overture=overture) as connection:
+        if "zamkisp" in stores and "zamkinet" in stores:
+            duckdb_conflation.register_store(connection=connection, name="sp", store=stores["zamkisp"])
+            duckdb_conflation.register_store(connection=connection, name="net", store=stores["zamkinet"])
+            duckdb_conflation.conflate_castles(connection=connection, path=duckdb_conflation.get_castles_path())
+        if "dworysp" in stores:
+            duckdb_conflation.register_store(connection=connection, name="dwory", store=stores["dworysp"])
+            duckdb_conflation.conflate_palaces(connection=connection, path=duckdb_conflation.get_palaces_path())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sources", nargs="*", choices=SOURCES, default=list(SOURCES))
+    add_common_arguments(parser)
+    parser.add_argument("--since", type=Path, nargs="*", default=[], help="previous zamkisp/dworysp outputs, unchanged entries are carried forward")
+    parser.add_argument("--conflate", action="store_true", help="then build the deduplicated castles/palaces GeoPackages in-process")
+    parser.add_argument("--overture", type=Path, default=OVERTURE_PATH, help="Overture places GeoPackage for --conflate")
+    args = parser.parse_args()
+    apply_common_arguments(args)
+    snapshots = load_snapshots(args.since)
+    with METRICS.progress(args.progress):
+        stores = asyncio.run(crawl(sources=args.sources, args=args, snapshots=snapshots))
+    METRICS.write_summary(Path(f"crawl_{date.today().isoformat()}.metrics.json"))
+    if args.conflate:
+        conflate(stores=stores, overture=args.overture)
+    print("Done.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import json
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+
+DICTIONARY_DIR = Path(".cache")
+# powiaty and gminy change with administrative reforms, not between crawls
+DICTIONARY_TTL = 30 * 24 * 60 * 60
+# set from the command line of the scripts to fetch the dictionaries even when the stored ones are fresh
+REFRESH = False
+
+CountyDict = dict[tuple[str, str], str]
+MunicipalityDict = dict[tuple[str, str, str], str]
+
+
+def load_dictionaries(path: Path) -> tuple[float, CountyDict, MunicipalityDict] | None:
+    """Time the stored dictionaries were fetched and the dictionaries, None if nothing is stored."""
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        stored = json.load(f)
+    county_dict = {(kod_woj, kod_pow): nazwa for kod_woj, kod_pow, nazwa in stored["counties"]}
+    municipality_dict = {
+        (kod_woj, kod_pow, kod_gmi): nazwa for kod_woj, kod_pow, kod_gmi, nazwa in stored["municipalities"]
+    }
+    return stored["fetched_at"], county_dict, municipality_dict
+
+
+def save_dictionaries(path: Path, county_dict: CountyDict, municipality_dict: MunicipalityDict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    stored = dict(
+        fetched_at=time.time(),
+        counties=[[*key, nazwa] for key, nazwa in county_dict.items()],
+        municipalities=[[*key, nazwa] for key, nazwa in municipality_dict.items()],
+    )
+    # written aside and renamed, so a crash never leaves half a file behind
+    temporary_path = path.with_suffix(".tmp")
+    with open(temporary_path, "w", encoding="utf-8") as f:
+        json.dump(stored, f, ensure_ascii=False)
+    temporary_path.replace(path)
+
+
+async def get_cached_dictionaries(
+    source: str,
+    fetch: Callable[[], Awaitable[tuple[CountyDict, MunicipalityDict]]],
+    ttl: float = DICTIONARY_TTL,
+) -> tuple[CountyDict, MunicipalityDict]:
+    """
+    The powiaty/gminy dictionaries of source from disk while younger than ttl (unless REFRESH),
+    fetched and stored otherwise. When fetching fails or comes back empty the stored ones are
+    used whatever their age, only without any stored dictionaries the error is raised.
+    """
+    path = DICTIONARY_DIR / f"{source}.dictionaries.json"
+    stored = load_dictionaries(path)
+    if stored is not None and not REFRESH and time.time() - stored[0] < ttl:
+        print(f"Wczytano słowniki {source} z {path}.")
+        return stored[1], stored[2]
+    try:
+        county_dict, municipality_dict = await fetch()
+        if not county_dict or not municipality_dict:
+            raise ValueError(f"Empty dictionaries fetched for {source}.")
+    except Exception as e:
+        if stored is None:
+            raise
+        print(f"Fetching the dictionaries of {source} failed ({e!r}), using the ones stored in {path}.")
+        return stored[1], stored[2]
+    save_dictionaries(path=path, county_dict=county_dict, municipality_dict=municipality_dict)
+    return county_dict, municipality_dict
@@ -0,0 +1,270 @@
+# /// script
+# requires-python = ">=3.13"
+# dependencies = [
+#     "duckdb>=1.4.0",
+#     "numpy>=2.3.0",
+#     "pyarrow>=22.0.0",
+# ]
+# [tool.uv]
+# exclude-newer = "2026-02-04T00:00:00Z"
+# ///
+
+"""
+The castles and palaces tables of zamki.sql and dwory.sql, built in-process with DuckDB instead of
+pasted into its console. Scraped rows are handed over as Arrow tables straight from a RecordStore
+(crawl.py --conflate), or read from earlier outputs with st_read; Overture places come from the local
+GeoPackage. The distance joins are done with spatial_index.GridIndex like in conflation.py and handed
+back as Arrow tables of row numbers, DuckDB joins the attributes and writes the results through GDAL,
+to a GeoPackage unless the output says otherwise.
+"""
+
+import argparse
+from datetime import date
+from pathlib import Path
+
+import duckdb
+import numpy as np
+import pyarrow as pa
+
+from conflation import find_pairs
+from overture_index import OVERTURE_PATH
+from record_store import RecordStore
+from spatial_index import GridIndex
+
+
+CASTLES_DISTANCE = 200.0
+PALACES_DISTANCE = 100.0
+# output extension -> GDAL driver of COPY ... (FORMAT gdal)
+DRIVERS = {
+    ".gpkg": "GPKG",
+    ".geojson": "GeoJSON",
+    ".fgb": "FlatGeobuf",
+}
+
+# the distinct locations of a source, numbered for the pairs matched in Python
+POINTS_QUERY = """
+create or replace table {name}_points as
+select *, row_number() over() as rn
+from (select distinct on(geom) * from {name})
+"""
+
+# zamki.sql without its spheroid joins, reading sp_points, net_points and the matched pairs
+CASTLES_QUERY = """
+create or replace table castles_unioned as
+with
+not_matched_sp as (
+  select *
+  from sp_points sp
+  anti join matched on sp.rn=matched.sp_rn
+),
+not_matched_net as (
+  select *
+  from net_points net
+  anti join matched on net.rn=matched.net_rn
+),
+matched_data as (
+  select
+    sp.nazwa as nazwa_sp,
+    net.nazwa as nazwa_net,
+    sp.url as url_sp,
+    net.url as url_net,
+    sp.zamek_id as zamek_id_sp,
+    sp.wojewodztwo,
+    sp.powiat,
+    sp.gmina,
+    sp.typ_oryginalny,
+    sp.typ_interpretowany,
+    sp.data_wprowadzenia,
+    sp.data_aktualizacji,
+    sp.opis,
+    net.stan_tekst,
+    net.stan_opis,
+    net.wstep,
+    net.parking,
+    net.trudnosc_odnalezienia_skala,
+    net.trudnosc_odnalezienia_tekst,
+    net.trudnosc_odnalezienia_opis,
+    net.trudnosc_dojscia_skala,
+    net.trudnosc_dojscia_tekst,
+    net.trudnosc_dojscia_opis,
+    net.ocena_skala,
+    net.ocena_tekst,
+    net.ocena_opis,
+    st_centroid(st_collect([sp.geom, net.geom])) as geom
+  from matched
+  join sp_points sp on sp.rn=matched.sp_rn
+  join net_points net on net.rn=matched.net_rn
+  order by matched.sp_rn, matched.net_rn
+),
+unioned as (
+  select * from matched_data
+  union all by name
+  select * exclude(rn) rename(nazwa as nazwa_sp, url as url_sp, zamek_id as zamek_id_sp) from not_matched_sp
+  union all by name
+  select * exclude(rn) rename(nazwa as nazwa_net, url as url_net) from not_matched_net
+)
+select *, row_number() over() as rn
+from unioned
+"""
+
+CASTLES_OVERTURE_QUERY = """
+create or replace table castles as
+select
+  unioned.* exclude(rn),
+  case
+    when typ_interpretowany = 'zniszczony' or stan_tekst = 'Brak śladów' then 'odrzucony'
+    else null
+  end ckkp_status,
+  ov.* exclude(geom, rn)
+from castles_unioned unioned
+left join castles_unioned_overture nearest on nearest.rn=unioned.rn
+left join overture_places ov on ov.rn=nearest.overture_rn
+order by unioned.rn
+"""
+
+# dwory.sql without its spheroid join, reading dwory_points
+PALACES_QUERY = """
+create or replace table palaces as
+select null::text as ckkp_status, p.* exclude(rn), ov.* exclude(geom, rn)
+from dwory_points p
+left join dwory_points_overture nearest on nearest.rn=p.rn
+left join overture_places ov on ov.rn=nearest.overture_rn
+order by p.rn
+"""
+
+
+def quote(value: str) -> str:
+    """SQL string literal, for the statements that take no parameters (create view, copy)."""
+    return "'" + value.replace("'", "''") + "'"
+
+
+def connect(overture: Path) -> duckdb.DuckDBPyConnection:
+    """An in-memory database with the spatial extension and the Overture places loaded."""
+    connection = duckdb.connect()
+    connection.install_extension("spatial")
+    connection.load_extension("spatial")
+    connection.execute(f"create table overture_places as select *, row_number() over() as rn from st_read({quote(str(overture))})")
+    return connection
+
+
+def get_points(connection: duckdb.DuckDBPyConnection, table: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Numbers, longitudes and latitudes of the points of a table with a rn column."""
+    columns = connection.execute(f"select rn, st_x(geom) as lon, st_y(geom) as lat from {table} order by rn").fetchnumpy()
+    return (
+        np.asarray(columns["rn"], dtype=np.int64),
+        np.asarray(columns["lon"], dtype=np.float64),
+        np.asarray(columns["lat"], dtype=np.float64),
+    )
+
+
+def match_points(connection: duckdb.DuckDBPyConnection, distance: float) -> int:
+    """
+    The sp_points/net_points pairs within distance as the table matched, found like conflation.py
+    with the grid index and haversine. The spheroid functions of the SQL take lat/lon, so they
+    measured the lon/lat geometries with swapped axes.
+    """
+    rn_sp, lon_sp, lat_sp = get_points(connection=connection, table="sp_points")
+    rn_net, lon_net, lat_net = get_points(connection=connection, table="net_points")
+    index_sp, index_net, _ = find_pairs(lon_a=lon_sp, lat_a=lat_sp, lon_b=lon_net, lat_b=lat_net, distance=distance)
+    connection.register("matched", pa.table(dict(sp_rn=rn_sp[index_sp], net_rn=rn_net[index_net])))
+    return len(index_sp)
+
+
+def attach_overture(connection: duckdb.DuckDBPyConnection, table: str, distance: float) -> int:
+    """
+    The closest Overture place within distance of every point of table as the table <table>_overture
+    (rn, overture_rn), like overture_index.attach_nearest. Returns the number of points with a place.
+    """
+    rn, lon, lat = get_points(connection=connection, table=table)
+    rn_overture, lon_overture, lat_overture = get_points(connection=connection, table="overture_places")
+    index = GridIndex(lon=lon_overture, lat=lat_overture, cell_size=distance)
+    nearest, _ = index.query_nearest(lon=lon, lat=lat, radius=distance)
+    found = nearest >= 0
+    connection.register(f"{table}_overture", pa.table(dict(rn=rn[found], overture_rn=rn_overture[nearest[found]])))
+    return int(found.sum())
+
+
+def get_rows_table(store: RecordStore) -> pa.Table:
+    """The rows of store with coordinates, their longitudes and latitudes as two more columns."""
+    xs, ys = store.coordinates()
+    located = np.flatnonzero(np.isfinite(xs) & np.isfinite(ys))
+    table = store.to_arrow().take(located)
+    return table.append_column("lon", pa.array(xs[located])).append_column("lat", pa.array(ys[located]))
+
+
+def register_store(connection: duckdb.DuckDBPyConnection, name: str, store: RecordStore) -> None:
+    """Makes the rows of store the view name, with a geom column like st_read's, reading the Arrow buffers in place."""
+    connection.register(f"{name}_rows", get_rows_table(store))
+    connection.execute(f"create or replace view {name} as select * exclude(lon, lat), st_point(lon, lat) as geom from {name}_rows")
+
+
+def register_file(connection: duckdb.DuckDBPyConnection, name: str, path: Path) -> None:
+    """Makes an earlier output the view name, in any format st_read reads."""
+    connection.execute(f"create or replace view {name} as select * from st_read({quote(str(path))})")
+
+
+def write_table(connection: duckdb.DuckDBPyConnection, table: str, path: Path) -> None:
+    driver = DRIVERS.get(path.suffix)
+    if driver is None:
+        raise ValueError(f"Cannot tell the format of {path}, expected one of: {', '.join(DRIVERS)}")
+    # GDAL does not replace an existing file
+    path.unlink(missing_ok=True)
+    connection.execute(f"copy {table} to {quote(str(path))} with (format gdal, driver {quote(driver)})")
+    count = connection.execute(f"select count(*) from {table}").fetchone()[0]
+    print(f"Written {count} {table} to {path}.")
+
+
+def conflate_castles(connection: duckdb.DuckDBPyConnection, path: Path, distance: float = CASTLES_DISTANCE) -> None:
+    """The castles table from the sp and net views, written to path."""
+    connection.execute(POINTS_QUERY.format(name="sp"))
+    connection.execute(POINTS_QUERY.format(name="net"))
+    pairs = match_points(connection=connection, distance=distance)
+    connection.execute(CASTLES_QUERY)
+    attached = attach_overture(connection=connection, table="castles_unioned", distance=distance)
+    connection.execute(CASTLES_OVERTURE_QUERY)
+    print(f"Matched {pairs} zamkisp/zamkinet pairs, attached Overture places to {attached} castles.")
+    write_table(connection=connection, table="castles", path=path)
+
+
+def conflate_palaces(connection: duckdb.DuckDBPyConnection, path: Path, distance: float = PALACES_DISTANCE) -> None:
+    """The palaces table from the dwory view, written to path."""
+    connection.execute(POINTS_QUERY.format(name="dwory"))
+    attached = attach_overture(connection=connection, table="dwory_points", distance=distance)
+    connection.execute(PALACES_QUERY)
+    print(f"Attached Overture places to {attached} palaces.")
+    write_table(connection=connection, table="palaces", path=path)
+
+
+def get_castles_path() -> Path:
+    return Path(f"zamki_deduplikowane_{date.today().isoformat()}.gpkg")
+
+
+def get_palaces_path() -> Path:
+    return Path(f"dwory_{date.today().isoformat()}.gpkg")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sp", type=Path, help="zamkisp output")
+    parser.add_argument("--net", type=Path, help="zamkinet output")
+    parser.add_argument("--dwory", type=Path, help="dworysp output")
+    parser.add_argument("--overture", type=Path, default=OVERTURE_PATH, help="Overture places GeoPackage")
+    parser.add_argument("--castles-output", type=Path, help="defaults to zamki_deduplikowane_<today>.gpkg")
+    parser.add_argument("--palaces-output", type=Path, help="defaults to dwory_<today>.gpkg")
+    args = parser.parse_args()
+    if (args.sp is None) != (args.net is None):
+        parser.error("--sp and --net go together")
+    if args.sp is None and args.dwory is None:
+        parser.error("nothing to conflate, give --sp and --net, --dwory or both")
+    with connect(overture=args.overture) as connection:
+        if args.sp is not None:
+            register_file(connection=connection, name="sp", path=args.sp)
+            register_file(connection=connection, name="net", path=args.net)
+            conflate_castles(connection=connection, path=args.castles_output or get_castles_path())
+        if args.dwory is not None:
+            register_file(connection=connection, name="dwory", path=args.dwory)
+            conflate_palaces(connection=connection, path=args.palaces_output or get_palaces_path())
+
+
+if __name__ == "__main__":
+    main()
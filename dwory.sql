@@ -1,5 +1,7 @@
+-- the palaces table below is built in-process, without these paths, by duckdb_conflation.py (or crawl.py --conflate)
 load spatial;
 
+-- scraper outputs written with --format geojsonseq / ndjson (.geojsons / .geojsonl) are read by st_read the same way
 select * from st_read('/mnt/nvme/git/ckkp_2026/dworysp_2026-02-19.geojson') limit 10;
 
 create table overture_places as
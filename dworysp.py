@@ -3,28 +3,77 @@
 # dependencies = [
 #     "beautifulsoup4>=4.14.3",
 #     "httpx>=0.28.1",
+#     "lxml>=6.0.2",
+#     "pyarrow>=22.0.0",
+#     "pyogrio>=0.11.1",
 # ]
 # [tool.uv]
 # exclude-newer = "2026-02-04T00:00:00Z"
 # ///
 
+import argparse
 import asyncio
-from collections.abc import Iterable
+from collections.abc import Callable, Iterable
 from datetime import date
-import json
-from typing import Any
+from pathlib import Path
 import httpx
-from bs4 import BeautifulSoup
 
-from dataclasses import dataclass
-import re
+from dataclasses import asdict, dataclass
 
-RE_WHITESPACE = re.compile(r"\s+")
+from dictionary_cache import get_cached_dictionaries
+from http_client import ClientPool, use_client
+from extraction import Field, FieldExtractor, get_labelled_rows, parse_coordinates, parse_sp_date, parse_sp_id, read_textarea
+from parsing import parse
+from parser_pool import PARSE_WORKERS, ParserPool
+from sinks import FORMATS, FeatureWriter, wrap_feature_collection
+from geoexport import export
+from record_store import RecordStore
+from journal import JOURNAL_DIR, CrawlJournal
+from metrics import METRICS
+from cli import add_common_arguments, apply_common_arguments
+from pagination import PAGE_SIZE, get_all_listing_rows, get_listing_rows, get_main_section, get_page
+from snapshot import (
+    REFRESH_DAYS,
+    Snapshot,
+    get_fingerprint,
+    is_due_for_refresh,
+    load_snapshot,
+    parse_date,
+    save_fingerprints,
+)
 
+
+# most detail pages fetched concurrently, rate_control starts lower and grows while the server keeps up
+DETAILS_WORKERS = 8
+# --workers of this script, and of this source in crawl.py
+DEFAULT_WORKERS = DETAILS_WORKERS
+# how many listing rows may wait for the workers before listing pages stop being fetched
+DETAILS_QUEUE_SIZE = 200
+
+HOST = "dworyipalace.zamkisp.pl"
 URL_LISTA_TEMPLATE = "https://dworyipalace.zamkisp.pl/index.php?option=com_dip&view=dip&Itemid=33&limitstart={limitstart}"
 URL_POWIATY_TEMPLATE = "https://dworyipalace.zamkisp.pl/index.php?option=com_powiaty&view=powiaty&Itemid=69&limitstart={limitstart}"
 URL_GMINY_TEMPLATE = "https://dworyipalace.zamkisp.pl/index.php?option=com_gminy&view=gminy&Itemid=68&limitstart={limitstart}"
 
+DETAILS_EXTRACTOR = FieldExtractor(
+    source="dworysp",
+    fields=[
+        Field(label="Oznaczenie:", name="dwor_id_sp"),
+        Field(label="Nazwa:", name="nazwa_sp"),
+        Field(label="Województwo:", name="kod_woj"),
+        Field(label="Powiat:", name="kod_pow"),
+        Field(label="PGA:", name="kod_gmi"),
+        Field(label="Koordynaty:", name=("szerokosc_geo", "dlugosc_geo"), convert=parse_coordinates),
+        Field(label="Zamek:", name="zamek_id_sp", convert=parse_sp_id),
+        Field(label="Twierdza/Fort:", name="twierdza_id_sp", convert=parse_sp_id),
+        Field(label="Punkt oporu:", name="punkt_oporu_id_sp", convert=parse_sp_id),
+        Field(label="Gród:", name="grod_id_sp", convert=parse_sp_id),
+        Field(label="Opis:", name="opis", read=read_textarea),
+        Field(label="Data wprowadzenia:", name="data_wprowadzenia", convert=parse_sp_date),
+        Field(label="Aktualizacja danych:", name="data_aktualizacji", convert=parse_sp_date),
+    ],
+)
+
 DICT_WOJEWODZTWA = {
     "B": "lubuskie",
     "C": "łódzkie",
@@ -45,6 +94,16 @@ DICT_WOJEWODZTWA = {
 }
 
 
+# property types of the columnar exports, everything else is a string
+COLUMN_TYPES = {
+    "wojewodztwo": "category",
+    "powiat": "category",
+    "gmina": "category",
+    "data_wprowadzenia": "date",
+    "data_aktualizacji": "date",
+}
+
+
 @dataclass(frozen=True, slots=True, kw_only=True)
 class Row:
     nazwa_sp: str
@@ -64,232 +123,411 @@ class Row:
     url: str
 
 
+@dataclass(frozen=True, slots=True, kw_only=True)
+class PalaceListEntry:
+    url: str
+    # of the listing row's texts, the listing shows no update date to compare
+    fingerprint: str
+
+
+# dictionaries of a parser process, see set_dictionaries()
+DICTIONARIES: tuple[dict[tuple[str, str], str], dict[tuple[str, str, str], str]] = ({}, {})
+
+
+def to_feature(row: Row) -> dict:
+    return dict(
+        type="Feature",
+        properties={
+            "nazwa_sp": row.nazwa_sp,
+            "wojewodztwo": row.wojewodztwo,
+            "powiat": row.powiat,
+            "gmina": row.gmina,
+            "dwor_id_sp": row.dwor_id_sp,
+            "zamek_id_sp": row.zamek_id_sp,
+            "twierdza_id_sp": row.twierdza_id_sp,
+            "punkt_oporu_id_sp": row.punkt_oporu_id_sp,
+            "grod_id_sp": row.grod_id_sp,
+            "data_wprowadzenia": row.data_wprowadzenia.isoformat() if row.data_wprowadzenia else None,
+            "data_aktualizacji": row.data_aktualizacji.isoformat() if row.data_aktualizacji else None,
+            "opis": row.opis,
+            "url": row.url,
+        },
+        geometry=dict(
+            type="Point",
+            coordinates=[row.dlugosc_geo, row.szerokosc_geo],
+        )
+    )
+
+
 def to_geojson(rows: Iterable[Row]) -> dict:
-    result = {
+    return {
         "type": "FeatureCollection",
-        "features": []
+        "features": [to_feature(row) for row in rows]
     }
-    for row in rows:
-        result["features"].append(dict(
-            type="Feature",
-            properties={
-                "nazwa_sp": row.nazwa_sp,
-                "wojewodztwo": row.wojewodztwo,
-                "powiat": row.powiat,
-                "gmina": row.gmina,
-                "dwor_id_sp": row.dwor_id_sp,
-                "zamek_id_sp": row.zamek_id_sp,
-                "twierdza_id_sp": row.twierdza_id_sp,
-                "punkt_oporu_id_sp": row.punkt_oporu_id_sp,
-                "grod_id_sp": row.grod_id_sp,
-                "data_wprowadzenia": row.data_wprowadzenia.isoformat() if row.data_wprowadzenia else None,
-                "data_aktualizacji": row.data_aktualizacji.isoformat() if row.data_aktualizacji else None,
-                "opis": row.opis,
-                "url": row.url,
-            },
-            geometry=dict(
-                type="Point",
-                coordinates=[row.dlugosc_geo, row.szerokosc_geo],
-            )
-        ))
-    return result
 
 
-async def get_details(
-    client: httpx.AsyncClient,
+def parse_details(
+    markup: str,
     url: str,
     county_dict: dict[tuple[str, str], str],
     municipality_dict: dict[tuple[str, str, str], str],
 ) -> Row:
-    response = await client.get(url)
-    response.raise_for_status()
-    soup = BeautifulSoup(markup=response.text, features="html.parser")
+    soup = parse(markup=markup, id="userForm")
     main_section = soup.find(id="userForm")
     tables = main_section.find_all("table")
     if len(tables) < 1:
         raise Exception("Expected at least one table in HTML.")
     try:
-        data: dict[str, Any] = {"url": url}
-        kod_woj = ""
-        kod_pow = ""
-        # html is broken and missing tbody
-        for item in tables[0].find_all("tr"):
-            cells = list(item.find_all("td"))
-            if len(cells) > 2:
-                col_name = cells[1].text
-                col_value = cells[2].text.strip()
-                if "Oznaczenie:" in col_name:
-                    data["dwor_id_sp"] = col_value
-                elif "Nazwa:" in col_name:
-                    data["nazwa_sp"] = col_value
-                elif "Województwo:" in col_name:
-                    kod_woj = col_value
-                    data["wojewodztwo"] = DICT_WOJEWODZTWA.get(col_value)
-                elif "Powiat:" in col_name:
-                    kod_pow = col_value
-                    data["powiat"] = county_dict.get((kod_woj, kod_pow))
-                elif "PGA:" in col_name:
-                    data["gmina"] = municipality_dict.get((kod_woj, kod_pow, col_value))
-                elif "Koordynaty:" in col_name:
-                    lat, lon = RE_WHITESPACE.sub(
-                        repl=" ", 
-                        string=(
-                            col_value
-                            .replace(","," ")
-                            .replace(";", " ")
-                            .replace("°N", "")
-                            .replace("°E", "")
-                            .replace("°", "")
-                            .strip()
-                        )
-                    ).split(" ")[:2]
-                    data["szerokosc_geo"] = float(lat)
-                    data["dlugosc_geo"] = float(lon)
-                elif "Zamek:" in col_name:
-                    data["zamek_id_sp"] = col_value if col_value and col_value != "---" else None
-                elif "Twierdza/Fort:" in col_name:
-                    data["twierdza_id_sp"] = col_value if col_value and col_value != "---" else None
-                elif "Punkt oporu:" in col_name:
-                    data["punkt_oporu_id_sp"] = col_value if col_value and col_value != "---" else None                    
-                elif "Gród:" in col_name:
-                    data["grod_id_sp"] = col_value if col_value and col_value != "---" else None
-                elif "Opis:" in cells[1].text:
-                    data["opis"] = cells[2].textarea.text.strip()
-                elif "Data wprowadzenia:" in cells[1].text:
-                    data["data_wprowadzenia"] = date.fromisoformat(col_value) if col_value != "0000-00-00" else None
-                elif "Aktualizacja danych:" in cells[1].text:
-                    data["data_aktualizacji"] = date.fromisoformat(col_value) if col_value != "0000-00-00" else None
+        data = DETAILS_EXTRACTOR.extract(get_labelled_rows(tables[0]))
     except:
         print(f"Problem with parsing entry for url: {url}")
         raise
-    return Row(**data)
+    # the administrative units are given as codes, named with the dictionaries
+    codes = {name: data.pop(name) for name in ("kod_woj", "kod_pow", "kod_gmi") if name in data}
+    kod_woj = codes.get("kod_woj", "")
+    kod_pow = codes.get("kod_pow", "")
+    if "kod_woj" in codes:
+        data["wojewodztwo"] = DICT_WOJEWODZTWA.get(kod_woj)
+    if "kod_pow" in codes:
+        data["powiat"] = county_dict.get((kod_woj, kod_pow))
+    if "kod_gmi" in codes:
+        data["gmina"] = municipality_dict.get((kod_woj, kod_pow, codes["kod_gmi"]))
+    return Row(**data, url=url)
+
 
+def set_dictionaries(county_dict: dict[tuple[str, str], str], municipality_dict: dict[tuple[str, str, str], str]) -> None:
+    global DICTIONARIES
+    DICTIONARIES = (county_dict, municipality_dict)
 
-async def get_palaces(county_dict: dict[tuple[str, str], str], municipality_dict: dict[tuple[str, str, str], str]) -> list[Row]:
-    results = []
-    keep_running = True
+
+def parse_details_with_dictionaries(markup: str, url: str) -> Row:
+    """parse_details() with the dictionaries set once per parser process by set_dictionaries()."""
+    county_dict, municipality_dict = DICTIONARIES
+    return parse_details(markup=markup, url=url, county_dict=county_dict, municipality_dict=municipality_dict)
+
+
+async def get_details(
+    client: httpx.AsyncClient,
+    url: str,
+    county_dict: dict[tuple[str, str], str],
+    municipality_dict: dict[tuple[str, str, str], str],
+    pool: ParserPool | None = None,
+) -> Row:
+    response = await client.get(url)
+    response.raise_for_status()
+    with METRICS.time_parse("dworysp szczegóły"):
+        if pool is None:
+            return parse_details(markup=response.text, url=url, county_dict=county_dict, municipality_dict=municipality_dict)
+        # the pool was initialized with the same dictionaries, they are not sent along with every page
+        return await pool.run(parse_details_with_dictionaries, response.text, url)
+
+
+def get_row_from_snapshot(
+    entry: PalaceListEntry,
+    snapshot: Snapshot,
+    refresh_days: int,
+) -> Row | None:
+    """
+    Row carried forward from the previous output, None when the detail page has to be fetched again,
+    also when its listing row changed since that output or the output has no fingerprints saved with it.
+    """
+    url = entry.url
+    feature = snapshot.get(url=url)
+    if feature is None or is_due_for_refresh(
+        feature=feature,
+        key=url,
+        snapshot_date=snapshot.snapshot_date,
+        refresh_days=refresh_days,
+    ):
+        return None
+    if snapshot.fingerprints is None or snapshot.fingerprints.get(url) != entry.fingerprint:
+        return None
+    properties = feature["properties"]
+    dlugosc_geo, szerokosc_geo = feature["geometry"]["coordinates"]
+    return Row(
+        nazwa_sp=properties["nazwa_sp"],
+        szerokosc_geo=szerokosc_geo,
+        dlugosc_geo=dlugosc_geo,
+        wojewodztwo=properties["wojewodztwo"],
+        powiat=properties["powiat"],
+        gmina=properties["gmina"],
+        dwor_id_sp=properties["dwor_id_sp"],
+        zamek_id_sp=properties["zamek_id_sp"],
+        twierdza_id_sp=properties["twierdza_id_sp"],
+        punkt_oporu_id_sp=properties["punkt_oporu_id_sp"],
+        grod_id_sp=properties["grod_id_sp"],
+        data_wprowadzenia=parse_date(properties["data_wprowadzenia"]),
+        data_aktualizacji=parse_date(properties["data_aktualizacji"]),
+        opis=properties["opis"],
+        url=url,
+    )
+
+
+async def get_details_worker(
+    client: httpx.AsyncClient,
+    queue: asyncio.Queue[PalaceListEntry | None],
+    county_dict: dict[tuple[str, str], str],
+    municipality_dict: dict[tuple[str, str, str], str],
+    results: list[Row] | None,
+    snapshot: Snapshot | None,
+    refresh_days: int,
+    pool: ParserPool,
+    on_row: Callable[[Row], None] | None,
+    journal: CrawlJournal | None,
+) -> int:
+    """Rows of the queued entries, to results or else to on_row. Returns their number."""
+    count = 0
+    while True:
+        entry = await queue.get()
+        try:
+            if entry is None:
+                return count
+            url = entry.url
+            row = journal.get_record(Row, url) if journal is not None else None
+            if row is None and snapshot is not None:
+                row = get_row_from_snapshot(entry=entry, snapshot=snapshot, refresh_days=refresh_days)
+            if row is None:
+                row = await get_details(
+                    client=client,
+                    url=url,
+                    county_dict=county_dict,
+                    municipality_dict=municipality_dict,
+                    pool=pool,
+                )
+                if journal is not None:
+                    journal.put_record(url, row)
+            count += 1
+            METRICS.record_row()
+            if on_row is not None:
+                on_row(row)
+            else:
+                results.append(row)
+        finally:
+            queue.task_done()
+
+
+def parse_palace_list_entries(markup: str) -> list[PalaceListEntry]:
+    entries = []
+    for row in get_listing_rows(get_main_section(markup=markup, container_id="ja-content")):
+        cells = row.select("td")
+        entries.append(
+            PalaceListEntry(
+                url="https://dworyipalace.zamkisp.pl" + cells[9].a["href"],
+                fingerprint=get_fingerprint([cell.get_text(strip=True) for cell in cells]),
+            )
+        )
+    return entries
+
+
+async def get_palace_entries(
+    client: httpx.AsyncClient,
+    queue: asyncio.Queue[PalaceListEntry | None],
+    fingerprints: dict[str, str],
+    journal: CrawlJournal | None = None,
+) -> None:
+    """Puts the listing entries into queue, and their fingerprints by url into fingerprints."""
     offset = 0
-    step = 100
+    step = PAGE_SIZE
+    while True:
+        journalled = journal.get_listing(offset) if journal is not None else None
+        if journalled is not None:
+            entries = [PalaceListEntry(**entry) for entry in journalled]
+        else:
+            markup = await get_page(client=client, url_template=URL_LISTA_TEMPLATE, offset=offset, label="get_palaces")
+            with METRICS.time_parse("dworysp lista"):
+                entries = parse_palace_list_entries(markup)
+            if journal is not None:
+                journal.put_listing(offset, [asdict(entry) for entry in entries])
+        if len(entries) == 0:
+            break
+        for entry in entries:
+            fingerprints[entry.url] = entry.fingerprint
+            # blocks when the workers fall behind, so listing pages are not fetched too far ahead
+            await queue.put(entry)
+        offset += step
+
+
+async def get_palaces(
+    workers: int = DETAILS_WORKERS,
+    snapshot: Snapshot | None = None,
+    refresh_days: int = REFRESH_DAYS,
+    parse_workers: int = PARSE_WORKERS,
+    on_row: Callable[[Row], None] | None = None,
+    journal: CrawlJournal | None = None,
+    clients: ClientPool | None = None,
+    fingerprints: dict[str, str] | None = None,
+) -> list[Row] | int:
+    """
+    The palaces in dwor_id_sp order, or with on_row the number of rows passed to it as they come.
+    fingerprints is filled with the listing fingerprints by url, to be saved next to the output.
+    """
+    results = [] if on_row is None else None
+    queue: asyncio.Queue[PalaceListEntry | None] = asyncio.Queue(maxsize=DETAILS_QUEUE_SIZE)
+    METRICS.watch_queue("dworysp", queue)
+    if fingerprints is None:
+        fingerprints = {}
     limits = httpx.Limits(
-        max_connections=3,
-        max_keepalive_connections=1,
+        max_connections=workers,
+        max_keepalive_connections=workers,
     )
-    async with httpx.AsyncClient(limits=limits) as client:
-        while keep_running:
-            url = URL_LISTA_TEMPLATE.format(limitstart=offset)
-            response = await client.get(url=url)
-            response.raise_for_status()
-            print(f"get_palaces() - offset: {offset} - Response status: {response.status_code} - url: {url}")
-            soup = BeautifulSoup(markup=response.text, features="html.parser")
-            main_section = soup.find(id="ja-content")
-            tables = main_section.find_all("table")
-            if len(tables) < 2:
-                raise Exception("Expected at least two tables in HTML.")
-            # html is broken and missing tbody
-            if len(tables[1].find_all("tr", recursive=False)) == 0:
-                keep_running = False
-                break
-            for row in tables[1].find_all("tr", recursive=False):
-                url = "https://dworyipalace.zamkisp.pl" + row.select("td")[9].a["href"]
-                row = await get_details(client=client, url=url, county_dict=county_dict, municipality_dict=municipality_dict)
-                results.append(row)
-            offset += step
+    async with use_client(clients=clients, host=HOST, limits=limits) as client:
+        async with asyncio.TaskGroup() as tg:
+            # listing pages start filling the queue while the dictionaries load
+            producer = tg.create_task(get_palace_entries(client=client, queue=queue, fingerprints=fingerprints, journal=journal))
+            county_dict, municipality_dict = await get_dictionaries(client=client)
+            with ParserPool(
+                workers=parse_workers,
+                initializer=set_dictionaries,
+                initargs=(county_dict, municipality_dict),
+            ) as pool:
+                details_workers = [
+                    tg.create_task(
+                        get_details_worker(
+                            client=client,
+                            queue=queue,
+                            county_dict=county_dict,
+                            municipality_dict=municipality_dict,
+                            results=results,
+                            snapshot=snapshot,
+                            refresh_days=refresh_days,
+                            pool=pool,
+                            on_row=on_row,
+                            journal=journal,
+                        )
+                    )
+                    for _ in range(workers)
+                ]
+                await producer
+                for _ in range(workers):
+                    await queue.put(None)
+                await asyncio.gather(*details_workers)
+    if results is None:
+        return sum(worker.result() for worker in details_workers)
+    # workers finish in arbitrary order
+    results.sort(key=lambda row: row.dwor_id_sp)
     return results
 
 
-def get_counties() -> dict[tuple[str, str], str]:
+async def get_counties(client: httpx.AsyncClient) -> dict[tuple[str, str], str]:
     results = {}
-    keep_running = True
-    offset = 0
-    step = 100
-    with httpx.Client() as client:
-        while keep_running:
-            url = URL_POWIATY_TEMPLATE.format(limitstart=offset)
-            response = client.get(url=url)
-            response.raise_for_status()
-            print(f"get_counties() - offset: {offset} - Response status: {response.status_code} - url: {url}")
-            soup = BeautifulSoup(markup=response.text, features="html.parser")
-            main_section = soup.find(id="ja-content")
-            tables = main_section.find_all("table")
-            if len(tables) < 2:
-                raise Exception("Expected at least two tables in HTML.")
-            # html is broken and missing tbody
-            if len(tables[1].find_all("tr", recursive=False)) == 0:
-                keep_running = False
-                break
-            for row in tables[1].find_all("tr", recursive=False):
-                kod_woj = ""
-                kod_pow = ""
-                nazwa = ""
-                for i, val in enumerate(row.select("td")):
-                    match i:
-                        case 0:
-                            pass
-                        case 1:
-                            kod_woj = val.text.strip()
-                        case 2:
-                            kod_pow = val.text.strip()
-                        case 3:
-                            nazwa = val.text.strip()
-                if kod_woj and kod_pow:
-                    results[(kod_woj, kod_pow)] = nazwa
-            offset += step
+    rows = await get_all_listing_rows(
+        client=client,
+        url_template=URL_POWIATY_TEMPLATE,
+        container_id="ja-content",
+        label="get_counties",
+    )
+    for row in rows:
+        kod_woj = ""
+        kod_pow = ""
+        nazwa = ""
+        for i, val in enumerate(row.select("td")):
+            match i:
+                case 0:
+                    pass
+                case 1:
+                    kod_woj = val.text.strip()
+                case 2:
+                    kod_pow = val.text.strip()
+                case 3:
+                    nazwa = val.text.strip()
+        if kod_woj and kod_pow:
+            results[(kod_woj, kod_pow)] = nazwa
     return results
 
 
-def get_municipalities() -> dict[tuple[str, str, str], str]:
+async def get_municipalities(client: httpx.AsyncClient) -> dict[tuple[str, str, str], str]:
     results = {}
-    keep_running = True
-    offset = 0
-    step = 100
-    with httpx.Client() as client:
-        while keep_running:
-            url = URL_GMINY_TEMPLATE.format(limitstart=offset)
-            response = client.get(url=url)
-            response.raise_for_status()
-            print(f"get_municipalities() - offset: {offset} - Response status: {response.status_code} - url: {url}")
-            soup = BeautifulSoup(markup=response.text, features="html.parser")
-            main_section = soup.find(id="ja-content")
-            tables = main_section.find_all("table")
-            if len(tables) < 2:
-                raise Exception("Expected at least two tables in HTML.")
-            # html is broken and missing tbody
-            if len(tables[1].find_all("tr", recursive=False)) == 0:
-                keep_running = False
-                break
-            for row in tables[1].find_all("tr", recursive=False):
-                kod_woj = ""
-                kod_pow = ""
-                kod_gmi = ""
-                nazwa = ""
-                for i, val in enumerate(row.select("td")):
-                    match i:
-                        case 0:
-                            pass
-                        case 1:
-                            kod_woj = val.text.strip()
-                        case 2:
-                            kod_pow = val.text.strip()
-                        case 3:
-                            kod_gmi = val.text.strip()
-                        case 4:
-                            nazwa = val.text.strip()
-                if kod_woj and kod_pow:
-                    results[(kod_woj, kod_pow, kod_gmi)] = nazwa
-            offset += step
+    rows = await get_all_listing_rows(
+        client=client,
+        url_template=URL_GMINY_TEMPLATE,
+        container_id="ja-content",
+        label="get_municipalities",
+    )
+    for row in rows:
+        kod_woj = ""
+        kod_pow = ""
+        kod_gmi = ""
+        nazwa = ""
+        for i, val in enumerate(row.select("td")):
+            match i:
+                case 0:
+                    pass
+                case 1:
+                    kod_woj = val.text.strip()
+                case 2:
+                    kod_pow = val.text.strip()
+                case 3:
+                    kod_gmi = val.text.strip()
+                case 4:
+                    nazwa = val.text.strip()
+        if kod_woj and kod_pow:
+            results[(kod_woj, kod_pow, kod_gmi)] = nazwa
     return results
 
 
-def main() -> None:
-    print("Hello from zawody.py!")
-    county_dict = get_counties()
+async def fetch_dictionaries(client: httpx.AsyncClient) -> tuple[dict[tuple[str, str], str], dict[tuple[str, str, str], str]]:
+    county_dict, municipality_dict = await asyncio.gather(
+        get_counties(client=client),
+        get_municipalities(client=client),
+    )
+    return county_dict, municipality_dict
+
+
+async def get_dictionaries(client: httpx.AsyncClient) -> tuple[dict[tuple[str, str], str], dict[tuple[str, str, str], str]]:
+    county_dict, municipality_dict = await get_cached_dictionaries(source="dworysp", fetch=lambda: fetch_dictionaries(client=client))
     print(f"Utworzono słownik powiatów ({len(county_dict)} rekordów).")
-    municipality_dict = get_municipalities()
     print(f"Utworzono słownik gmin ({len(municipality_dict)} rekordów).")
-    data = asyncio.run(get_palaces(county_dict=county_dict, municipality_dict=municipality_dict))
-    geojson_dict = to_geojson(data)
-    with open(f"dworysp_{date.today().isoformat()}.geojson", "w", encoding="utf-8") as f:
-        json.dump(geojson_dict, f, indent=2)
+    return county_dict, municipality_dict
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    add_common_arguments(parser, workers=DEFAULT_WORKERS)
+    parser.add_argument("--since", type=Path, help="previous output, unchanged entries are carried forward from it")
+    args = parser.parse_args()
+    apply_common_arguments(args)
+    print("Hello from zawody.py!")
+    snapshot = load_snapshot(path=args.since, id_property="dwor_id_sp") if args.since else None
+    output_path = Path(f"dworysp_{date.today().isoformat()}{FORMATS[args.format]}")
+    # sequence formats are written as the rows arrive, a FeatureCollection at the end in dwor_id_sp order
+    streaming = args.format != "geojson"
+    # only the columnar exports are built from the store, it is filled only when one is requested
+    store = RecordStore(column_types=COLUMN_TYPES)
+    # saved next to the output, for the next crawl --since it to compare the listing rows with
+    fingerprints = {}
+
+    def write_row(writer: FeatureWriter, row: Row) -> None:
+        feature = to_feature(row)
+        writer.write(feature)
+        if args.export:
+            store.append(feature)
+
+    # rows taken from the journal go through on_row again, so the output is complete after a resume
+    with CrawlJournal(path=JOURNAL_DIR / "dworysp.journal.sqlite", resume=args.resume) as journal:
+        with FeatureWriter(path=output_path, format=args.format) as writer, METRICS.progress(args.progress):
+            data = asyncio.run(
+                get_palaces(
+                    workers=args.workers,
+                    snapshot=snapshot,
+                    refresh_days=args.refresh_days,
+                    parse_workers=args.parse_workers,
+                    on_row=(lambda row: write_row(writer, row)) if streaming else None,
+                    journal=journal,
+                    fingerprints=fingerprints,
+                )
+            )
+            if not streaming:
+                for row in data:
+                    write_row(writer, row)
+                # the FeatureCollection needed the rows sorted, the export only needs the columns
+                data.clear()
+    save_fingerprints(output_path, fingerprints)
+    if streaming and args.wrap:
+        wrap_feature_collection(path=output_path, output_path=output_path.with_suffix(".geojson"))
+        save_fingerprints(output_path.with_suffix(".geojson"), fingerprints)
+    if args.export:
+        export(store=store, path=output_path, formats=args.export)
+    METRICS.write_summary(output_path.with_suffix(".metrics.json"))
     print("Done.")
 
 
@@ -0,0 +1,123 @@
+import re
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from datetime import date
+from typing import Any
+
+from bs4 import Tag
+
+
+RE_WHITESPACE = re.compile(r"\s+")
+
+# a row of a details table: the label cell's text and the cells holding its value
+LabelledRow = tuple[str, list[Tag]]
+
+
+def read_text(cells: list[Tag]) -> str:
+    return cells[0].get_text().strip()
+
+
+def read_textarea(cells: list[Tag]) -> str:
+    return cells[0].textarea.text.strip()
+
+
+def read_image_alt(cells: list[Tag]) -> str:
+    return cells[0].img["alt"]
+
+
+def read_image_src(cells: list[Tag]) -> str:
+    return cells[0].img["src"]
+
+
+def read_last_text(cells: list[Tag]) -> str:
+    """Text of the last value cell, without stripping (zamkinet's descriptions are kept as they are)."""
+    return cells[-1].text
+
+
+def identity(value: Any) -> Any:
+    return value
+
+
+def parse_sp_date(value: str) -> date | None:
+    """zamkisp/dworysp dates, 0000-00-00 when the date is not known."""
+    return date.fromisoformat(value) if value != "0000-00-00" else None
+
+
+def parse_sp_id(value: str) -> str | None:
+    """Ids of related objects on dworysp pages, --- when there is none."""
+    return value if value and value != "---" else None
+
+
+def parse_coordinates(value: str) -> tuple[float, float]:
+    """Latitude and longitude written freely, e.g. 52.123, 16.456 or 52.123°N; 16.456°E."""
+    lat, lon = RE_WHITESPACE.sub(
+        repl=" ",
+        string=value.replace(",", " ").replace(";", " ").replace("°N", "").replace("°E", "").replace("°", "").strip(),
+    ).split(" ")[:2]
+    return float(lat), float(lon)
+
+
+def parse_image_rating(src: str) -> float:
+    """zamkinet's 1-5 scales, drawn as images named after the value (e.g. ocena3.gif)."""
+    return float(src[-5:-4])
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class Field:
+    """A value on a labelled row: read from the row's value cells, then converted."""
+
+    # found in the label cell's text, e.g. "(5x.xxxxx):" in "Szerokość geograficzna (5x.xxxxx):"
+    label: str
+    # a tuple when convert returns one value per name
+    name: str | tuple[str, ...]
+    read: Callable[[list[Tag]], Any] = read_text
+    convert: Callable[[Any], Any] = identity
+
+
+class FieldExtractor:
+    """
+    Values of a details table by a declared schema of fields. Label texts are dispatched through a dict,
+    filled at first sight of a label text with the fields of the first declared label it contains
+    (the order of the if/elif chains this replaces). Labels matching no field are reported once.
+    """
+
+    def __init__(self, source: str, fields: list[Field]) -> None:
+        self.source = source
+        self.fields = fields
+        self.labels = list(dict.fromkeys(field.label for field in fields))
+        self.names = [name for field in fields for name in (field.name if isinstance(field.name, tuple) else (field.name,))]
+        self.dispatch: dict[str, tuple[Field, ...]] = {label: self.get_fields(label) for label in self.labels}
+
+    def get_fields(self, label: str) -> tuple[Field, ...]:
+        return tuple(field for field in self.fields if field.label == label)
+
+    def resolve(self, label: str) -> tuple[Field, ...]:
+        fields = self.dispatch.get(label)
+        if fields is None:
+            match = next((declared for declared in self.labels if declared in label), None)
+            fields = self.get_fields(match) if match is not None else ()
+            if match is None and label.strip():
+                print(f"{self.source}: unknown label {label.strip()!r}, skipped.")
+            self.dispatch[label] = fields
+        return fields
+
+    def extract(self, rows: Iterable[LabelledRow]) -> dict[str, Any]:
+        """Values of the declared fields found in rows, by name; fields without a row are missing."""
+        values = {}
+        for label, cells in rows:
+            for field in self.resolve(label):
+                value = field.convert(field.read(cells))
+                if isinstance(field.name, tuple):
+                    values.update(zip(field.name, value))
+                else:
+                    values[field.name] = value
+        return values
+
+
+def get_labelled_rows(table: Tag, label_column: int = 1) -> Iterator[LabelledRow]:
+    """Rows of a zamkisp/dworysp details table with a value after the label column."""
+    # html is broken and missing tbody
+    for row in table.find_all("tr"):
+        cells = row.find_all("td")
+        if len(cells) > label_column + 1:
+            yield cells[label_column].get_text(), cells[label_column + 1:]
@@ -0,0 +1,132 @@
+import json
+from collections.abc import Iterable
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from record_store import RecordStore
+
+
+EXPORT_FORMATS = {
+    "geoparquet": ".parquet",
+    "flatgeobuf": ".fgb",
+}
+# small row groups, so the bbox column statistics let readers skip most of the file
+ROW_GROUP_SIZE = 1000
+# little endian byte order, geometry type 1 (Point), x, y
+POINT_WKB = np.dtype([("byte_order", "u1"), ("geometry_type", "<u4"), ("x", "<f8"), ("y", "<f8")])
+
+
+def points_wkb(xs: np.ndarray, ys: np.ndarray) -> pa.Array:
+    """WKB points as a binary array over one buffer of fixed size records."""
+    records = np.empty(len(xs), dtype=POINT_WKB)
+    records["byte_order"] = 1
+    records["geometry_type"] = 1
+    records["x"] = xs
+    records["y"] = ys
+    offsets = np.arange(len(xs) + 1, dtype=np.int32) * POINT_WKB.itemsize
+    return pa.Array.from_buffers(pa.binary(), len(xs), [None, pa.py_buffer(offsets), pa.py_buffer(records)])
+
+
+def spread_bits(values: np.ndarray) -> np.ndarray:
+    """The 16 low bits of values moved to the even bit positions."""
+    values = values & 0xFFFF
+    values = (values | (values << 8)) & 0x00FF00FF
+    values = (values | (values << 4)) & 0x0F0F0F0F
+    values = (values | (values << 2)) & 0x33333333
+    return (values | (values << 1)) & 0x55555555
+
+
+def morton_keys(xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+    """Z-order positions of lon/lat points, features close in space end up close in the file."""
+    xi = ((xs + 180.0) / 360.0 * 0xFFFF).astype(np.int64)
+    yi = ((ys + 90.0) / 180.0 * 0xFFFF).astype(np.int64)
+    return spread_bits(xi) | (spread_bits(yi) << 1)
+
+
+def to_arrow_table(store: RecordStore) -> pa.Table:
+    """
+    The points of store with coordinates to an Arrow table with its property columns, a WKB geometry
+    column and a bbox struct column as described by GeoParquet 1.1, in Z-order.
+    """
+    xs, ys = store.coordinates()
+    located = np.flatnonzero(np.isfinite(xs) & np.isfinite(ys))
+    order = located[np.argsort(morton_keys(xs[located], ys[located]), kind="stable")]
+    table = store.to_arrow().take(order)
+    xs = xs[order]
+    ys = ys[order]
+    table = table.append_column("geometry", points_wkb(xs, ys))
+    x = pa.array(xs, type=pa.float64())
+    y = pa.array(ys, type=pa.float64())
+    return table.append_column("bbox", pa.StructArray.from_arrays([x, y, x, y], names=["xmin", "ymin", "xmax", "ymax"]))
+
+
+def write_geoparquet(table: pa.Table, path: Path) -> None:
+    # no crs means OGC:CRS84, i.e. lon/lat on WGS 84
+    column = {
+        "encoding": "WKB",
+        "geometry_types": ["Point"],
+        "covering": {
+            "bbox": {
+                "xmin": ["bbox", "xmin"],
+                "ymin": ["bbox", "ymin"],
+                "xmax": ["bbox", "xmax"],
+                "ymax": ["bbox", "ymax"],
+            }
+        },
+    }
+    # a bbox must have 4 numbers when present, an empty table has none
+    if table.num_rows:
+        bbox = table.column("bbox").combine_chunks()
+        column["bbox"] = [
+            pc.min(bbox.field("xmin")).as_py(),
+            pc.min(bbox.field("ymin")).as_py(),
+            pc.max(bbox.field("xmax")).as_py(),
+            pc.max(bbox.field("ymax")).as_py(),
+        ]
+    geo = {
+        "version": "1.1.0",
+        "primary_column": "geometry",
+        "columns": {"geometry": column},
+    }
+    metadata = {**(table.schema.metadata or {}), b"geo": json.dumps(geo).encode("utf-8")}
+    pq.write_table(table.replace_schema_metadata(metadata), path, row_group_size=ROW_GROUP_SIZE, compression="zstd")
+
+
+def write_flatgeobuf(table: pa.Table, path: Path) -> None:
+    # loading GDAL takes a while, so only when FlatGeobuf is actually requested
+    import pyogrio
+
+    table = table.drop_columns(["bbox"])
+    # OGR has no categorical fields, the categories are written out as strings
+    for i, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.string()))
+    pyogrio.write_arrow(
+        table,
+        path,
+        driver="FlatGeobuf",
+        geometry_name="geometry",
+        geometry_type="Point",
+        crs="EPSG:4326",
+        SPATIAL_INDEX="YES",
+    )
+
+
+def export(store: RecordStore, path: Path, formats: Iterable[str]) -> None:
+    """Writes the features in store to every requested format, next to path with the format's extension."""
+    formats = list(formats)
+    if not formats:
+        return
+    table = to_arrow_table(store)
+    for format in formats:
+        output_path = path.with_suffix(EXPORT_FORMATS[format])
+        match format:
+            case "geoparquet":
+                write_geoparquet(table=table, path=output_path)
+            case "flatgeobuf":
+                write_flatgeobuf(table=table, path=output_path)
+        print(f"Exported {table.num_rows} features to {output_path}.")
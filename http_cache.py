@@ -0,0 +1,184 @@
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+import httpx
+
+from metrics import METRICS
+
+
+CACHE_PATH = Path(".cache") / "http.sqlite"
+# entries younger than this are served without asking the server at all
+CACHE_TTL = 24 * 60 * 60
+CACHE_MAX_SIZE = 512 * 1024 * 1024
+# the stored body is already decoded, so these would no longer describe it
+SKIPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+
+class ResponseCache:
+    """
+    Response bodies stored in SQLite, keyed by the full request URL including query params.
+    Least recently used entries are evicted once the total body size exceeds max_size.
+    """
+
+    def __init__(self, path: Path = CACHE_PATH, ttl: float = CACHE_TTL, max_size: int = CACHE_MAX_SIZE) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            """
+            create table if not exists responses (
+                url text primary key,
+                status_code integer not null,
+                headers text not null,
+                body blob not null,
+                size integer not null,
+                etag text,
+                last_modified text,
+                fetched_at real not null,
+                used_at real not null
+            )
+            """
+        )
+        self.connection.execute("create index if not exists responses_used_at on responses (used_at)")
+        # total body size kept up to date by triggers, so eviction does not sum the table on every put;
+        # in the database rather than here, as every client of a crawl has its own connection to it
+        self.connection.execute("create table if not exists cache_size (id integer primary key check (id = 1), total integer not null)")
+        self.connection.execute("insert or ignore into cache_size select 1, coalesce(sum(size), 0) from responses")
+        self.connection.execute(
+            "create trigger if not exists responses_insert after insert on responses"
+            " begin update cache_size set total = total + new.size; end"
+        )
+        self.connection.execute(
+            "create trigger if not exists responses_delete after delete on responses"
+            " begin update cache_size set total = total - old.size; end"
+        )
+        # insert or replace deletes the old row, which fires the delete trigger only with this on
+        self.connection.execute("pragma recursive_triggers = on")
+        self.connection.commit()
+
+    def get(self, url: str) -> tuple[httpx.Response, bool, dict[str, str]] | None:
+        """Returns the cached response, whether it is still fresh and the headers for a conditional request."""
+        row = self.connection.execute(
+            "select status_code, headers, body, etag, last_modified, fetched_at from responses where url = ?",
+            (url,),
+        ).fetchone()
+        if row is None:
+            return None
+        status_code, headers, body, etag, last_modified, fetched_at = row
+        self.connection.execute("update responses set used_at = ? where url = ?", (time.time(), url))
+        self.connection.commit()
+        conditional_headers = {}
+        if etag:
+            conditional_headers["If-None-Match"] = etag
+        if last_modified:
+            conditional_headers["If-Modified-Since"] = last_modified
+        response = httpx.Response(status_code=status_code, headers=json.loads(headers), content=body)
+        return response, time.time() - fetched_at < self.ttl, conditional_headers
+
+    def touch(self, url: str, response: httpx.Response) -> None:
+        """
+        Marks an entry as fresh again after the server answered 304 Not Modified, keeping the
+        validators the 304 came with for the next revalidation.
+        """
+        now = time.time()
+        self.connection.execute(
+            "update responses set fetched_at = ?, used_at = ?, etag = coalesce(?, etag), last_modified = coalesce(?, last_modified)"
+            " where url = ?",
+            (now, now, response.headers.get("ETag"), response.headers.get("Last-Modified"), url),
+        )
+        self.connection.commit()
+
+    def put(self, url: str, response: httpx.Response) -> None:
+        now = time.time()
+        headers = [(k, v) for k, v in response.headers.multi_items() if k.lower() not in SKIPPED_HEADERS]
+        self.connection.execute(
+            "insert or replace into responses values (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                url,
+                response.status_code,
+                json.dumps(headers),
+                response.content,
+                len(response.content),
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+                now,
+                now,
+            ),
+        )
+        self.evict()
+        self.connection.commit()
+
+    def evict(self) -> None:
+        (total,) = self.connection.execute("select total from cache_size").fetchone()
+        if total <= self.max_size:
+            return
+        evicted = []
+        for url, size in self.connection.execute("select url, size from responses order by used_at"):
+            if total <= self.max_size:
+                break
+            evicted.append((url,))
+            total -= size
+        self.connection.executemany("delete from responses where url = ?", evicted)
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class CachingTransport(httpx.AsyncBaseTransport):
+    """
+    Serves GET requests from ResponseCache. Stale entries are revalidated with
+    If-None-Match/If-Modified-Since, so unchanged pages come back as a bodiless 304.
+    """
+
+    def __init__(self, cache: ResponseCache, transport: httpx.AsyncBaseTransport) -> None:
+        self.cache = cache
+        self.transport = transport
+
+    def prepare(self, request: httpx.Request) -> tuple[httpx.Response | None, httpx.Response | None]:
+        """Returns the response to serve straight from cache, or the stale one to revalidate."""
+        if request.method != "GET":
+            return None, None
+        cached = self.cache.get(str(request.url))
+        if cached is None:
+            return None, None
+        response, fresh, conditional_headers = cached
+        if fresh:
+            response.extensions["from_cache"] = True
+            METRICS.record_cache_hit(request.url)
+            return response, None
+        request.headers.update(conditional_headers)
+        return None, response
+
+    def finish(self, request: httpx.Request, response: httpx.Response, stale: httpx.Response | None) -> httpx.Response:
+        url = str(request.url)
+        if stale is not None and response.status_code == 304:
+            self.cache.touch(url, response)
+            stale.extensions["from_cache"] = True
+            METRICS.record_cache_hit(request.url)
+            return stale
+        if request.method == "GET" and response.status_code == 200:
+            self.cache.put(url, response)
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=[(k, v) for k, v in response.headers.multi_items() if k.lower() not in SKIPPED_HEADERS],
+            content=response.content,
+            extensions={**response.extensions, "from_cache": False},
+        )
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        cached, stale = self.prepare(request)
+        if cached is not None:
+            return cached
+        response = await self.transport.handle_async_request(request)
+        try:
+            await response.aread()
+        finally:
+            await response.aclose()
+        return self.finish(request, response, stale)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+        self.cache.close()
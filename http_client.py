@@ -0,0 +1,88 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+from http_cache import CACHE_PATH, CACHE_TTL, CachingTransport, ResponseCache
+from rate_control import AdaptiveTransport
+from response_archive import ArchivingTransport, ReplayTransport, ResponseArchive
+
+try:
+    import h2  # noqa: F401
+except ImportError:
+    h2 = None
+
+
+# set from the command line of the scripts, e.g. to disable the cache for a single run
+USE_CACHE = True
+# serves every request of the process instead of the network when set, e.g. recorded pages in bench_crawl.py
+TRANSPORT: httpx.AsyncBaseTransport | None = None
+# set from --archive: every successful GET is appended to this archive
+ARCHIVE: Path | None = None
+# set from --replay: every request is served from this archive, without the cache or rate control
+REPLAY: Path | None = None
+# ceiling of the adaptive concurrency when the limits do not set max_connections
+MAX_CONCURRENCY = 16
+# offered to servers over TLS when the h2 package is installed (httpx[http2]), plain http stays on HTTP/1.1
+HTTP2 = h2 is not None
+
+
+def create_client(limits: httpx.Limits = httpx.Limits(), timeout: float = 5.0) -> httpx.AsyncClient:
+    """Requests go through the per-host rate controller, max_connections is the most it may allow."""
+    if REPLAY is not None:
+        # nothing to be polite to, the pages come from disk as fast as they are asked for
+        return httpx.AsyncClient(transport=ReplayTransport(ResponseArchive(path=REPLAY, read_only=True)), timeout=timeout)
+    transport: httpx.AsyncBaseTransport = AdaptiveTransport(
+        transport=TRANSPORT or httpx.AsyncHTTPTransport(limits=limits, http2=HTTP2),
+        max_concurrency=limits.max_connections or MAX_CONCURRENCY,
+    )
+    if USE_CACHE:
+        transport = CachingTransport(cache=ResponseCache(path=CACHE_PATH, ttl=CACHE_TTL), transport=transport)
+    if ARCHIVE is not None:
+        transport = ArchivingTransport(archive=ResponseArchive(path=ARCHIVE), transport=transport)
+    return httpx.AsyncClient(transport=transport, timeout=timeout)
+
+
+class ClientPool:
+    """
+    One client per host for every crawl running in the process, so connections (and the
+    kept-alive ones between the listing, dictionary and detail phases) are shared, closed together.
+    The first crawl asking for a host decides its limits and timeout.
+    """
+
+    def __init__(self) -> None:
+        self.clients: dict[str, httpx.AsyncClient] = {}
+
+    def get(self, host: str, limits: httpx.Limits = httpx.Limits(), timeout: float = 5.0) -> httpx.AsyncClient:
+        client = self.clients.get(host)
+        if client is None:
+            client = self.clients[host] = create_client(limits=limits, timeout=timeout)
+        return client
+
+    async def aclose(self) -> None:
+        for client in self.clients.values():
+            await client.aclose()
+        self.clients.clear()
+
+    async def __aenter__(self) -> "ClientPool":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+
+@asynccontextmanager
+async def use_client(
+    clients: ClientPool | None,
+    host: str,
+    limits: httpx.Limits = httpx.Limits(),
+    timeout: float = 5.0,
+) -> AsyncIterator[httpx.AsyncClient]:
+    """The pool's client for host, or a client of its own closed on exit when there is no pool."""
+    if clients is not None:
+        yield clients.get(host=host, limits=limits, timeout=timeout)
+        return
+    async with create_client(limits=limits, timeout=timeout) as client:
+        yield client
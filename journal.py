@@ -0,0 +1,92 @@
+import dataclasses
+import json
+import sqlite3
+import typing
+from datetime import date
+from pathlib import Path
+from typing import Any
+
+
+JOURNAL_DIR = Path(".cache")
+
+
+def dump_record(record: Any) -> str:
+    """A dataclass row as JSON, dates as ISO strings."""
+    return json.dumps(dataclasses.asdict(record), ensure_ascii=False, default=date.isoformat)
+
+
+def load_record(cls: type, data: str) -> Any:
+    """Inverse of dump_record for the dataclass cls."""
+    values = json.loads(data)
+    for name, annotation in typing.get_type_hints(cls).items():
+        if date in (annotation, *typing.get_args(annotation)) and values.get(name):
+            values[name] = date.fromisoformat(values[name])
+    return cls(**values)
+
+
+def remove_journal(path: Path) -> None:
+    """The journal database with its WAL and shared-memory files, a stale WAL would replay into a new one."""
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{path}{suffix}").unlink(missing_ok=True)
+
+
+class CrawlJournal:
+    """
+    Work finished by a crawl, committed as it finishes: the entries of every listing page by offset
+    and every detail record by url. A crawl resumed from the journal takes both from it instead
+    of the network, a fresh crawl starts with an empty journal.
+    """
+
+    def __init__(self, path: Path, resume: bool = False) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if not resume:
+            remove_journal(path)
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        # every commit survives a crash of the process, and is cheap enough to do per record
+        self.connection.execute("pragma journal_mode = wal")
+        self.connection.execute("pragma synchronous = normal")
+        self.connection.execute("create table if not exists listings (offset integer primary key, entries text not null)")
+        self.connection.execute("create table if not exists records (url text primary key, record text not null)")
+        self.connection.commit()
+        if resume:
+            (listings,) = self.connection.execute("select count(*) from listings").fetchone()
+            (records,) = self.connection.execute("select count(*) from records").fetchone()
+            print(f"Resuming from {path}: {listings} listing pages, {records} records.")
+
+    def get_listing(self, offset: int) -> list | None:
+        row = self.connection.execute("select entries from listings where offset = ?", (offset,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def put_listing(self, offset: int, entries: list) -> None:
+        self.connection.execute(
+            "insert or replace into listings (offset, entries) values (?, ?)",
+            (offset, json.dumps(entries, ensure_ascii=False)),
+        )
+        self.connection.commit()
+
+    def get_record(self, cls: type, url: str) -> Any | None:
+        row = self.connection.execute("select record from records where url = ?", (url,)).fetchone()
+        return load_record(cls, row[0]) if row is not None else None
+
+    def put_record(self, url: str, record: Any) -> None:
+        self.connection.execute("insert or replace into records (url, record) values (?, ?)", (url, dump_record(record)))
+        self.connection.commit()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def finish(self) -> None:
+        """The crawl completed, nothing is left to resume."""
+        self.close()
+        remove_journal(self.path)
+
+    def __enter__(self) -> "CrawlJournal":
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None, *exc_info: Any) -> None:
+        if exc_type is None:
+            self.finish()
+        else:
+            self.close()
+            print(f"Crawl journal kept in {self.path}, run again with --resume to continue.")
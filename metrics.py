@@ -0,0 +1,173 @@
+import asyncio
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+import httpx
+
+
+# upper bounds of the latency histogram buckets in milliseconds, the last one catches everything slower
+BUCKETS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, float("inf")]
+# query params telling the page types of a site apart, e.g. view=zamek vs view=zamki
+ENDPOINT_PARAMS = ("view", "z")
+
+
+def get_endpoint(url: httpx.URL) -> str:
+    """Page type of a URL: its distinguishing query params, or the path when it has none."""
+    params = [f"{name}={url.params[name]}" for name in ENDPOINT_PARAMS if name in url.params]
+    return "&".join(params) if params else url.path
+
+
+class Histogram:
+    def __init__(self) -> None:
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms: float) -> None:
+        self.counts[next(i for i, bound in enumerate(BUCKETS_MS) if ms <= bound)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile, the maximum for the open-ended bucket."""
+        seen = 0
+        for count, bound in zip(self.counts, BUCKETS_MS):
+            seen += count
+            if seen >= q * self.count:
+                return round(min(bound, self.max_ms), 1)
+        return round(self.max_ms, 1)
+
+    def summary(self) -> dict:
+        return dict(
+            count=self.count,
+            mean_ms=round(self.total_ms / self.count, 1) if self.count else None,
+            p50_ms=self.quantile(0.5),
+            p90_ms=self.quantile(0.9),
+            p99_ms=self.quantile(0.99),
+            max_ms=round(self.max_ms, 1),
+            buckets={("inf" if bound == float("inf") else str(bound)): count for bound, count in zip(BUCKETS_MS, self.counts)},
+        )
+
+
+class CrawlMetrics:
+    """
+    Counters of one crawl: network latency per host and endpoint, bytes received, cache hits,
+    retries, parse and write time, detail queue depth and rows produced.
+    Everything runs on the event loop thread; the progress thread only reads.
+    """
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.latency: defaultdict[tuple[str, str], Histogram] = defaultdict(Histogram)
+        self.bytes: Counter[str] = Counter()
+        self.cache_hits: Counter[str] = Counter()
+        self.retries: Counter[tuple[str, str]] = Counter()
+        self.parse: defaultdict[str, Histogram] = defaultdict(Histogram)
+        self.write_seconds = 0.0
+        self.rows = 0
+        self.queues: dict[str, asyncio.Queue] = {}
+        self.queue_depth_max: Counter[str] = Counter()
+        self.queue_depth_total: Counter[str] = Counter()
+
+    def record_request(self, url: httpx.URL, seconds: float, size: int) -> None:
+        self.latency[(url.host, get_endpoint(url))].add(seconds * 1000)
+        self.bytes[url.host] += size
+
+    def record_cache_hit(self, url: httpx.URL) -> None:
+        self.cache_hits[url.host] += 1
+
+    def record_retry(self, url: httpx.URL, reason: str) -> None:
+        self.retries[(url.host, reason)] += 1
+
+    @contextmanager
+    def time_parse(self, page_type: str) -> Iterator[None]:
+        """Parse time of one page as seen by the crawl, including the trip to a parser process."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.parse[page_type].add((time.perf_counter() - start) * 1000)
+
+    def record_write(self, seconds: float) -> None:
+        self.write_seconds += seconds
+
+    def watch_queue(self, name: str, queue: asyncio.Queue) -> None:
+        self.queues[name] = queue
+
+    def record_row(self) -> None:
+        self.rows += 1
+        # depths are sampled once per row, enough to tell starved workers from a stalled producer
+        for name, queue in self.queues.items():
+            depth = queue.qsize()
+            self.queue_depth_max[name] = max(self.queue_depth_max[name], depth)
+            self.queue_depth_total[name] += depth
+
+    def summary(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        return dict(
+            seconds=round(elapsed, 2),
+            rows=self.rows,
+            rows_per_second=round(self.rows / elapsed, 2) if elapsed else None,
+            requests={
+                f"{host} {endpoint}": histogram.summary()
+                for (host, endpoint), histogram in sorted(self.latency.items())
+            },
+            bytes=dict(self.bytes),
+            cache_hits=dict(self.cache_hits),
+            retries={f"{host} {reason}": count for (host, reason), count in sorted(self.retries.items())},
+            parse={page_type: histogram.summary() for page_type, histogram in sorted(self.parse.items())},
+            write_seconds=round(self.write_seconds, 3),
+            queue_depth={
+                name: dict(
+                    max=self.queue_depth_max[name],
+                    mean=round(self.queue_depth_total[name] / self.rows, 1) if self.rows else None,
+                )
+                for name in self.queues
+            },
+        )
+
+    def write_summary(self, path: Path) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+        print(f"Metrics written to {path}.")
+
+    def progress_line(self) -> str:
+        elapsed = time.monotonic() - self.started
+        requests = sum(histogram.count for histogram in list(self.latency.values()))
+        queues = ", ".join(f"{name} {queue.qsize()}" for name, queue in list(self.queues.items()))
+        return (
+            f"[{elapsed:6.0f} s] requests: {requests} ({sum(self.cache_hits.values())} from cache), "
+            f"{sum(self.bytes.values()) / 1e6:.1f} MB, rows: {self.rows} ({self.rows / elapsed:.1f}/s), "
+            f"retries: {sum(self.retries.values())}" + (f", queue: {queues}" if queues else "")
+        )
+
+    @contextmanager
+    def progress(self, interval: float) -> Iterator[None]:
+        """Prints a progress line every interval seconds from a background thread, 0 prints nothing."""
+        if interval <= 0:
+            yield
+            return
+        stopped = threading.Event()
+
+        def report() -> None:
+            while not stopped.wait(interval):
+                print(self.progress_line(), flush=True)
+
+        thread = threading.Thread(target=report, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stopped.set()
+            thread.join()
+
+
+# one crawl per process
+METRICS = CrawlMetrics()
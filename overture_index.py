@@ -0,0 +1,157 @@
+# /// script
+# requires-python = ">=3.13"
+# dependencies = [
+#     "numpy>=2.3.0",
+# ]
+# [tool.uv]
+# exclude-newer = "2026-02-04T00:00:00Z"
+# ///
+
+"""
+Attaches the closest Overture place to every feature, the Python counterpart of the
+`left join lateral ... order by ST_Distance_Spheroid ... limit 1` in zamki.sql and dwory.sql.
+The places are read once from the GeoPackage into a spatial_index.GridIndex, which is kept
+in .cache/ next to the HTTP cache and rebuilt only when the GeoPackage changes.
+"""
+
+import argparse
+import json
+import sqlite3
+import struct
+from collections.abc import Iterator
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+from sinks import FORMATS, FeatureWriter, load_features
+from spatial_index import GridIndex
+
+
+OVERTURE_PATH = Path("overture_places_2026-01-21.gpkg")
+INDEX_DIR = Path(".cache")
+# dwory.sql matches within 100 m, zamki.sql within 200 m
+MATCH_DISTANCE = 100.0
+# GeoPackage envelope sizes in bytes by the envelope indicator in the header flags
+ENVELOPE_SIZES = {0: 0, 1: 32, 2: 48, 3: 48, 4: 64}
+
+
+def parse_gpkg_point(blob: bytes) -> tuple[float, float]:
+    """Lon/lat of a GeoPackage point geometry blob: GP header, optional envelope, WKB point."""
+    flags = blob[3]
+    offset = 8 + ENVELOPE_SIZES[(flags >> 1) & 0b111]
+    byte_order = "<" if blob[offset] == 1 else ">"
+    return struct.unpack_from(f"{byte_order}dd", blob, offset + 5)
+
+
+def iter_gpkg_rows(path: Path) -> Iterator[tuple[float, float, dict]]:
+    """Coordinates and attributes of the point features in the first features table of a GeoPackage."""
+    with sqlite3.connect(f"file:{path}?mode=ro", uri=True) as connection:
+        table, geometry_column = connection.execute(
+            "select c.table_name, g.column_name from gpkg_contents c"
+            " join gpkg_geometry_columns g on g.table_name = c.table_name"
+            " where c.data_type = 'features' limit 1"
+        ).fetchone()
+        cursor = connection.execute(f'select * from "{table}"')
+        columns = [column[0] for column in cursor.description]
+        for row in cursor:
+            properties = dict(zip(columns, row))
+            properties.pop("fid", None)
+            x, y = parse_gpkg_point(properties.pop(geometry_column))
+            yield x, y, properties
+
+
+def read_gpkg_points(path: Path) -> tuple[np.ndarray, np.ndarray, list[dict]]:
+    """Coordinates and attributes of the point features in the first features table of a GeoPackage."""
+    lon = []
+    lat = []
+    places = []
+    for x, y, properties in iter_gpkg_rows(path):
+        lon.append(x)
+        lat.append(y)
+        places.append(properties)
+    return np.array(lon, dtype=np.float64), np.array(lat, dtype=np.float64), places
+
+
+class OvertureIndex:
+    """Overture places with a grid index over their locations."""
+
+    def __init__(self, index: GridIndex, places: list[dict]) -> None:
+        self.index = index
+        self.places = places
+
+    @classmethod
+    def build(cls, path: Path, cell_size: float = MATCH_DISTANCE) -> "OvertureIndex":
+        lon, lat, places = read_gpkg_points(path)
+        return cls(index=GridIndex(lon=lon, lat=lat, cell_size=cell_size), places=places)
+
+    def save(self, path: Path, source: Path) -> None:
+        self.index.save(path.with_suffix(".npz"))
+        stat = source.stat()
+        with open(path.with_suffix(".json"), "w", encoding="utf-8") as f:
+            json.dump(dict(source_mtime=stat.st_mtime, source_size=stat.st_size, places=self.places), f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: Path, source: Path) -> "OvertureIndex | None":
+        """The saved index, or None if there is none or the source GeoPackage changed since it was built."""
+        if not path.with_suffix(".npz").exists() or not path.with_suffix(".json").exists():
+            return None
+        with open(path.with_suffix(".json"), "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        stat = source.stat()
+        if saved["source_mtime"] != stat.st_mtime or saved["source_size"] != stat.st_size:
+            return None
+        return cls(index=GridIndex.load(path.with_suffix(".npz")), places=saved["places"])
+
+    @classmethod
+    def load_or_build(cls, source: Path = OVERTURE_PATH, index_dir: Path = INDEX_DIR) -> "OvertureIndex":
+        path = index_dir / source.stem
+        overture_index = cls.load(path=path, source=source)
+        if overture_index is not None:
+            print(f"Loaded Overture index {path} ({len(overture_index.places)} places).")
+            return overture_index
+        overture_index = cls.build(source)
+        index_dir.mkdir(parents=True, exist_ok=True)
+        overture_index.save(path=path, source=source)
+        print(f"Built Overture index {path} from {source} ({len(overture_index.places)} places).")
+        return overture_index
+
+    def nearest(self, lon: np.ndarray, lat: np.ndarray, radius: float) -> tuple[np.ndarray, np.ndarray]:
+        """Index into places of and distance to the closest place within radius for every point, -1/nan if none."""
+        return self.index.query_nearest(lon=lon, lat=lat, radius=radius)
+
+
+def attach_nearest(features: list[dict], overture_index: OvertureIndex, radius: float = MATCH_DISTANCE) -> list[dict]:
+    """
+    Adds the attributes of the closest Overture place within radius to every feature's properties,
+    None for all of them when there is no place that close (like the left join in the SQL).
+    """
+    coordinates = np.array([feature["geometry"]["coordinates"][:2] for feature in features], dtype=np.float64).reshape(-1, 2)
+    nearest, _ = overture_index.nearest(lon=coordinates[:, 0], lat=coordinates[:, 1], radius=radius)
+    columns = list(overture_index.places[0]) if overture_index.places else []
+    empty = dict.fromkeys(columns)
+    for feature, i in zip(features, nearest.tolist()):
+        feature["properties"].update(overture_index.places[i] if i >= 0 else empty)
+    print(f"Attached Overture places to {int((nearest >= 0).sum())} of {len(features)} features.")
+    return features
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", type=Path, required=True, help="dworysp, zamkisp or conflation output")
+    parser.add_argument("--overture", type=Path, default=OVERTURE_PATH)
+    parser.add_argument("--radius", type=float, default=MATCH_DISTANCE, help="match distance in meters")
+    parser.add_argument("--format", choices=FORMATS, default="geojson")
+    parser.add_argument("--output", type=Path, help="defaults to <input stem>_overture_<today>")
+    args = parser.parse_args()
+    output_path = args.output or Path(f"{args.input.stem}_overture_{date.today().isoformat()}{FORMATS[args.format]}")
+    overture_index = OvertureIndex.load_or_build(source=args.overture)
+    features = attach_nearest(features=load_features(args.input), overture_index=overture_index, radius=args.radius)
+    with FeatureWriter(path=output_path, format=args.format) as writer:
+        for feature in features:
+            writer.write(feature)
+    print(f"Written {len(features)} features to {output_path}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import asyncio
+import re
+
+import httpx
+from bs4 import Tag
+
+from metrics import METRICS
+from parsing import get_rows, parse
+
+
+PAGE_SIZE = 100
+RE_LIMITSTART = re.compile(r"limitstart=(\d+)")
+RE_PAGE_COUNTER = re.compile(r"Strona\s+\d+\s+z\s+(\d+)")
+
+
+def get_main_section(markup: str, container_id: str) -> Tag:
+    return parse(markup=markup, id=container_id).find(id=container_id)
+
+
+def get_listing_rows(main_section: Tag) -> list[Tag]:
+    tables = main_section.find_all("table")
+    if len(tables) < 2:
+        raise Exception("Expected at least two tables in HTML.")
+    return get_rows(tables[1])
+
+
+def get_last_offset(main_section: Tag, step: int = PAGE_SIZE) -> int | None:
+    """Reads the offset of the last listing page from the pagination footer, None if there is no footer."""
+    offsets = [
+        int(match.group(1))
+        for a in main_section.find_all("a", href=RE_LIMITSTART)
+        if (match := RE_LIMITSTART.search(a["href"])) is not None
+    ]
+    if offsets:
+        return max(offsets)
+    counter = RE_PAGE_COUNTER.search(main_section.text)
+    if counter is not None:
+        return (int(counter.group(1)) - 1) * step
+    return None
+
+
+async def get_page(client: httpx.AsyncClient, url_template: str, offset: int, label: str) -> str:
+    url = url_template.format(limitstart=offset)
+    response = await client.get(url=url)
+    response.raise_for_status()
+    print(f"{label}() - offset: {offset} - Response status: {response.status_code} - url: {url}")
+    return response.text
+
+
+async def get_all_listing_rows(
+    client: httpx.AsyncClient,
+    url_template: str,
+    container_id: str,
+    label: str,
+    step: int = PAGE_SIZE,
+) -> list[Tag]:
+    """
+    Fetches every page of a Joomla listing. The first page's footer tells how many pages there are,
+    those are fetched concurrently. The footer may be truncated or stale, so the pages after its last
+    one are then walked one by one until an empty one is found, as they are without a footer.
+    """
+    markup = await get_page(client=client, url_template=url_template, offset=0, label=label)
+    with METRICS.time_parse("słowniki"):
+        first_page = get_main_section(markup=markup, container_id=container_id)
+        results = get_listing_rows(first_page)
+    if len(results) == 0:
+        return results
+    last_offset = get_last_offset(first_page, step=step)
+    offset = step
+    if last_offset is not None:
+        pages = await asyncio.gather(*[
+            get_page(client=client, url_template=url_template, offset=offset, label=label)
+            for offset in range(step, last_offset + 1, step)
+        ])
+        for page in pages:
+            with METRICS.time_parse("słowniki"):
+                results.extend(get_listing_rows(get_main_section(markup=page, container_id=container_id)))
+        offset = last_offset + step
+    footer_rows = len(results)
+    while True:
+        page = await get_page(client=client, url_template=url_template, offset=offset, label=label)
+        with METRICS.time_parse("słowniki"):
+            rows = get_listing_rows(get_main_section(markup=page, container_id=container_id))
+        if len(rows) == 0:
+            break
+        results.extend(rows)
+        offset += step
+    if last_offset is None:
+        print(f"{label}() - {len(results)} rows on {offset // step} pages, no pagination footer.")
+    else:
+        expected_pages = last_offset // step + 1
+        print(
+            f"{label}() - {len(results)} rows, the footer showed {expected_pages} pages (at most {expected_pages * step} rows)"
+            f", {len(results) - footer_rows} rows found beyond it."
+        )
+    return results
@@ -0,0 +1,53 @@
+import asyncio
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+
+import parsing
+
+
+# 0 parses on the event loop thread
+PARSE_WORKERS = 0
+
+
+def init_worker(backend: str, initializer: Callable[..., None] | None, initargs: tuple) -> None:
+    # module globals are not inherited under the spawn/forkserver start methods
+    parsing.BACKEND = backend
+    if initializer is not None:
+        initializer(*initargs)
+
+
+class ParserPool:
+    """
+    Runs parser functions in worker processes, so parsing one page does not block
+    the event loop from servicing other responses. With 0 workers parsers run inline.
+    The initializer runs once in every worker process (or in this process when inline).
+    """
+
+    def __init__(
+        self,
+        workers: int = PARSE_WORKERS,
+        initializer: Callable[..., None] | None = None,
+        initargs: tuple = (),
+    ) -> None:
+        self.executor = None
+        if workers > 0:
+            self.executor = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=init_worker,
+                initargs=(parsing.BACKEND, initializer, initargs),
+            )
+        elif initializer is not None:
+            initializer(*initargs)
+
+    async def run(self, func: Callable[..., Any], /, *args: Any) -> Any:
+        if self.executor is None:
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def __enter__(self) -> "ParserPool":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,64 @@
+import time
+from dataclasses import dataclass
+
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+
+try:
+    import lxml  # noqa: F401
+except ImportError:
+    lxml = None
+
+
+# tree builders understood by BeautifulSoup, html.parser is the reference the scrapers were written against
+BACKENDS = ["html.parser"] + (["lxml"] if lxml is not None else [])
+# set from the command line of the scripts
+BACKEND = "html.parser"
+
+
+@dataclass(slots=True)
+class ParseStats:
+    """Pages parsed by this process and seconds spent building their trees."""
+
+    pages: int = 0
+    seconds: float = 0.0
+
+
+STATS = ParseStats()
+
+
+def parse(
+    markup: str | bytes,
+    id: str | None = None,
+    class_: str | list[str] | None = None,
+    backend: str | None = None,
+) -> BeautifulSoup:
+    """
+    Parses only the part of the page the scrapers read: the element with the given id
+    or the elements with the given class(es), together with their descendants.
+    Everything else on the page is skipped by the tree builder.
+    """
+    if id is not None:
+        strainer = SoupStrainer(id=id)
+    elif class_ is not None:
+        strainer = SoupStrainer(class_=class_)
+    else:
+        strainer = None
+    start = time.perf_counter()
+    soup = BeautifulSoup(markup=markup, features=backend or BACKEND, parse_only=strainer)
+    STATS.pages += 1
+    STATS.seconds += time.perf_counter() - start
+    return soup
+
+
+def get_rows(table: Tag) -> list[Tag]:
+    """
+    Direct rows of a table. The source html is broken and missing tbody, but a backend
+    which adds it (or a fixed page) must not make the rows disappear.
+    """
+    rows = []
+    for child in table.find_all(["tr", "thead", "tbody", "tfoot"], recursive=False):
+        if child.name == "tr":
+            rows.append(child)
+        else:
+            rows.extend(child.find_all("tr", recursive=False))
+    return rows
@@ -0,0 +1,195 @@
+import asyncio
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+from metrics import METRICS
+
+
+# concurrency every host starts at, it grows from here while the responses stay fast
+INITIAL_CONCURRENCY = 2
+MIN_CONCURRENCY = 1
+# multiplicative decrease on throttling, errors and slowdowns
+BACKOFF_FACTOR = 0.5
+# latency (smoothed) this many times above the best seen counts as the server slowing down
+LATENCY_TOLERANCE = 2.0
+LATENCY_SMOOTHING = 0.2
+# differences between latencies this short are noise rather than load
+MIN_LATENCY = 0.05
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_EXCEPTIONS = (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)
+RETRY_METHODS = {"GET", "HEAD"}
+MAX_RETRIES = 4
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+# hosts served by one server and throttled together, any other host has a budget of its own
+BUDGETS = {
+    "zamkisp.pl": "zamkisp.pl",
+    "dworyipalace.zamkisp.pl": "zamkisp.pl",
+}
+
+
+def get_budget_key(host: str) -> str:
+    """The budget of a host: its entry in BUDGETS, otherwise the full host name."""
+    return BUDGETS.get(host, host)
+
+
+def get_retry_delay(attempt: int, retry_after: float | None = None) -> float:
+    """Server's Retry-After if given, otherwise exponential backoff with full jitter."""
+    if retry_after is not None:
+        return min(retry_after, RETRY_MAX_DELAY)
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2**attempt))
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Retry-After in seconds, given either as seconds or as an HTTP date."""
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class HostController:
+    """
+    AIMD limit of requests in flight to one host: every healthy response adds 1/limit
+    (about one more request per round trip), throttling, errors and rising latency halve it,
+    at most once per round trip so a burst of failures from one overload counts once.
+    """
+
+    def __init__(self, key: str, max_concurrency: int) -> None:
+        self.key = key
+        self.max_concurrency = max_concurrency
+        self.limit = float(min(INITIAL_CONCURRENCY, max_concurrency))
+        self.in_flight = 0
+        self.waiters: deque[asyncio.Future[None]] = deque()
+        self.latency: float | None = None
+        self.best_latency: float | None = None
+        self.decreased_at = 0.0
+        self.paused_until = 0.0
+
+    async def acquire(self) -> None:
+        while (delay := self.paused_until - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+        if self.in_flight < int(self.limit) and not self.waiters:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # the slot was already handed over, pass it on
+                self.in_flight -= 1
+                self.wake_waiters()
+            else:
+                self.waiters.remove(waiter)
+            raise
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self.wake_waiters()
+
+    def on_response(self, latency: float) -> None:
+        self.latency = latency if self.latency is None else self.latency + LATENCY_SMOOTHING * (latency - self.latency)
+        self.best_latency = self.latency if self.best_latency is None else min(self.best_latency, self.latency)
+        if self.latency > LATENCY_TOLERANCE * max(self.best_latency, MIN_LATENCY):
+            self.decrease(reason=f"latency {self.latency:.2f} s")
+        else:
+            self.limit = min(self.limit + 1 / self.limit, float(self.max_concurrency))
+
+    def on_overload(self, reason: str, retry_after: float | None = None) -> None:
+        if retry_after is not None:
+            self.paused_until = max(self.paused_until, time.monotonic() + min(retry_after, RETRY_MAX_DELAY))
+        self.decrease(reason=reason)
+
+    def decrease(self, reason: str) -> None:
+        now = time.monotonic()
+        if now - self.decreased_at < (self.latency or 0.0):
+            return
+        self.decreased_at = now
+        self.limit = max(self.limit * BACKOFF_FACTOR, float(MIN_CONCURRENCY))
+        # the slow phase is over once the limit dropped, judge the next responses against it afresh
+        self.best_latency = self.latency
+        print(f"{self.key}: {reason}, concurrency lowered to {int(self.limit)}.")
+
+    def wake_waiters(self) -> None:
+        while self.waiters and self.in_flight < int(self.limit):
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+
+# shared by every client of the process, keyed by get_budget_key
+CONTROLLERS: dict[str, HostController] = {}
+
+
+def get_controller(host: str, max_concurrency: int) -> HostController:
+    key = get_budget_key(host)
+    controller = CONTROLLERS.get(key)
+    if controller is None:
+        controller = CONTROLLERS[key] = HostController(key=key, max_concurrency=max_concurrency)
+    else:
+        controller.max_concurrency = max(controller.max_concurrency, max_concurrency)
+    return controller
+
+
+class AdaptiveTransport(httpx.AsyncBaseTransport):
+    """
+    Sends every request through its host's HostController and retries transient failures
+    (timeouts, dropped connections, 429/5xx) of idempotent requests with jittered backoff.
+    The body is read while the request still holds its slot.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, max_concurrency: int) -> None:
+        self.transport = transport
+        self.max_concurrency = max_concurrency
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        controller = get_controller(host=request.url.host, max_concurrency=self.max_concurrency)
+        retries = MAX_RETRIES if request.method in RETRY_METHODS else 0
+        attempt = 0
+        while True:
+            await controller.acquire()
+            try:
+                started = time.monotonic()
+                response = await self.transport.handle_async_request(request)
+                try:
+                    await response.aread()
+                finally:
+                    await response.aclose()
+            except RETRY_EXCEPTIONS as e:
+                reason = type(e).__name__
+                retry_after = None
+                controller.on_overload(reason=reason)
+                if attempt == retries:
+                    raise
+            else:
+                latency = time.monotonic() - started
+                METRICS.record_request(url=request.url, seconds=latency, size=len(response.content))
+                if response.status_code not in RETRY_STATUSES:
+                    controller.on_response(latency=latency)
+                    return response
+                reason = str(response.status_code)
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                controller.on_overload(reason=reason, retry_after=retry_after)
+                if attempt == retries:
+                    return response
+            finally:
+                controller.release()
+            METRICS.record_retry(url=request.url, reason=reason)
+            delay = get_retry_delay(attempt, retry_after)
+            print(f"{request.url}: {reason}, retry {attempt + 1} of {retries} in {delay:.1f} s.")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
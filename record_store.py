@@ -0,0 +1,118 @@
+from datetime import date
+
+import numpy as np
+import pyarrow as pa
+
+
+# rows buffered as Python values before they are packed into Arrow arrays
+CHUNK_SIZE = 1024
+# column kind -> Arrow type of its chunks, a category is stored as codes into one dictionary per column
+ARROW_TYPES = {
+    "string": pa.string(),
+    "category": pa.int32(),
+    "date": pa.date32(),
+    "float": pa.float64(),
+}
+
+
+class RecordStore:
+    """
+    Point features kept as columns instead of dicts: every property in Arrow arrays appended a chunk
+    at a time, the few distinct values of categorical properties (wojewodztwo, powiat, ...) stored once
+    per column with int32 codes in the rows, and the coordinates in float64 NumPy arrays (NaN when missing).
+    Properties are strings unless column_types says otherwise.
+    Only the columnar exports (--export) and crawl.py --conflate read it. The default geojson output
+    is written from the scrapers' list of rows, which it needs sorted, so the store saves memory
+    only when the rows are streamed (the sequence formats) or once that list is written and cleared.
+    """
+
+    def __init__(self, column_types: dict[str, str], chunk_size: int = CHUNK_SIZE) -> None:
+        self.column_types = column_types
+        self.chunk_size = chunk_size
+        # set by the first feature, all features of a source have the same properties
+        self.names: list[str] | None = None
+        self.pending: dict[str, list] = {}
+        self.pending_x: list[float] = []
+        self.pending_y: list[float] = []
+        self.chunks: dict[str, list[pa.Array]] = {}
+        self.x_chunks: list[np.ndarray] = []
+        self.y_chunks: list[np.ndarray] = []
+        self.categories: dict[str, dict[str, int]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(chunk) for chunk in self.x_chunks) + len(self.pending_x)
+
+    def get_kind(self, name: str) -> str:
+        return self.column_types.get(name, "string")
+
+    def append(self, feature: dict | None) -> None:
+        """Adds a GeoJSON point feature (as made by the scrapers' to_feature), None is skipped."""
+        if feature is None:
+            return
+        properties = feature["properties"]
+        if self.names is None:
+            self.names = list(properties)
+            self.pending = {name: [] for name in self.names}
+            self.chunks = {name: [] for name in self.names}
+            self.categories = {name: {} for name in self.names if self.get_kind(name) == "category"}
+        for name in self.names:
+            value = properties.get(name)
+            match self.get_kind(name):
+                case "category":
+                    if value is not None:
+                        codes = self.categories[name]
+                        value = codes.setdefault(value, len(codes))
+                case "date":
+                    if isinstance(value, str):
+                        value = date.fromisoformat(value) if value else None
+                case "float":
+                    if value is not None:
+                        value = float(value)
+            self.pending[name].append(value)
+        x, y = feature["geometry"]["coordinates"]
+        self.pending_x.append(np.nan if x is None else x)
+        self.pending_y.append(np.nan if y is None else y)
+        if len(self.pending_x) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Packs the buffered rows into a chunk."""
+        if not self.pending_x:
+            return
+        for name, values in self.pending.items():
+            self.chunks[name].append(pa.array(values, type=ARROW_TYPES[self.get_kind(name)]))
+            values.clear()
+        self.x_chunks.append(np.array(self.pending_x, dtype=np.float64))
+        self.y_chunks.append(np.array(self.pending_y, dtype=np.float64))
+        self.pending_x.clear()
+        self.pending_y.clear()
+
+    def coordinates(self) -> tuple[np.ndarray, np.ndarray]:
+        """Longitudes and latitudes of all rows, the arrays themselves when there is a single chunk."""
+        self.flush()
+        if not self.x_chunks:
+            return np.empty(0), np.empty(0)
+        if len(self.x_chunks) > 1:
+            # later appends start new chunks, the merged ones are kept to avoid concatenating again
+            self.x_chunks = [np.concatenate(self.x_chunks)]
+            self.y_chunks = [np.concatenate(self.y_chunks)]
+        return self.x_chunks[0], self.y_chunks[0]
+
+    def column(self, name: str) -> pa.ChunkedArray:
+        """A property column over all chunks, categories as dictionary arrays sharing one dictionary."""
+        self.flush()
+        kind = self.get_kind(name)
+        chunks = self.chunks.get(name, [])
+        if kind != "category":
+            return pa.chunked_array(chunks, type=ARROW_TYPES[kind])
+        # codes only grow, so the final dictionary is valid for the earlier chunks too
+        dictionary = pa.array(list(self.categories.get(name, {})), type=pa.string())
+        return pa.chunked_array(
+            [pa.DictionaryArray.from_arrays(codes, dictionary) for codes in chunks],
+            type=pa.dictionary(pa.int32(), pa.string()),
+        )
+
+    def to_arrow(self) -> pa.Table:
+        """The properties as an Arrow table, sharing the chunks' buffers."""
+        names = self.names if self.names is not None else list(self.column_types)
+        return pa.table({name: self.column(name) for name in names})
@@ -0,0 +1,137 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+
+import httpx
+
+from http_cache import SKIPPED_HEADERS
+
+
+ARCHIVE_PATH = Path("archive.sqlite")
+
+
+def get_replay_workers(workers: int, parse_workers: int) -> tuple[int, int]:
+    """Page and parser workers of a replay: every core parsing (unless set), enough pages in flight to keep them busy."""
+    parse_workers = parse_workers or os.cpu_count() or 1
+    return max(workers, 2 * parse_workers), parse_workers
+
+
+class ResponseArchive:
+    """
+    Every successful GET of a crawl, kept for re-parsing without the network: rows are only ever
+    appended, bodies are zlib compressed and stored once per SHA-256, however many URLs and crawls
+    return them. Unlike the HTTP cache nothing is evicted or replaced.
+    """
+
+    def __init__(self, path: Path = ARCHIVE_PATH, read_only: bool = False) -> None:
+        if read_only:
+            if not path.exists():
+                raise FileNotFoundError(f"No response archive at {path}")
+            self.connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("pragma journal_mode = wal")
+        self.connection.execute("pragma synchronous = normal")
+        self.connection.execute("create table if not exists bodies (sha256 text primary key, body blob not null)")
+        self.connection.execute(
+            """
+            create table if not exists responses (
+                id integer primary key,
+                url text not null,
+                status_code integer not null,
+                headers text not null,
+                sha256 text not null references bodies,
+                fetched_at real not null
+            )
+            """
+        )
+        self.connection.execute("create index if not exists responses_url on responses (url)")
+        self.connection.commit()
+
+    def put(self, url: str, response: httpx.Response) -> None:
+        body = response.content
+        sha256 = hashlib.sha256(body).hexdigest()
+        headers = [(k, v) for k, v in response.headers.multi_items() if k.lower() not in SKIPPED_HEADERS]
+        if self.connection.execute("select 1 from bodies where sha256 = ?", (sha256,)).fetchone() is None:
+            self.connection.execute("insert into bodies values (?, ?)", (sha256, zlib.compress(body)))
+        self.connection.execute(
+            "insert into responses (url, status_code, headers, sha256, fetched_at) values (?, ?, ?, ?, ?)",
+            (url, response.status_code, json.dumps(headers), sha256, time.time()),
+        )
+        self.connection.commit()
+
+    def get(self, url: str) -> httpx.Response | None:
+        """The latest archived response for url."""
+        row = self.connection.execute(
+            "select r.status_code, r.headers, b.body from responses r join bodies b using (sha256)"
+            " where r.url = ? order by r.id desc limit 1",
+            (url,),
+        ).fetchone()
+        if row is None:
+            return None
+        status_code, headers, body = row
+        return httpx.Response(status_code=status_code, headers=json.loads(headers), content=zlib.decompress(body))
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class ArchivingTransport(httpx.AsyncBaseTransport):
+    """Appends every successful GET to a ResponseArchive, whether it came from the network or the cache."""
+
+    def __init__(self, archive: ResponseArchive, transport: httpx.AsyncBaseTransport) -> None:
+        self.archive = archive
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self.transport.handle_async_request(request)
+        if request.method != "GET" or response.status_code != 200:
+            return response
+        try:
+            await response.aread()
+        finally:
+            await response.aclose()
+        self.archive.put(str(request.url), response)
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=[(k, v) for k, v in response.headers.multi_items() if k.lower() not in SKIPPED_HEADERS],
+            content=response.content,
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+        self.archive.close()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """
+    Serves every request from a ResponseArchive, 404 for URLs it does not have. bench_crawl.py adds
+    a latency to every response and reads the served and missing counts.
+    """
+
+    def __init__(self, archive: ResponseArchive, latency: float = 0.0) -> None:
+        self.archive = archive
+        self.latency = latency
+        self.served = 0
+        self.missing: list[str] = []
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        response = self.archive.get(str(request.url))
+        if response is None:
+            print(f"Not in the archive: {request.url}")
+            self.missing.append(str(request.url))
+            return httpx.Response(status_code=404, request=request)
+        self.served += 1
+        return response
+
+    async def aclose(self) -> None:
+        self.archive.close()
@@ -0,0 +1,158 @@
+import json
+import os
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import IO, Any
+
+from metrics import METRICS
+
+
+# format name -> file extension recognised by GDAL (and so by DuckDB's st_read)
+FORMATS = {
+    "geojson": ".geojson",
+    # RFC 8142 GeoJSON text sequence, every feature prefixed with the record separator
+    "geojsonseq": ".geojsons",
+    # one feature per line
+    "ndjson": ".geojsonl",
+}
+RECORD_SEPARATOR = "\x1e"
+BATCH_SIZE = 100
+# characters read at a time when streaming a FeatureCollection
+READ_SIZE = 1 << 16
+
+
+def dumps(feature: dict) -> str:
+    return json.dumps(feature, ensure_ascii=False, separators=(",", ":"))
+
+
+class FeatureWriter:
+    """
+    Writes GeoJSON features to disk as they are produced, flushing every batch_size features,
+    so a crash late in a crawl keeps everything written so far (for the sequence formats).
+    The geojson format wraps the same compact lines in a FeatureCollection when closed.
+    Features go to <path>.tmp, which replaces path only when the writer closes without an error,
+    so a failed or interrupted run leaves the previous output in place.
+    """
+
+    def __init__(self, path: Path, format: str = "geojson", batch_size: int = BATCH_SIZE) -> None:
+        if format not in FORMATS:
+            raise ValueError(f"Unknown output format: {format}")
+        self.path = path
+        self.tmp_path = path.with_suffix(path.suffix + ".tmp")
+        self.format = format
+        self.batch_size = batch_size
+        self.count = 0
+        self.batch: list[str] = []
+        self.file: IO[str] = open(self.tmp_path, "w", encoding="utf-8")
+        if format == "geojson":
+            self.file.write('{"type":"FeatureCollection","features":[\n')
+
+    def write(self, feature: dict | None) -> None:
+        if feature is None:
+            return
+        start = time.perf_counter()
+        match self.format:
+            case "geojson":
+                self.batch.append(("" if self.count == 0 else ",\n") + dumps(feature))
+            case "geojsonseq":
+                self.batch.append(RECORD_SEPARATOR + dumps(feature) + "\n")
+            case "ndjson":
+                self.batch.append(dumps(feature) + "\n")
+        self.count += 1
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+        METRICS.record_write(time.perf_counter() - start)
+
+    def flush(self) -> None:
+        self.file.write("".join(self.batch))
+        self.file.flush()
+        self.batch = []
+
+    def close(self) -> None:
+        self.flush()
+        if self.format == "geojson":
+            self.file.write("\n]}\n")
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abandon(self) -> None:
+        """Keeps what was written in the temporary file, without replacing the output."""
+        self.flush()
+        self.file.close()
+        print(f"Unfinished output kept in {self.tmp_path}, {self.path} was not replaced.")
+
+    def __enter__(self) -> "FeatureWriter":
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None, *exc_info: Any) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abandon()
+
+
+def read_features(path: Path) -> Iterator[dict]:
+    """Yields features from a GeoJSON text sequence or newline-delimited file, one line at a time."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip().lstrip(RECORD_SEPARATOR)
+            if line:
+                yield json.loads(line)
+
+
+def read_feature_collection(path: Path, read_size: int = READ_SIZE) -> Iterator[dict]:
+    """
+    Yields the features of a GeoJSON FeatureCollection one at a time, however it is laid out
+    (ours have a feature per line, GDAL's and json.dump(indent=...)'s do not), keeping one feature in memory.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = ""
+        while (start := buffer.find('"features"')) < 0 or buffer.find("[", start) < 0:
+            chunk = f.read(read_size)
+            if not chunk:
+                raise ValueError(f"No features array in {path}")
+            buffer += chunk
+        position = buffer.find("[", start) + 1
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer) and buffer[position] == "]":
+                return
+            try:
+                if position == len(buffer):
+                    raise json.JSONDecodeError("Buffer exhausted", buffer, position)
+                feature, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # the feature goes on past the buffer
+                chunk = f.read(read_size)
+                if not chunk:
+                    raise
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield feature
+
+
+def iter_features(path: Path) -> Iterator[dict]:
+    """Streams the features of any of the output formats, told apart by the file extension."""
+    if path.suffix == FORMATS["geojson"]:
+        return read_feature_collection(path)
+    return read_features(path)
+
+
+def load_features(path: Path) -> list[dict]:
+    """Features of any of the output formats, told apart by the file extension."""
+    if path.suffix == FORMATS["geojson"]:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)["features"]
+    return list(read_features(path))
+
+
+def wrap_feature_collection(path: Path, output_path: Path) -> int:
+    """Rewrites a feature sequence as a FeatureCollection without loading it whole, returns the feature count."""
+    with FeatureWriter(path=output_path, format="geojson") as writer:
+        for feature in read_features(path):
+            writer.write(feature)
+        return writer.count
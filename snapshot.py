@@ -0,0 +1,127 @@
+import hashlib
+import json
+import re
+import zlib
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+
+from sinks import load_features
+
+
+RE_SNAPSHOT_DATE = re.compile(r"_(\d{4}-\d{2}-\d{2})\.")
+# entries updated this close to the snapshot date are fetched again, the source tends to edit them in bursts
+REFRESH_DAYS = 90
+# no entry is carried forward for longer than this: every entry has a day out of every MAX_CARRY_DAYS
+# and is fetched again by the first run on or after it, so each run refreshes a rotating share
+MAX_CARRY_DAYS = 60
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class Snapshot:
+    snapshot_date: date
+    by_id: dict[str, dict]
+    by_url: dict[str, dict]
+    # listing fingerprints by url saved with the output (dworysp), None when there are none
+    fingerprints: dict[str, str] | None = None
+
+    def get(self, id: str | None = None, url: str | None = None) -> dict | None:
+        feature = self.by_id.get(id) if id else None
+        if feature is None and url:
+            feature = self.by_url.get(url)
+        return feature
+
+
+def load_snapshot(path: Path, id_property: str) -> Snapshot:
+    """
+    Loads a previous output (any of the sinks formats) and indexes its features by id and url.
+    The snapshot date comes from the file name (e.g. zamkisp_2026-02-16.geojson) or its modification time.
+    """
+    match = RE_SNAPSHOT_DATE.search(path.name)
+    if match is not None:
+        snapshot_date = date.fromisoformat(match.group(1))
+    else:
+        snapshot_date = date.fromtimestamp(path.stat().st_mtime)
+    features = load_features(path)
+    by_id = {}
+    by_url = {}
+    for feature in features:
+        properties = feature["properties"]
+        if properties.get(id_property):
+            by_id[properties[id_property]] = feature
+        if properties.get("url"):
+            by_url[properties["url"]] = feature
+    fingerprints = load_fingerprints(path)
+    print(
+        f"Loaded snapshot {path} from {snapshot_date.isoformat()} ({len(features)} features"
+        f"{', with listing fingerprints' if fingerprints is not None else ''})."
+    )
+    return Snapshot(snapshot_date=snapshot_date, by_id=by_id, by_url=by_url, fingerprints=fingerprints)
+
+
+def is_due_for_rotation(key: str, snapshot_date: date, today: date, max_carry_days: int = MAX_CARRY_DAYS) -> bool:
+    """Whether the day of the entry key came after the snapshot was taken, on or before today."""
+    elapsed = (today - snapshot_date).days
+    if elapsed >= max_carry_days:
+        return True
+    slot = zlib.crc32(key.encode("utf-8")) % max_carry_days
+    return (slot - snapshot_date.toordinal() - 1) % max_carry_days < elapsed
+
+
+def is_due_for_refresh(
+    feature: dict,
+    key: str,
+    snapshot_date: date,
+    refresh_days: int = REFRESH_DAYS,
+    today: date | None = None,
+) -> bool:
+    """
+    Entries without an update date or updated shortly before the snapshot was taken may have changed since,
+    the others are fetched again on their day of the rotation.
+    """
+    if is_due_for_rotation(key=key, snapshot_date=snapshot_date, today=today or date.today()):
+        return True
+    data_aktualizacji = feature["properties"].get("data_aktualizacji")
+    if not data_aktualizacji:
+        return True
+    return date.fromisoformat(data_aktualizacji) >= snapshot_date - timedelta(days=refresh_days)
+
+
+def get_fingerprint(texts: list[str]) -> str:
+    """Digest of what a listing shows for an entry, it changes when the listing does."""
+    return hashlib.blake2b("\x1f".join(texts).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def get_fingerprints_path(path: Path) -> Path:
+    """Listing fingerprints saved next to an output, e.g. dworysp_2026-02-19.geojson.listing.json."""
+    return path.with_name(f"{path.name}.listing.json")
+
+
+def load_fingerprints(path: Path) -> dict[str, str] | None:
+    """
+    Listing fingerprints by url of the crawl that wrote the output at path. None when it saved none,
+    or when the output is no longer the file they were saved with (its size or mtime differ).
+    """
+    fingerprints_path = get_fingerprints_path(path)
+    if not fingerprints_path.exists():
+        return None
+    with open(fingerprints_path, "r", encoding="utf-8") as f:
+        saved = json.load(f)
+    stat = path.stat()
+    if saved.get("size") != stat.st_size or saved.get("mtime_ns") != stat.st_mtime_ns:
+        return None
+    return saved["fingerprints"]
+
+
+def save_fingerprints(path: Path, fingerprints: dict[str, str]) -> None:
+    """Saves the listing fingerprints of a crawl next to its finished output at path."""
+    stat = path.stat()
+    fingerprints_path = get_fingerprints_path(path)
+    tmp_path = fingerprints_path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(dict(size=stat.st_size, mtime_ns=stat.st_mtime_ns, fingerprints=fingerprints), f)
+    tmp_path.replace(fingerprints_path)
+
+
+def parse_date(value: str | None) -> date | None:
+    return date.fromisoformat(value) if value else None
@@ -0,0 +1,187 @@
+# /// script
+# requires-python = ">=3.13"
+# dependencies = [
+#     "numpy>=2.3.0",
+# ]
+# [tool.uv]
+# exclude-newer = "2026-02-04T00:00:00Z"
+# ///
+
+"""
+Changes between two dated outputs of the same kind (e.g. zamkisp_2026-02-16.geojson and a newer one,
+or two zamki_deduplikowane/dwory GeoPackages), matched on their stable ids. The older file is read
+once into a digest per feature, the newer one streamed against it, so neither is held in memory whole.
+The changeset has a JSON line per added, removed, moved or changed feature.
+"""
+
+import argparse
+import hashlib
+import json
+from array import array
+from collections import Counter
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from overture_index import iter_gpkg_rows
+from sinks import iter_features
+from spatial_index import haversine
+
+
+# properties identifying a feature, the first one set is used: zamkisp, dworysp, conflated castles
+# (which may lack either side), zamkinet
+ID_PROPERTIES = ["zamek_id", "dwor_id_sp", "zamek_id_sp", "url_net", "url"]
+# closer than this the two positions are the same point written with a different precision
+MOVE_TOLERANCE = 0.5
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class FeatureDigest:
+    digest: int
+    # property names, shared by the features with the same ones, and the hashes of their values
+    names: tuple[str, ...]
+    field_hashes: array
+    lon: float | None
+    lat: float | None
+
+    def get_field_hashes(self) -> dict[str, int]:
+        return dict(zip(self.names, self.field_hashes))
+
+
+def iter_snapshot_features(path: Path) -> Iterator[dict]:
+    """Features of a sinks output or of a GeoPackage (as written by the SQL conflation)."""
+    if path.suffix != ".gpkg":
+        yield from iter_features(path)
+        return
+    for x, y, properties in iter_gpkg_rows(path):
+        yield dict(type="Feature", properties=properties, geometry=dict(type="Point", coordinates=[x, y]))
+
+
+def get_feature_id(properties: dict, id_properties: list[str]) -> str | None:
+    """The first id property set, with its name, so ids of different kinds never collide."""
+    for name in id_properties:
+        if properties.get(name):
+            return f"{name}={properties[name]}"
+    return None
+
+
+def get_coordinates(feature: dict) -> tuple[float | None, float | None]:
+    geometry = feature.get("geometry")
+    if not geometry or not geometry.get("coordinates"):
+        return None, None
+    x, y = geometry["coordinates"][:2]
+    return x, y
+
+
+def get_digest(data: bytes) -> int:
+    """64-bit BLAKE2b of data as a signed int, to fit array("q"). Unlike the built-in hash, -1 and -2 differ."""
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little", signed=True)
+
+
+def hash_value(value: object) -> int:
+    """
+    Digest of a property value's canonical JSON. Integral floats are written as ints, so 3 from GeoJSON
+    and 3.0 from a GeoPackage hash the same.
+    """
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    text = json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return get_digest(text.encode("utf-8"))
+
+
+def digest_feature(feature: dict, names_cache: dict[tuple[str, ...], tuple[str, ...]]) -> FeatureDigest:
+    """Hashes of every property and of the whole record, properties and position together."""
+    properties = feature["properties"]
+    names = tuple(sorted(properties))
+    names = names_cache.setdefault(names, names)
+    field_hashes = array("q", [hash_value(properties[name]) for name in names])
+    lon, lat = get_coordinates(feature)
+    position = [None if lon is None else float(lon), None if lat is None else float(lat)]
+    digest = get_digest(json.dumps([names, position]).encode("utf-8") + field_hashes.tobytes())
+    return FeatureDigest(digest=digest, names=names, field_hashes=field_hashes, lon=lon, lat=lat)
+
+
+def get_distance(old: FeatureDigest, new: FeatureDigest) -> float | None:
+    """Meters between the positions, None when either has none."""
+    if None in (old.lon, old.lat, new.lon, new.lat):
+        return None
+    return float(haversine(np.array(old.lon), np.array(old.lat), np.array(new.lon), np.array(new.lat)))
+
+
+def read_digests(path: Path, id_properties: list[str], names_cache: dict[tuple[str, ...], tuple[str, ...]]) -> dict[str, FeatureDigest]:
+    digests = {}
+    for feature in iter_snapshot_features(path):
+        feature_id = get_feature_id(feature["properties"], id_properties)
+        if feature_id is None:
+            continue
+        if feature_id in digests:
+            print(f"Duplicate id {feature_id} in {path}, keeping the last one.")
+        digests[feature_id] = digest_feature(feature, names_cache)
+    return digests
+
+
+def diff_snapshots(old_path: Path, new_path: Path, id_properties: list[str] = ID_PROPERTIES) -> Iterator[dict]:
+    """Yields the changes turning old_path into new_path, removals last."""
+    names_cache = {}
+    old_digests = read_digests(old_path, id_properties, names_cache)
+    print(f"Read {len(old_digests)} features from {old_path}.")
+    for feature in iter_snapshot_features(new_path):
+        properties = feature["properties"]
+        feature_id = get_feature_id(properties, id_properties)
+        if feature_id is None:
+            print(f"Feature without any of {', '.join(id_properties)} in {new_path}, skipped.")
+            continue
+        new = digest_feature(feature, names_cache)
+        old = old_digests.pop(feature_id, None)
+        if old is None:
+            yield dict(change="added", id=feature_id, feature=feature)
+            continue
+        if old.digest == new.digest:
+            continue
+        change = dict(change="modified", id=feature_id)
+        distance = get_distance(old, new)
+        moved = distance > MOVE_TOLERANCE if distance is not None else (old.lon, old.lat) != (new.lon, new.lat)
+        if moved:
+            change.update(moved_m=round(distance, 1) if distance is not None else None, geometry=feature["geometry"])
+        old_fields = old.get_field_hashes()
+        new_fields = new.get_field_hashes()
+        changed = {name: properties[name] for name in new.names if old_fields.get(name) != new_fields[name]}
+        if changed:
+            change.update(properties=changed)
+        dropped = [name for name in old.names if name not in new_fields]
+        if dropped:
+            change.update(dropped=dropped)
+        # differences below MOVE_TOLERANCE alone are no change
+        if moved or changed or dropped:
+            yield change
+    for feature_id in old_digests:
+        yield dict(change="removed", id=feature_id)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("old", type=Path, help="earlier output, any of the sinks formats or a GeoPackage")
+    parser.add_argument("new", type=Path, help="later output of the same kind")
+    parser.add_argument("--id", nargs="*", default=ID_PROPERTIES, help="properties identifying a feature, the first one set is used")
+    parser.add_argument("--output", type=Path, help="defaults to <new stem>.changes.ndjson")
+    args = parser.parse_args()
+    output_path = args.output or args.new.with_suffix(".changes.ndjson")
+    counts = Counter()
+    with open(output_path, "w", encoding="utf-8") as f:
+        for change in diff_snapshots(old_path=args.old, new_path=args.new, id_properties=args.id):
+            f.write(json.dumps(change, ensure_ascii=False, separators=(",", ":"), default=str) + "\n")
+            if change["change"] == "modified":
+                counts["moved"] += "geometry" in change
+                counts["changed"] += "properties" in change or "dropped" in change
+            else:
+                counts[change["change"]] += 1
+    print(
+        f"Added {counts['added']}, removed {counts['removed']}, moved {counts['moved']}, "
+        f"changed {counts['changed']} features, written to {output_path}."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+from pathlib import Path
+
+import numpy as np
+
+
+# mean Earth radius; the SQL measures on the WGS 84 spheroid, which differs by well under 1 m at 200 m
+EARTH_RADIUS = 6_371_008.8
+METERS_PER_DEGREE = EARTH_RADIUS * np.pi / 180.0
+KEY_STRIDE = np.int64(1 << 32)
+# margin for the great circle bowing away from the parallel
+CELL_MARGIN = 1.01
+
+
+def haversine(lon1: np.ndarray, lat1: np.ndarray, lon2: np.ndarray, lat2: np.ndarray) -> np.ndarray:
+    """Great-circle distance in meters, element-wise."""
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+
+def get_cell_span(lat: np.ndarray, distance: float) -> tuple[float, float]:
+    """Lon/lat size in degrees of a cell at least distance meters wide at every latitude in lat."""
+    cell_lat = distance * CELL_MARGIN / METERS_PER_DEGREE
+    max_abs_lat = min(float(np.abs(lat).max()) if len(lat) else 0.0, 89.0)
+    return cell_lat / np.cos(np.radians(max_abs_lat)), cell_lat
+
+
+class GridIndex:
+    """
+    Static point index: points are bucketed into a lon/lat grid and kept sorted by cell key,
+    so the points of any cell are found with a binary search. Queries look only at the cells
+    around each query point and measure those candidates with haversine, all vectorized.
+    """
+
+    def __init__(self, lon: np.ndarray, lat: np.ndarray, cell_size: float) -> None:
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.cell_lon, self.cell_lat = get_cell_span(lat=self.lat, distance=cell_size)
+        keys = self.cell_keys(np.floor(self.lon / self.cell_lon), np.floor(self.lat / self.cell_lat))
+        self.order = np.argsort(keys, kind="stable")
+        self.sorted_keys = keys[self.order]
+
+    @staticmethod
+    def cell_keys(cell_x: np.ndarray, cell_y: np.ndarray) -> np.ndarray:
+        return cell_x.astype(np.int64) * KEY_STRIDE + cell_y.astype(np.int64)
+
+    def __len__(self) -> int:
+        return len(self.lon)
+
+    def query_radius(self, lon: np.ndarray, lat: np.ndarray, radius: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """All (index of indexed point, index of query point, distance) pairs not further apart than radius meters."""
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        empty = np.empty(0, dtype=np.int64)
+        if len(self) == 0 or len(lon) == 0:
+            return empty, empty, np.empty(0, dtype=np.float64)
+        # the radius may be larger than the cells and the queries further north than the indexed points
+        span_lon, span_lat = get_cell_span(lat=np.concatenate([lat, self.lat]), distance=radius)
+        rings_x = int(np.ceil(span_lon / self.cell_lon))
+        rings_y = int(np.ceil(span_lat / self.cell_lat))
+        cell_x = np.floor(lon / self.cell_lon)
+        cell_y = np.floor(lat / self.cell_lat)
+        indices_points = []
+        indices_queries = []
+        for dx in range(-rings_x, rings_x + 1):
+            for dy in range(-rings_y, rings_y + 1):
+                keys = self.cell_keys(cell_x + dx, cell_y + dy)
+                lo = np.searchsorted(self.sorted_keys, keys, side="left")
+                hi = np.searchsorted(self.sorted_keys, keys, side="right")
+                counts = hi - lo
+                total = counts.sum()
+                if total == 0:
+                    continue
+                offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+                indices_points.append(self.order[np.repeat(lo, counts) + offsets])
+                indices_queries.append(np.repeat(np.arange(len(keys)), counts))
+        if not indices_points:
+            return empty, empty, np.empty(0, dtype=np.float64)
+        index_points = np.concatenate(indices_points)
+        index_queries = np.concatenate(indices_queries)
+        distances = haversine(self.lon[index_points], self.lat[index_points], lon[index_queries], lat[index_queries])
+        within = distances <= radius
+        index_points = index_points[within]
+        index_queries = index_queries[within]
+        distances = distances[within]
+        result_order = np.lexsort((index_queries, index_points))
+        return index_points[result_order], index_queries[result_order], distances[result_order]
+
+    def query_nearest(self, lon: np.ndarray, lat: np.ndarray, radius: float) -> tuple[np.ndarray, np.ndarray]:
+        """Index of and distance to the closest indexed point within radius for every query point, -1/nan if none."""
+        index_points, index_queries, distances = self.query_radius(lon=lon, lat=lat, radius=radius)
+        nearest = np.full(len(lon), -1, dtype=np.int64)
+        nearest_distance = np.full(len(lon), np.nan)
+        by_distance = np.lexsort((distances, index_queries))
+        # first, so closest, pair of every query point
+        queries, first = np.unique(index_queries[by_distance], return_index=True)
+        nearest[queries] = index_points[by_distance][first]
+        nearest_distance[queries] = distances[by_distance][first]
+        return nearest, nearest_distance
+
+    def save(self, path: Path) -> None:
+        np.savez(
+            path,
+            lon=self.lon,
+            lat=self.lat,
+            cell=np.array([self.cell_lon, self.cell_lat]),
+            order=self.order,
+            sorted_keys=self.sorted_keys,
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "GridIndex":
+        with np.load(path) as data:
+            index = cls.__new__(cls)
+            index.lon = data["lon"]
+            index.lat = data["lat"]
+            index.cell_lon, index.cell_lat = data["cell"].tolist()
+            index.order = data["order"]
+            index.sorted_keys = data["sorted_keys"]
+        return index
@@ -0,0 +1,434 @@
+# /// script
+# requires-python = ">=3.13"
+# dependencies = [
+#     "numpy>=2.3.0",
+# ]
+# [tool.uv]
+# exclude-newer = "2026-02-04T00:00:00Z"
+# ///
+
+"""
+Vector tiles of a point output (e.g. zamki_deduplikowane_2026-02-16.geojson or dwory_2026-02-19.gpkg)
+for the review map, so it loads only the tiles in view instead of the whole file. Below --cluster-zoom
+points are merged per grid cell into clusters with a point_count, below --detail-zoom long texts (opis,
+*_opis) are left out. The tiles are Mapbox Vector Tiles in one MBTiles or PMTiles (v3) file, both served
+as static files. Protobuf, MBTiles and PMTiles are written here directly, like the WKB in geoexport.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import re
+import sqlite3
+import struct
+from collections.abc import Iterator
+from pathlib import Path
+
+import numpy as np
+
+from overture_index import iter_gpkg_rows
+from sinks import iter_features
+
+
+TILE_FORMATS = [".pmtiles", ".mbtiles"]
+MIN_ZOOM = 0
+MAX_ZOOM = 12
+# zoom levels below this one show clusters of the points falling into the same grid cell
+CLUSTER_ZOOM = 10
+# cluster cell size in pixels of a 256 px tile, a whole number of cells per tile so none straddles two
+CLUSTER_CELL = 64
+# zoom levels below this one leave out the long texts
+DETAIL_ZOOM = 12
+EXTENT = 4096
+# web mercator is cut off here, so the world is square
+MAX_LATITUDE = 85.0511287798
+RE_DATE_SUFFIX = re.compile(r"_\d{4}-\d{2}-\d{2}$")
+# PMTiles v3 header fields, 127 bytes
+PMTILES_HEADER = struct.Struct("<7sBQQQQQQQQQQQBBBBBBiiiiBii")
+PMTILES_ROOT_SIZE = 16384
+# PMTiles compression and tile type codes
+GZIP = 2
+MVT = 1
+
+
+def is_detail(name: str) -> bool:
+    return name == "opis" or name.endswith("_opis")
+
+
+def to_mercator(lon: np.ndarray, lat: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Web mercator position of lon/lat points as fractions of the world, y from the north."""
+    x = (lon + 180.0) / 360.0
+    sin_lat = np.sin(np.radians(np.clip(lat, -MAX_LATITUDE, MAX_LATITUDE)))
+    y = 0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * np.pi)
+    return np.clip(x, 0.0, 1.0 - 1e-12), np.clip(y, 0.0, 1.0 - 1e-12)
+
+
+def read_points(path: Path) -> tuple[np.ndarray, np.ndarray, list[dict]]:
+    """Longitudes, latitudes and properties of the located points of any of the sinks formats or a GeoPackage."""
+    lon = []
+    lat = []
+    properties = []
+    rows = iter_gpkg_rows(path) if path.suffix == ".gpkg" else (
+        (*feature["geometry"]["coordinates"][:2], feature["properties"]) for feature in iter_features(path) if feature.get("geometry")
+    )
+    for x, y, row in rows:
+        if x is None or y is None:
+            continue
+        lon.append(x)
+        lat.append(y)
+        properties.append(row)
+    return np.array(lon, dtype=np.float64), np.array(lat, dtype=np.float64), properties
+
+
+# Protobuf, only what vector tiles need
+
+
+def varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def tag(number: int, wire_type: int) -> bytes:
+    return varint((number << 3) | wire_type)
+
+
+def message(number: int, payload: bytes) -> bytes:
+    return tag(number, 2) + varint(len(payload)) + payload
+
+
+def packed(number: int, values: list[int]) -> bytes:
+    return message(number, b"".join(varint(value) for value in values))
+
+
+def encode_value(value: object) -> bytes:
+    """A vector tile Value message."""
+    match value:
+        case bool():
+            return tag(7, 0) + varint(int(value))
+        case int():
+            return tag(6, 0) + varint(zigzag(value))
+        case float():
+            return tag(3, 1) + struct.pack("<d", value)
+        case str():
+            return message(1, value.encode("utf-8"))
+        case _:
+            return message(1, json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def encode_tile(layer: str, features: list[tuple[int, int, dict, int | None]]) -> bytes:
+    """A tile with one layer of point features given as (x, y in tile pixels, properties, id)."""
+    keys: dict[str, int] = {}
+    values: dict[tuple[type, object], int] = {}
+    encoded = []
+    for x, y, properties, feature_id in features:
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            # 1 and 1.0 and True are equal as dict keys, but not as tile values
+            value_key = (type(value), value if isinstance(value, (str, int, float)) else json.dumps(value, default=str))
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault(value_key, len(values)))
+        feature = tag(1, 0) + varint(feature_id) if feature_id is not None else b""
+        # MoveTo once, relative to the origin
+        feature += packed(2, tags) + tag(3, 0) + varint(1) + packed(4, [9, zigzag(x), zigzag(y)])
+        encoded.append(message(2, feature))
+    payload = (
+        tag(15, 0) + varint(2)
+        + message(1, layer.encode("utf-8"))
+        + b"".join(encoded)
+        + b"".join(message(3, key.encode("utf-8")) for key in keys)
+        + b"".join(message(4, encode_value(value)) for _, value in values)
+        + tag(5, 0) + varint(EXTENT)
+    )
+    return message(3, payload)
+
+
+# Tile pyramid
+
+
+def get_zoom_points(
+    x: np.ndarray,
+    y: np.ndarray,
+    zoom: int,
+    cluster_zoom: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Positions, point counts and the index of a single point (-1 for clusters) of what is shown at zoom:
+    the points themselves from cluster_zoom on, below it one feature per occupied cluster cell.
+    """
+    if zoom >= cluster_zoom:
+        return x, y, np.ones(len(x), dtype=np.int64), np.arange(len(x))
+    cells = (1 << zoom) * (256 // CLUSTER_CELL)
+    keys = np.floor(x * cells).astype(np.int64) * cells + np.floor(y * cells).astype(np.int64)
+    _, first, inverse, counts = np.unique(keys, return_index=True, return_inverse=True, return_counts=True)
+    # clusters in the order of their first point
+    order = np.argsort(first, kind="stable")
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    inverse = rank[inverse]
+    counts = counts[order]
+    cluster_x = np.bincount(inverse, weights=x) / counts
+    cluster_y = np.bincount(inverse, weights=y) / counts
+    single = np.where(counts == 1, first[order], -1)
+    return cluster_x, cluster_y, counts, single
+
+
+def iter_tiles(
+    lon: np.ndarray,
+    lat: np.ndarray,
+    properties: list[dict],
+    layer: str,
+    min_zoom: int = MIN_ZOOM,
+    max_zoom: int = MAX_ZOOM,
+    cluster_zoom: int = CLUSTER_ZOOM,
+    detail_zoom: int = DETAIL_ZOOM,
+) -> Iterator[tuple[int, int, int, bytes]]:
+    """(z, x, y, gzipped vector tile) of every tile with any points, y from the north."""
+    x, y = to_mercator(lon, lat)
+    trimmed = [{k: v for k, v in row.items() if not is_detail(k)} for row in properties]
+    for zoom in range(min_zoom, max_zoom + 1):
+        zoom_x, zoom_y, counts, single = get_zoom_points(x=x, y=y, zoom=zoom, cluster_zoom=cluster_zoom)
+        rows = properties if zoom >= detail_zoom else trimmed
+        scale = 1 << zoom
+        tile_x = np.floor(zoom_x * scale).astype(np.int64)
+        tile_y = np.floor(zoom_y * scale).astype(np.int64)
+        # EXTENT itself is allowed, it is on the tile's edge
+        pixel_x = np.round((zoom_x * scale - tile_x) * EXTENT).astype(np.int64).tolist()
+        pixel_y = np.round((zoom_y * scale - tile_y) * EXTENT).astype(np.int64).tolist()
+        keys = tile_x * scale + tile_y
+        order = np.argsort(keys, kind="stable")
+        starts = np.flatnonzero(np.diff(keys[order], prepend=-1))
+        for members in np.split(order, starts[1:]) if len(order) else []:
+            features = []
+            for i in members.tolist():
+                if single[i] >= 0:
+                    # feature ids start at 1, the point's position in the input
+                    features.append((pixel_x[i], pixel_y[i], rows[single[i]], int(single[i]) + 1))
+                else:
+                    features.append((pixel_x[i], pixel_y[i], dict(point_count=int(counts[i])), None))
+            first = int(members[0])
+            yield zoom, int(tile_x[first]), int(tile_y[first]), gzip.compress(encode_tile(layer, features), mtime=0)
+
+
+def get_metadata(
+    lon: np.ndarray,
+    lat: np.ndarray,
+    properties: list[dict],
+    layer: str,
+    min_zoom: int,
+    max_zoom: int,
+) -> dict:
+    """TileJSON-like description of the tileset, the vector_layers fields as in MBTiles' json metadata."""
+    fields = {}
+    for row in properties:
+        for key, value in row.items():
+            if value is not None and key not in fields:
+                fields[key] = "Boolean" if isinstance(value, bool) else "Number" if isinstance(value, (int, float)) else "String"
+    fields["point_count"] = "Number"
+    bounds = [float(lon.min()), float(lat.min()), float(lon.max()), float(lat.max())] if len(lon) else [-180.0, -85.0, 180.0, 85.0]
+    return dict(
+        name=layer,
+        format="pbf",
+        minzoom=min_zoom,
+        maxzoom=max_zoom,
+        bounds=bounds,
+        center=[(bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2, min_zoom],
+        vector_layers=[dict(id=layer, fields=fields, minzoom=min_zoom, maxzoom=max_zoom)],
+    )
+
+
+# Containers
+
+
+def write_mbtiles(path: Path, tiles: Iterator[tuple[int, int, int, bytes]], metadata: dict) -> int:
+    """MBTiles 1.3: tiles in an SQLite database, rows counted from the south."""
+    path.unlink(missing_ok=True)
+    count = 0
+    with sqlite3.connect(path) as connection:
+        connection.execute("create table metadata (name text, value text)")
+        connection.execute("create table tiles (zoom_level integer, tile_column integer, tile_row integer, tile_data blob)")
+        for zoom, x, y, data in tiles:
+            connection.execute("insert into tiles values (?, ?, ?, ?)", (zoom, x, (1 << zoom) - 1 - y, data))
+            count += 1
+        connection.execute("create unique index tile_index on tiles (zoom_level, tile_column, tile_row)")
+        values = {
+            "name": metadata["name"],
+            "format": metadata["format"],
+            "minzoom": str(metadata["minzoom"]),
+            "maxzoom": str(metadata["maxzoom"]),
+            "bounds": ",".join(str(value) for value in metadata["bounds"]),
+            "center": ",".join(str(value) for value in metadata["center"]),
+            "json": json.dumps(dict(vector_layers=metadata["vector_layers"]), ensure_ascii=False),
+        }
+        connection.executemany("insert into metadata values (?, ?)", values.items())
+    connection.close()
+    return count
+
+
+def zxy_to_tile_id(z: int, x: int, y: int) -> int:
+    """PMTiles tile id: the tiles of the lower zoom levels, then the position on the Hilbert curve of level z."""
+    tile_id = ((1 << (2 * z)) - 1) // 3
+    s = 1 << z >> 1
+    while s > 0:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        tile_id += s * s * ((3 * rx) ^ ry)
+        # rotate the quadrant
+        if ry == 0:
+            if rx == 1:
+                x = s - 1 - (x & (s - 1))
+                y = s - 1 - (y & (s - 1))
+            x, y = y, x
+        s >>= 1
+    return tile_id
+
+
+def encode_directory(entries: list[tuple[int, int, int, int]]) -> bytes:
+    """Gzipped PMTiles directory of (tile id, offset, length, run length) entries sorted by tile id."""
+    out = bytearray(varint(len(entries)))
+    last_id = 0
+    for tile_id, _, _, _ in entries:
+        out += varint(tile_id - last_id)
+        last_id = tile_id
+    for _, _, _, run_length in entries:
+        out += varint(run_length)
+    for _, _, length, _ in entries:
+        out += varint(length)
+    for i, (_, offset, _, _) in enumerate(entries):
+        previous = entries[i - 1] if i else None
+        # 0 for a tile right after the previous one
+        out += varint(0 if previous and offset == previous[1] + previous[2] else offset + 1)
+    return gzip.compress(bytes(out), mtime=0)
+
+
+def build_directories(entries: list[tuple[int, int, int, int]]) -> tuple[bytes, bytes]:
+    """The root directory and the leaf directories it points to, as many leaves as needed to fit the root in the header's 16 KiB."""
+    root = encode_directory(entries)
+    if PMTILES_HEADER.size + len(root) <= PMTILES_ROOT_SIZE:
+        return root, b""
+    leaf_size = 4096
+    while True:
+        leaves = bytearray()
+        root_entries = []
+        for start in range(0, len(entries), leaf_size):
+            leaf = encode_directory(entries[start:start + leaf_size])
+            # run length 0 marks a leaf directory
+            root_entries.append((entries[start][0], len(leaves), len(leaf), 0))
+            leaves += leaf
+        root = encode_directory(root_entries)
+        if PMTILES_HEADER.size + len(root) <= PMTILES_ROOT_SIZE:
+            return root, bytes(leaves)
+        leaf_size *= 2
+
+
+def write_pmtiles(path: Path, tiles: Iterator[tuple[int, int, int, bytes]], metadata: dict) -> int:
+    """PMTiles v3: header, root directory, metadata, leaf directories, tile data, tiles in tile id order, equal tiles stored once."""
+    tiles = sorted((zxy_to_tile_id(z, x, y), data) for z, x, y, data in tiles)
+    data = bytearray()
+    offsets: dict[bytes, int] = {}
+    entries: list[tuple[int, int, int, int]] = []
+    for tile_id, tile in tiles:
+        digest = hashlib.sha256(tile).digest()
+        offset = offsets.get(digest)
+        if offset is None:
+            offset = offsets[digest] = len(data)
+            data += tile
+        last = entries[-1] if entries else None
+        if last and last[1] == offset and last[0] + last[3] == tile_id:
+            entries[-1] = (last[0], last[1], last[2], last[3] + 1)
+        else:
+            entries.append((tile_id, offset, len(tile), 1))
+    root, leaves = build_directories(entries)
+    encoded_metadata = gzip.compress(json.dumps(metadata, ensure_ascii=False).encode("utf-8"), mtime=0)
+    root_offset = PMTILES_HEADER.size
+    metadata_offset = root_offset + len(root)
+    leaves_offset = metadata_offset + len(encoded_metadata)
+    data_offset = leaves_offset + len(leaves)
+    min_lon, min_lat, max_lon, max_lat = (round(value * 10_000_000) for value in metadata["bounds"])
+    center_lon, center_lat, center_zoom = metadata["center"]
+    header = PMTILES_HEADER.pack(
+        b"PMTiles",
+        3,
+        root_offset,
+        len(root),
+        metadata_offset,
+        len(encoded_metadata),
+        leaves_offset,
+        len(leaves),
+        data_offset,
+        len(data),
+        len(tiles),
+        len(entries),
+        len(offsets),
+        1,
+        GZIP,
+        GZIP,
+        MVT,
+        metadata["minzoom"],
+        metadata["maxzoom"],
+        min_lon,
+        min_lat,
+        max_lon,
+        max_lat,
+        center_zoom,
+        round(center_lon * 10_000_000),
+        round(center_lat * 10_000_000),
+    )
+    with open(path, "wb") as f:
+        f.write(header + root + encoded_metadata + leaves + data)
+    return len(tiles)
+
+
+def get_layer(path: Path) -> str:
+    """Layer name from the file name without its date, e.g. zamki_deduplikowane."""
+    return RE_DATE_SUFFIX.sub("", path.stem)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", type=Path, help="point output, any of the sinks formats or a GeoPackage")
+    parser.add_argument("--output", type=Path, help="a .pmtiles or .mbtiles file, defaults to <input stem>.pmtiles")
+    parser.add_argument("--layer", help="defaults to the input name without its date")
+    parser.add_argument("--min-zoom", type=int, default=MIN_ZOOM)
+    parser.add_argument("--max-zoom", type=int, default=MAX_ZOOM)
+    parser.add_argument("--cluster-zoom", type=int, default=CLUSTER_ZOOM, help="first zoom level showing every point")
+    parser.add_argument("--detail-zoom", type=int, default=DETAIL_ZOOM, help="first zoom level with opis and the other long texts")
+    args = parser.parse_args()
+    output_path = args.output or args.input.with_suffix(".pmtiles")
+    if output_path.suffix not in TILE_FORMATS:
+        parser.error(f"--output must end with one of: {', '.join(TILE_FORMATS)}")
+    if not 0 <= args.min_zoom <= args.max_zoom <= 24:
+        parser.error("zoom levels must satisfy 0 <= --min-zoom <= --max-zoom <= 24")
+    layer = args.layer or get_layer(args.input)
+    lon, lat, properties = read_points(args.input)
+    metadata = get_metadata(lon=lon, lat=lat, properties=properties, layer=layer, min_zoom=args.min_zoom, max_zoom=args.max_zoom)
+    tiles = iter_tiles(
+        lon=lon,
+        lat=lat,
+        properties=properties,
+        layer=layer,
+        min_zoom=args.min_zoom,
+        max_zoom=args.max_zoom,
+        cluster_zoom=args.cluster_zoom,
+        detail_zoom=args.detail_zoom,
+    )
+    match output_path.suffix:
+        case ".pmtiles":
+            count = write_pmtiles(path=output_path, tiles=tiles, metadata=metadata)
+        case ".mbtiles":
+            count = write_mbtiles(path=output_path, tiles=tiles, metadata=metadata)
+    print(f"Written {count} tiles of {len(lon)} points, zoom {args.min_zoom}-{args.max_zoom}, to {output_path}.")
+
+
+if __name__ == "__main__":
+    main()
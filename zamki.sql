@@ -1,3 +1,4 @@
+-- the castles table below is built in-process, without these paths, by duckdb_conflation.py (or crawl.py --conflate)
 --install spatial;
 --install httpfs;
 
@@ -6,6 +7,7 @@ LOAD httpfs;
 -- overture data location
 SET s3_region='us-west-2';
 
+-- scraper outputs written with --format geojsonseq / ndjson (.geojsons / .geojsonl) are read by st_read the same way
 select * from st_read('/mnt/nvme/git/ckkp_2026/zamkisp_2026-02-16.geojson') limit 10;
 
 select * from st_read('/mnt/nvme/git/ckkp_2026/zamkinet_2026-02-16.geojson') limit 10;
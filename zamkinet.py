@@ -3,20 +3,56 @@
 # dependencies = [
 #     "beautifulsoup4>=4.14.3",
 #     "httpx>=0.28.1",
+#     "lxml>=6.0.2",
+#     "pyarrow>=22.0.0",
+#     "pyogrio>=0.11.1",
 # ]
 # [tool.uv]
 # exclude-newer = "2026-02-04T00:00:00Z"
 # ///
 
+import argparse
 import asyncio
-from collections.abc import Iterable
+from collections.abc import AsyncIterator, Callable, Iterable, Iterator
+from contextlib import nullcontext
 from dataclasses import dataclass
 from datetime import date
-import json
+from pathlib import Path
 import re
 
 import httpx
-from bs4 import BeautifulSoup
+from bs4 import Tag
+
+from http_client import ClientPool, use_client
+from extraction import (
+    Field,
+    FieldExtractor,
+    LabelledRow,
+    parse_image_rating,
+    read_image_alt,
+    read_image_src,
+    read_last_text,
+)
+from parsing import parse
+from parser_pool import PARSE_WORKERS, ParserPool
+from sinks import FORMATS, FeatureWriter, wrap_feature_collection
+from geoexport import export
+from record_store import RecordStore
+from journal import JOURNAL_DIR, CrawlJournal
+from metrics import METRICS
+from cli import add_common_arguments, apply_common_arguments
+
+
+# property types of the columnar exports, everything else is a string
+COLUMN_TYPES = {
+    "stan_tekst": "category",
+    "trudnosc_odnalezienia_skala": "float",
+    "trudnosc_odnalezienia_tekst": "category",
+    "trudnosc_dojscia_skala": "float",
+    "trudnosc_dojscia_tekst": "category",
+    "ocena_skala": "float",
+    "ocena_tekst": "category",
+}
 
 
 @dataclass(frozen=True, slots=True, kw_only=True)
@@ -40,122 +76,113 @@ class CastleInfo:
     rating_description: str
 
 
+HOST = "zamki.net.pl"
+# most castles in flight, each fetching its two pages side by side
+PAGE_WORKERS = 4
+# --workers of this script, and of this source in crawl.py
+DEFAULT_WORKERS = PAGE_WORKERS
 URL_LIST = "http://zamki.net.pl/alfabetycznie.php"
 RE_LATITUDE = re.compile(r"\(([4-5]\d\.\d+)\)")
 RE_LONGITUDE = re.compile(r"\(([1-2]\d\.\d+)\)")
+DESCRIPTION_EXTRACTOR = FieldExtractor(
+    source="zamkinet",
+    fields=[
+        Field(label="Stan zachowania:", name="state_text", read=read_image_alt),
+        Field(label="Stan zachowania:", name="state_description", read=read_last_text),
+        Field(label="Wstęp:", name="entry", read=read_last_text),
+        Field(label="Parking:", name="parking", read=read_last_text),
+        Field(label="Trudność odnalezienia:", name="finding_difficulty_numeric", read=read_image_src, convert=parse_image_rating),
+        Field(label="Trudność odnalezienia:", name="finding_difficult_text", read=read_image_alt),
+        Field(label="Trudność odnalezienia:", name="finding_difficult_description", read=read_last_text),
+        Field(label="Trudność dojścia:", name="last_mile_difficulty_numeric", read=read_image_src, convert=parse_image_rating),
+        Field(label="Trudność dojścia:", name="last_mile_difficulty_text", read=read_image_alt),
+        Field(label="Trudność dojścia:", name="last_mile_difficulty_description", read=read_last_text),
+        Field(label="Subiektywna ocena:", name="rating_numeric", read=read_image_src, convert=parse_image_rating),
+        Field(label="Subiektywna ocena:", name="rating_text", read=read_image_alt),
+        Field(label="Subiektywna ocena:", name="rating_description", read=read_last_text),
+    ],
+)
+
+
+def to_feature(row: CastleInfo) -> dict | None:
+    if row.longitude and row.latitude:
+        return dict(
+            type="Feature",
+            properties={
+                "nazwa": row.name,
+                "url": row.url,
+                "stan_tekst": row.state_text,
+                "stan_opis": row.state_description,
+                "wstep": row.entry,
+                "parking": row.parking,
+                "trudnosc_odnalezienia_skala": row.finding_difficulty_numeric,
+                "trudnosc_odnalezienia_tekst": row.finding_difficult_text,
+                "trudnosc_odnalezienia_opis": row.finding_difficult_description,
+                "trudnosc_dojscia_skala": row.last_mile_difficulty_numeric,
+                "trudnosc_dojscia_tekst": row.last_mile_difficulty_text,
+                "trudnosc_dojscia_opis": row.last_mile_difficulty_description,
+                "ocena_skala": row.rating_numeric,
+                "ocena_tekst": row.rating_text,
+                "ocena_opis": row.rating_description,
+            },
+            geometry=dict(
+                type="Point",
+                coordinates=[row.longitude, row.latitude],
+            )
+        )
+    print(f"Skipping writing data for castle: {row.name} ({row.url}) due to missing coordinates.")
+    return None
 
 
 def to_geojson(rows: Iterable[CastleInfo]) -> dict:
-    result = {
+    return {
         "type": "FeatureCollection",
-        "features": []
+        "features": [feature for row in rows if (feature := to_feature(row)) is not None]
     }
-    for row in rows:
-        if row.longitude and row.latitude:
-            result["features"].append(dict(
-                type="Feature",
-                properties={
-                    "nazwa": row.name,
-                    "url": row.url,
-                    "stan_tekst": row.state_text,
-                    "stan_opis": row.state_description,
-                    "wstep": row.entry,
-                    "parking": row.parking,
-                    "trudnosc_odnalezienia_skala": row.finding_difficulty_numeric,
-                    "trudnosc_odnalezienia_tekst": row.finding_difficult_text,
-                    "trudnosc_odnalezienia_opis": row.finding_difficult_description,
-                    "trudnosc_dojscia_skala": row.last_mile_difficulty_numeric,
-                    "trudnosc_dojscia_tekst": row.last_mile_difficulty_text,
-                    "trudnosc_dojscia_opis": row.last_mile_difficulty_description,
-                    "ocena_skala": row.rating_numeric,
-                    "ocena_tekst": row.rating_text,
-                    "ocena_opis": row.rating_description,
-                },
-                geometry=dict(
-                    type="Point",
-                    coordinates=[row.longitude, row.latitude],
-                )
-            ))
-        else:
-            print(f"Skipping writing data for castle: {row.name} ({row.url}) due to missing coordinates.")
-    return result
 
 
-def get_list_of_castle_pages() -> list[str]:
-    response = httpx.Client().get(url=URL_LIST)
+async def get_list_of_castle_pages(client: httpx.AsyncClient, journal: CrawlJournal | None = None) -> list[str]:
+    # the whole list is a single page, journalled as offset 0
+    urls = journal.get_listing(0) if journal is not None else None
+    if urls is not None:
+        return urls
+    response = await client.get(url=URL_LIST)
     response.raise_for_status()
-    soup = BeautifulSoup(markup=response.text, features="html.parser")
-    div = soup.find("div", attrs={"class": "srodek-zp-srodek"})
-    assert div is not None
-    anchors = div.find_all("a", recursive=True)
+    with METRICS.time_parse("zamkinet lista"):
+        soup = parse(markup=response.text, class_="srodek-zp-srodek")
+        div = soup.find("div", attrs={"class": "srodek-zp-srodek"})
+        assert div is not None
+        anchors = div.find_all("a", recursive=True)
     assert anchors is not None and len(anchors) > 0
     urls = [a["href"] for a in anchors]
+    if journal is not None:
+        journal.put_listing(0, urls)
     return urls
 
 
-async def get_page_data(client: httpx.AsyncClient, url: str) -> CastleInfo:
-    # temp variables
-    name = None
+def get_description_rows(div: Tag) -> Iterator[LabelledRow]:
+    for row in div.find_all("tr"):
+        label = row.find("td", attrs={"class": "opis1"})
+        image = row.find("td", attrs={"class": "opis2"})
+        description = row.find("td", attrs={"class": "opis3"})
+        assert label is not None
+        assert image is not None
+        assert description is not None
+        yield label.text, [image, description]
+
+
+def parse_page_data(url: str, markup_description: str, markup_location: str) -> CastleInfo:
     latitude = None
     longitude = None
-    state_text = None
-    state_description = None
-    entry = None
-    parking = None
-    finding_difficulty_numeric = None
-    finding_difficulty_text = None
-    finding_difficult_description = None
-    last_mile_difficulty_numeric = None
-    last_mile_difficulty_text = None
-    last_mile_difficulty_description = None
-    rating_numeric = None
-    rating_text = None
-    rating_description = None
-    # ---
-    response_description = await client.get(url=url, params=dict(z=1))
-    response_description.raise_for_status()
-    soup_description = BeautifulSoup(markup=response_description.text, features="html.parser")
+    soup_description = parse(markup=markup_description, class_=["srodek-zp-gorap", "srodek-zp-srodek"])
     title: str = soup_description.find("div", attrs={"class": "srodek-zp-gorap"}).h1.text
     assert title is not None
     name = title
     div_description = soup_description.find("div", attrs={"class": "srodek-zp-srodek"})
     assert div_description is not None
-    for row in div_description.find_all("tr"):
-        col1: str = row.find("td", attrs={"class": "opis1"}).text
-        col2 = row.find("td", attrs={"class": "opis2"}).img
-        col3: str = row.find("td", attrs={"class": "opis3"}).text
-        assert col1 is not None
-        assert col2 is not None
-        assert col3 is not None
-        match col1:
-            case "Stan zachowania:":
-                state_text = col2["alt"]
-                state_description = col3
-            case "Wstęp:":
-                entry = col3
-            case "Parking:":
-                parking = col3
-            case "Trudność odnalezienia:":
-                img_url = col2["src"]
-                img_alt = col2["alt"]
-                finding_difficulty_numeric = float(img_url[-5:-4])
-                finding_difficulty_text = img_alt
-                finding_difficult_description = col3
-            case "Trudność dojścia:":
-                img_url = col2["src"]
-                img_alt = col2["alt"]
-                last_mile_difficulty_numeric = float(img_url[-5:-4])
-                last_mile_difficulty_text = img_alt
-                last_mile_difficulty_description = col3
-            case "Subiektywna ocena:":
-                img_url = col2["src"]
-                img_alt = col2["alt"]
-                rating_numeric = float(img_url[-5:-4])
-                rating_text =img_alt
-                rating_description = col3
-    response_location = await client.get(url=url, params=dict(z=2))
-    response_location.raise_for_status()
-    soup_location = BeautifulSoup(markup=response_location.text, features="html.parser")
+    # rows missing from the page leave their fields None
+    values = dict.fromkeys(DESCRIPTION_EXTRACTOR.names) | DESCRIPTION_EXTRACTOR.extract(get_description_rows(div_description))
+    soup_location = parse(markup=markup_location, id="licznik")
     div = soup_location.find(id="licznik")
     if div is not None:
         coordinates = div.text
@@ -169,48 +196,178 @@ async def get_page_data(client: httpx.AsyncClient, url: str) -> CastleInfo:
     else:
         print(f"Coordinates not found for castle: {name} at: {url}")
 
-    return CastleInfo(
-        name=name,
-        latitude=latitude,
-        longitude=longitude,
-        url=url,
-        state_text=state_text,
-        state_description=state_description,
-        entry=entry,
-        parking=parking,
-        finding_difficulty_numeric=finding_difficulty_numeric,
-        finding_difficult_text=finding_difficulty_text,
-        finding_difficult_description=finding_difficult_description,
-        last_mile_difficulty_numeric=last_mile_difficulty_numeric,
-        last_mile_difficulty_text=last_mile_difficulty_text,
-        last_mile_difficulty_description=last_mile_difficulty_description,
-        rating_numeric=rating_numeric,
-        rating_text=rating_text,
-        rating_description=rating_description,
+    return CastleInfo(name=name, latitude=latitude, longitude=longitude, url=url, **values)
+
+
+async def get_page_data(client: httpx.AsyncClient, url: str, pool: ParserPool | None = None) -> CastleInfo:
+    # the description and the location are independent, so they are fetched side by side
+    response_description, response_location = await asyncio.gather(
+        client.get(url=url, params=dict(z=1)),
+        client.get(url=url, params=dict(z=2)),
     )
+    response_description.raise_for_status()
+    response_location.raise_for_status()
+    with METRICS.time_parse("zamkinet strona"):
+        if pool is None:
+            return parse_page_data(url=url, markup_description=response_description.text, markup_location=response_location.text)
+        return await pool.run(parse_page_data, url, response_description.text, response_location.text)
 
 
-async def get_pages_data(urls: Iterable[str]) -> list[CastleInfo]:
-    limits = httpx.Limits(
-        max_connections=2,
-        max_keepalive_connections=1,
+def get_limits(workers: int) -> httpx.Limits:
+    # ceiling for rate_control, which starts at 2 in flight, every castle has two pages in flight
+    return httpx.Limits(
+        max_connections=2 * workers,
+        max_keepalive_connections=2 * workers,
         keepalive_expiry=5,
     )
-    async with httpx.AsyncClient(timeout=60.0, limits=limits) as client:
-        futures = [get_page_data(client=client, url=url) for url in urls]
-        results = await asyncio.gather(*futures)
+
+
+async def get_page_data_worker(
+    client: httpx.AsyncClient,
+    queue: asyncio.Queue[str | None],
+    results: asyncio.Queue[CastleInfo | None],
+    pool: ParserPool,
+    journal: CrawlJournal | None,
+) -> None:
+    while True:
+        url = queue.get_nowait()
+        if url is None:
+            # tells iter_pages_data this worker is done
+            await results.put(None)
+            return
+        result = journal.get_record(CastleInfo, url) if journal is not None else None
+        if result is None:
+            result = await get_page_data(client=client, url=url, pool=pool)
+            if journal is not None:
+                journal.put_record(url, result)
+        # blocks while the consumer is busy, so finished pages do not pile up
+        await results.put(result)
+
+
+async def iter_pages_data(
+    urls: Iterable[str] | None = None,
+    workers: int = PAGE_WORKERS,
+    parse_workers: int = PARSE_WORKERS,
+    journal: CrawlJournal | None = None,
+    clients: ClientPool | None = None,
+) -> AsyncIterator[CastleInfo]:
+    """
+    Data of the castle pages at urls (of every page in the alphabetical list when urls is None)
+    in the order they finish, with at most workers castles in flight.
+    """
+    with ParserPool(workers=parse_workers) as pool:
+        async with use_client(clients=clients, host=HOST, limits=get_limits(workers), timeout=60.0) as client:
+            if urls is None:
+                urls = await get_list_of_castle_pages(client=client, journal=journal)
+                print(f"Found {len(urls)} pages to scrape.")
+            queue: asyncio.Queue[str | None] = asyncio.Queue()
+            for url in urls:
+                queue.put_nowait(url)
+            for _ in range(workers):
+                queue.put_nowait(None)
+            results: asyncio.Queue[CastleInfo | None] = asyncio.Queue(maxsize=workers)
+            METRICS.watch_queue("zamkinet", results)
+            async with asyncio.TaskGroup() as tg:
+                for _ in range(workers):
+                    tg.create_task(get_page_data_worker(client=client, queue=queue, results=results, pool=pool, journal=journal))
+                running = workers
+                while running:
+                    result = await results.get()
+                    if result is None:
+                        running -= 1
+                        continue
+                    METRICS.record_row()
+                    yield result
+
+
+async def get_pages_data(
+    urls: Iterable[str] | None = None,
+    workers: int = PAGE_WORKERS,
+    parse_workers: int = PARSE_WORKERS,
+    on_row: Callable[[CastleInfo], None] | None = None,
+    journal: CrawlJournal | None = None,
+    clients: ClientPool | None = None,
+) -> list[CastleInfo] | int:
+    """
+    All of iter_pages_data as a list in the order of urls, of the alphabetical list when urls is None,
+    or with on_row the number of rows passed to it as they come.
+    """
+    async with ClientPool() if clients is None else nullcontext(clients) as clients:
+        if urls is None:
+            async with use_client(clients=clients, host=HOST, limits=get_limits(workers), timeout=60.0) as client:
+                urls = await get_list_of_castle_pages(client=client, journal=journal)
+            print(f"Found {len(urls)} pages to scrape.")
+        urls = list(urls)
+        results = []
+        count = 0
+        async for result in iter_pages_data(urls=urls, workers=workers, parse_workers=parse_workers, journal=journal, clients=clients):
+            count += 1
+            if on_row is not None:
+                on_row(result)
+            else:
+                results.append(result)
+    if on_row is not None:
+        return count
+    order = {url: i for i, url in enumerate(urls)}
+    results.sort(key=lambda row: order[row.url])
     return results
 
 
+async def write_pages_data(
+    writer: FeatureWriter,
+    store: RecordStore | None = None,
+    workers: int = PAGE_WORKERS,
+    parse_workers: int = PARSE_WORKERS,
+    journal: CrawlJournal | None = None,
+) -> None:
+    """Writes every castle page as it finishes, also to store when given."""
+    async for row in iter_pages_data(workers=workers, parse_workers=parse_workers, journal=journal):
+        feature = to_feature(row)
+        writer.write(feature)
+        if store is not None:
+            store.append(feature)
+
+
 def main() -> None:
+    parser = argparse.ArgumentParser()
+    add_common_arguments(parser, workers=DEFAULT_WORKERS, zamkisp_pl=False)
+    args = parser.parse_args()
+    apply_common_arguments(args)
     print("Hello from zamkinet.py!")
-    pages_urls = get_list_of_castle_pages()
-    print(f"Found {len(pages_urls)} pages to scrape.")
-    data = asyncio.run(get_pages_data(urls=pages_urls))
-    print("writing data to geojson file.")
-    geojson_dict = to_geojson(data)
-    with open(f"zamkinet_{date.today().isoformat()}.geojson", "w", encoding="utf-8") as f:
-        json.dump(geojson_dict, f, indent=2)
+    output_path = Path(f"zamkinet_{date.today().isoformat()}{FORMATS[args.format]}")
+    # sequence formats are written as the pages arrive, a FeatureCollection at the end in list order
+    streaming = args.format != "geojson"
+    # only the columnar exports are built from the store, it is filled only when one is requested
+    store = RecordStore(column_types=COLUMN_TYPES)
+    # rows taken from the journal are written again, so the output is complete after a resume
+    with CrawlJournal(path=JOURNAL_DIR / "zamkinet.journal.sqlite", resume=args.resume) as journal:
+        with FeatureWriter(path=output_path, format=args.format) as writer, METRICS.progress(args.progress):
+            if streaming:
+                asyncio.run(
+                    write_pages_data(
+                        writer=writer,
+                        store=store if args.export else None,
+                        workers=args.workers,
+                        parse_workers=args.parse_workers,
+                        journal=journal,
+                    )
+                )
+            else:
+                data = asyncio.run(get_pages_data(workers=args.workers, parse_workers=args.parse_workers, journal=journal))
+                print("writing data to geojson file.")
+                for row in data:
+                    feature = to_feature(row)
+                    writer.write(feature)
+                    if args.export:
+                        store.append(feature)
+                # the FeatureCollection needed the rows in list order, the export only needs the columns
+                data.clear()
+    if streaming and args.wrap:
+        wrap_feature_collection(path=output_path, output_path=output_path.with_suffix(".geojson"))
+    if args.export:
+        # rows without coordinates were already reported while writing, to_feature left them out
+        export(store=store, path=output_path, formats=args.export)
+    METRICS.write_summary(output_path.with_suffix(".metrics.json"))
     print("Done.")
 
 
@@ -3,25 +3,61 @@
 # dependencies = [
 #     "beautifulsoup4>=4.14.3",
 #     "httpx>=0.28.1",
+#     "lxml>=6.0.2",
+#     "pyarrow>=22.0.0",
+#     "pyogrio>=0.11.1",
 # ]
 # [tool.uv]
 # exclude-newer = "2026-02-04T00:00:00Z"
 # ///
 
+import argparse
 import asyncio
-from collections.abc import Iterable
+from collections.abc import Callable, Iterable
 from datetime import date
-import json
+from pathlib import Path
 import httpx
-from bs4 import BeautifulSoup
 
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 
+from dictionary_cache import get_cached_dictionaries
+from http_client import ClientPool, use_client
+from extraction import Field, FieldExtractor, get_labelled_rows, parse_sp_date, read_textarea
+from parsing import parse
+from parser_pool import PARSE_WORKERS, ParserPool
+from sinks import FORMATS, FeatureWriter, wrap_feature_collection
+from geoexport import export
+from record_store import RecordStore
+from journal import JOURNAL_DIR, CrawlJournal
+from metrics import METRICS
+from cli import add_common_arguments, apply_common_arguments
+from pagination import PAGE_SIZE, get_all_listing_rows, get_listing_rows, get_main_section, get_page
+from snapshot import REFRESH_DAYS, Snapshot, is_due_for_refresh, load_snapshot, parse_date
 
+
+HOST = "zamkisp.pl"
 URL_LISTA_TEMPLATE = "https://zamkisp.pl/index.php?option=com_zamki&view=zamki&Itemid=63&limitstart={limitstart}"
 URL_POWIATY_TEMPLATE = "https://zamkisp.pl/index.php?option=com_powiaty&view=powiaty&Itemid=53&limitstart={limitstart}"
 URL_GMINY_TEMPLATE = "https://zamkisp.pl/index.php?option=com_gminy&view=gminy&Itemid=62&limitstart={limitstart}"
 
+# most detail pages fetched concurrently, rate_control starts lower and grows while the server keeps up
+DETAILS_WORKERS = 8
+# --workers of this script, and of this source in crawl.py
+DEFAULT_WORKERS = DETAILS_WORKERS
+# how many listing rows may wait for the workers before listing pages stop being fetched
+DETAILS_QUEUE_SIZE = 200
+
+DETAILS_EXTRACTOR = FieldExtractor(
+    source="zamkisp",
+    fields=[
+        Field(label="Opis:", name="opis", read=read_textarea),
+        Field(label="(5x.xxxxx):", name="szerokosc_geo", convert=float),
+        Field(label="(1x.xxxx):", name="dlugosc_geo", convert=float),
+        Field(label="Data wprowadzenia:", name="data_wprowadzenia", convert=parse_sp_date),
+        Field(label="Aktualizacja danych:", name="data_aktualizacji", convert=parse_sp_date),
+    ],
+)
+
 DICT_WOJEWODZTWA = {
     "B": "lubuskie",
     "C": "łódzkie",
@@ -49,6 +85,18 @@ DICT_TYP = {
 }
 
 
+# property types of the columnar exports, everything else is a string
+COLUMN_TYPES = {
+    "wojewodztwo": "category",
+    "powiat": "category",
+    "gmina": "category",
+    "typ_oryginalny": "category",
+    "typ_interpretowany": "category",
+    "data_wprowadzenia": "date",
+    "data_aktualizacji": "date",
+}
+
+
 @dataclass(frozen=True, slots=True, kw_only=True)
 class CastleListRow:
     wojewodztwo: str
@@ -66,6 +114,17 @@ class CastleListRow:
     url: str
 
 
+@dataclass(frozen=True, slots=True, kw_only=True)
+class CastleListEntry:
+    kod_woj: str
+    kod_pow: str
+    kod_gmi: str
+    zamek_id: str
+    nazwa: str
+    typ_oryginalny: str
+    url: str
+
+
 @dataclass(frozen=True, slots=True, kw_only=True)
 class CastleListRowDetails:
     opis: str
@@ -76,250 +135,363 @@ class CastleListRowDetails:
     url: str
 
 
+def to_feature(row: CastleListRow) -> dict:
+    return dict(
+        type="Feature",
+        properties={
+            "wojewodztwo": row.wojewodztwo,
+            "powiat": row.powiat,
+            "gmina": row.gmina,
+            "zamek_id": row.zamek_id,
+            "nazwa": row.nazwa,
+            "typ_oryginalny": row.typ_oryginalny,
+            "typ_interpretowany": row.typ_interpretowany,
+            "data_wprowadzenia": row.data_wprowadzenia.isoformat() if row.data_wprowadzenia else None,
+            "data_aktualizacji": row.data_aktualizacji.isoformat() if row.data_aktualizacji else None,
+            "opis": row.opis,
+            "url": row.url,
+        },
+        geometry=dict(
+            type="Point",
+            coordinates=[row.dlugosc_geo, row.szerokosc_geo],
+        )
+    )
+
+
 def to_geojson(rows: Iterable[CastleListRow]) -> dict:
-    result = {
+    return {
         "type": "FeatureCollection",
-        "features": []
+        "features": [to_feature(row) for row in rows]
     }
-    for row in rows:
-        result["features"].append(dict(
-            type="Feature",
-            properties={
-                "wojewodztwo": row.wojewodztwo,
-                "powiat": row.powiat,
-                "gmina": row.gmina,
-                "zamek_id": row.zamek_id,
-                "nazwa": row.nazwa,
-                "typ_oryginalny": row.typ_oryginalny,
-                "typ_interpretowany": row.typ_interpretowany,
-                "data_wprowadzenia": row.data_wprowadzenia.isoformat() if row.data_wprowadzenia else None,
-                "data_aktualizacji": row.data_aktualizacji.isoformat() if row.data_aktualizacji else None,
-                "opis": row.opis,
-                "url": row.url,
-            },
-            geometry=dict(
-                type="Point",
-                coordinates=[row.dlugosc_geo, row.szerokosc_geo],
-            )
-        ))
-    return result
 
 
-async def get_details(client: httpx.AsyncClient, url: str) -> CastleListRowDetails:
-    response = await client.get(url)
-    response.raise_for_status()
-    soup = BeautifulSoup(markup=response.text, features="html.parser")
+def parse_details(markup: str, url: str) -> CastleListRowDetails:
+    soup = parse(markup=markup, id="main_full")
     main_section = soup.find(id="main_full")
     tables = main_section.find_all("table")
     if len(tables) < 1:
         raise Exception("Expected at least one table in HTML.")
-    opis = ""
-    szerokosc_geo = None
-    dlugosc_geo = None
-    data_wprowadzenia = None
-    data_aktualizacji = None
-    # html is broken and missing tbody
-    for row in tables[0].find_all("tr"):
-        cells = list(row.find_all("td"))
-        if len(cells) > 2:
-            if "Opis:" in cells[1].text:
-                opis = cells[2].textarea.text.strip()
-            elif "(5x.xxxxx):" in cells[1].text:
-                szerokosc_geo = float(cells[2].text.strip())
-            elif "(1x.xxxx):" in cells[1].text:
-                dlugosc_geo = float(cells[2].text.strip())
-            elif "Data wprowadzenia:" in cells[1].text:
-                val = cells[2].text.strip()
-                if val != "0000-00-00":
-                    data_wprowadzenia = date.fromisoformat(val)
-                else:
-                    data_wprowadzenia = None
-            elif "Aktualizacja danych:" in cells[1].text:
-                val = cells[2].text.strip()
-                if val != "0000-00-00":
-                    data_aktualizacji = date.fromisoformat(val)
-                else:
-                    data_aktualizacji = None
+    # rows missing from the page leave their field None, the description empty
+    values = dict.fromkeys(DETAILS_EXTRACTOR.names) | dict(opis="") | DETAILS_EXTRACTOR.extract(get_labelled_rows(tables[0]))
+    return CastleListRowDetails(**values, url=url)
+
+
+async def get_details(client: httpx.AsyncClient, url: str, pool: ParserPool | None = None) -> CastleListRowDetails:
+    response = await client.get(url)
+    response.raise_for_status()
+    with METRICS.time_parse("zamkisp szczegóły"):
+        if pool is None:
+            return parse_details(markup=response.text, url=url)
+        return await pool.run(parse_details, response.text, url)
+
+
+def get_details_from_snapshot(entry: CastleListEntry, snapshot: Snapshot, refresh_days: int) -> CastleListRowDetails | None:
+    """Details carried forward from the previous output, None when the detail page has to be fetched again."""
+    feature = snapshot.get(id=entry.zamek_id, url=entry.url)
+    if feature is None or is_due_for_refresh(
+        feature=feature,
+        key=entry.url,
+        snapshot_date=snapshot.snapshot_date,
+        refresh_days=refresh_days,
+    ):
+        return None
+    properties = feature["properties"]
+    if properties["nazwa"] != entry.nazwa or properties["typ_oryginalny"] != entry.typ_oryginalny:
+        return None
+    dlugosc_geo, szerokosc_geo = feature["geometry"]["coordinates"]
     return CastleListRowDetails(
-        opis=opis,
+        opis=properties["opis"],
         szerokosc_geo=szerokosc_geo,
         dlugosc_geo=dlugosc_geo,
-        data_wprowadzenia=data_wprowadzenia,
-        data_aktualizacji=data_aktualizacji,
-        url=url,
+        data_wprowadzenia=parse_date(properties["data_wprowadzenia"]),
+        data_aktualizacji=parse_date(properties["data_aktualizacji"]),
+        url=entry.url,
     )
 
 
-async def get_castles(county_dict: dict[tuple[str, str], str], municipality_dict: dict[tuple[str, str, str], str]) -> list[CastleListRow]:
-    results = []
-    keep_running = True
+async def get_details_worker(
+    client: httpx.AsyncClient,
+    queue: asyncio.Queue[CastleListEntry | None],
+    dictionaries: asyncio.Task[tuple[dict[tuple[str, str], str], dict[tuple[str, str, str], str]]],
+    results: list[CastleListRow] | None,
+    snapshot: Snapshot | None,
+    refresh_days: int,
+    pool: ParserPool,
+    on_row: Callable[[CastleListRow], None] | None,
+    journal: CrawlJournal | None,
+) -> int:
+    """Rows of the queued entries, to results or else to on_row. Returns their number."""
+    count = 0
+    while True:
+        entry = await queue.get()
+        try:
+            if entry is None:
+                return count
+            row = journal.get_record(CastleListRow, entry.url) if journal is not None else None
+            if row is None:
+                details = None
+                if snapshot is not None:
+                    details = get_details_from_snapshot(entry=entry, snapshot=snapshot, refresh_days=refresh_days)
+                if details is None:
+                    details = await get_details(client=client, url=entry.url, pool=pool)
+                county_dict, municipality_dict = await dictionaries
+                row = CastleListRow(
+                    wojewodztwo=DICT_WOJEWODZTWA.get(entry.kod_woj),
+                    powiat=county_dict.get((entry.kod_woj, entry.kod_pow)),
+                    gmina=municipality_dict.get((entry.kod_woj, entry.kod_pow, entry.kod_gmi)),
+                    zamek_id=entry.zamek_id,
+                    nazwa=entry.nazwa,
+                    typ_oryginalny=entry.typ_oryginalny,
+                    typ_interpretowany=DICT_TYP.get(entry.typ_oryginalny),
+                    szerokosc_geo=details.szerokosc_geo,
+                    dlugosc_geo=details.dlugosc_geo,
+                    data_wprowadzenia=details.data_wprowadzenia,
+                    data_aktualizacji=details.data_aktualizacji,
+                    opis=details.opis,
+                    url=details.url,
+                )
+                if journal is not None:
+                    journal.put_record(entry.url, row)
+            count += 1
+            METRICS.record_row()
+            if on_row is not None:
+                on_row(row)
+            else:
+                results.append(row)
+        finally:
+            queue.task_done()
+
+
+def parse_castle_list_entries(markup: str) -> list[CastleListEntry]:
+    entries = []
+    for row in get_listing_rows(get_main_section(markup=markup, container_id="main_full")):
+        kod_woj = ""
+        kod_pow = ""
+        zamek_id = ""
+        nazwa = ""
+        kod_gmi = ""
+        typ_oryginalny = ""
+        for i, val in enumerate(row.select("td")):
+            match i:
+                case 0:
+                    pass
+                case 1:
+                    kod_woj = val.text.strip()
+                case 2:
+                    kod_pow = val.text.strip()
+                case 3:
+                    zamek_id = val.text.strip()
+                case 4:
+                    nazwa = val.text.strip()
+                case 5:
+                    kod_gmi = val.text.strip()
+                case 6:
+                    pass
+                case 7:
+                    typ_oryginalny = val.text.strip()
+                case 8:
+                    entries.append(
+                        CastleListEntry(
+                            kod_woj=kod_woj,
+                            kod_pow=kod_pow,
+                            kod_gmi=kod_gmi,
+                            zamek_id=zamek_id,
+                            nazwa=nazwa,
+                            typ_oryginalny=typ_oryginalny,
+                            url="https://zamkisp.pl" + val.find("a").get("href"),
+                        )
+                    )
+    return entries
+
+
+async def get_castle_list_entries(
+    client: httpx.AsyncClient,
+    queue: asyncio.Queue[CastleListEntry | None],
+    journal: CrawlJournal | None = None,
+) -> None:
     offset = 0
-    step = 100
+    step = PAGE_SIZE
+    while True:
+        journalled = journal.get_listing(offset) if journal is not None else None
+        if journalled is not None:
+            entries = [CastleListEntry(**entry) for entry in journalled]
+        else:
+            markup = await get_page(client=client, url_template=URL_LISTA_TEMPLATE, offset=offset, label="get_castles")
+            with METRICS.time_parse("zamkisp lista"):
+                entries = parse_castle_list_entries(markup)
+            if journal is not None:
+                journal.put_listing(offset, [asdict(entry) for entry in entries])
+        if len(entries) == 0:
+            break
+        for entry in entries:
+            # blocks when the workers fall behind, so listing pages are not fetched too far ahead
+            await queue.put(entry)
+        offset += step
+
+
+async def get_castles(
+    workers: int = DETAILS_WORKERS,
+    snapshot: Snapshot | None = None,
+    refresh_days: int = REFRESH_DAYS,
+    parse_workers: int = PARSE_WORKERS,
+    on_row: Callable[[CastleListRow], None] | None = None,
+    journal: CrawlJournal | None = None,
+    clients: ClientPool | None = None,
+) -> list[CastleListRow] | int:
+    """The castles in zamek_id order, or with on_row the number of rows passed to it as they come."""
+    results = [] if on_row is None else None
+    queue: asyncio.Queue[CastleListEntry | None] = asyncio.Queue(maxsize=DETAILS_QUEUE_SIZE)
+    METRICS.watch_queue("zamkisp", queue)
     limits = httpx.Limits(
-        max_connections=3,
-        max_keepalive_connections=1,
+        max_connections=workers,
+        max_keepalive_connections=workers,
     )
-    async with httpx.AsyncClient(limits=limits) as client:
-        while keep_running:
-            url = URL_LISTA_TEMPLATE.format(limitstart=offset)
-            response = await client.get(url=url)
-            response.raise_for_status()
-            print(f"get_castles() - offset: {offset} - Response status: {response.status_code} - url: {url}")
-            soup = BeautifulSoup(markup=response.text, features="html.parser")
-            main_section = soup.find(id="main_full")
-            tables = main_section.find_all("table")
-            if len(tables) < 2:
-                raise Exception("Expected at least two tables in HTML.")
-            # html is broken and missing tbody
-            if len(tables[1].find_all("tr", recursive=False)) == 0:
-                keep_running = False
-                break
-            for row in tables[1].find_all("tr", recursive=False):
-                kod_woj = ""
-                kod_pow = ""
-                zamek_id = ""
-                nazwa = ""
-                kod_gmi = ""
-                typ_oryginalny = ""
-                for i, val in enumerate(row.select("td")):
-                    match i:
-                        case 0:
-                            pass
-                        case 1:
-                            kod_woj = val.text.strip()
-                        case 2:
-                            kod_pow = val.text.strip()
-                        case 3:
-                            zamek_id = val.text.strip()
-                        case 4:
-                            nazwa = val.text.strip()
-                        case 5:
-                            kod_gmi = val.text.strip()
-                        case 6:
-                            pass
-                        case 7:
-                            typ_oryginalny = val.text.strip()
-                        case 8:
-                            url = "https://zamkisp.pl" + val.find("a").get("href")
-                            details = await get_details(client=client, url=url)
-                            woj = DICT_WOJEWODZTWA.get(kod_woj)
-                            pow = county_dict.get((kod_woj, kod_pow))
-                            gmi = municipality_dict.get((kod_woj, kod_pow, kod_gmi))
-                            typ_interpretowany = DICT_TYP.get(typ_oryginalny)
-                            results.append(
-                                CastleListRow(
-                                    wojewodztwo=woj,
-                                    powiat=pow,
-                                    gmina=gmi,
-                                    zamek_id=zamek_id,
-                                    nazwa=nazwa,
-                                    typ_oryginalny=typ_oryginalny,
-                                    typ_interpretowany=typ_interpretowany,
-                                    szerokosc_geo=details.szerokosc_geo,
-                                    dlugosc_geo=details.dlugosc_geo,
-                                    data_wprowadzenia=details.data_wprowadzenia,
-                                    data_aktualizacji=details.data_aktualizacji,
-                                    opis=details.opis,
-                                    url=details.url,
-                                )
-                            )
-            offset += step
+    with ParserPool(workers=parse_workers) as pool:
+        async with use_client(clients=clients, host=HOST, limits=limits) as client:
+            async with asyncio.TaskGroup() as tg:
+                # dictionaries are only needed to name the rows, so they load alongside the first listing pages
+                dictionaries = tg.create_task(get_dictionaries(client=client))
+                details_workers = [
+                    tg.create_task(
+                        get_details_worker(
+                            client=client,
+                            queue=queue,
+                            dictionaries=dictionaries,
+                            results=results,
+                            snapshot=snapshot,
+                            refresh_days=refresh_days,
+                            pool=pool,
+                            on_row=on_row,
+                            journal=journal,
+                        )
+                    )
+                    for _ in range(workers)
+                ]
+                await get_castle_list_entries(client=client, queue=queue, journal=journal)
+                for _ in range(workers):
+                    await queue.put(None)
+    if results is None:
+        return sum(worker.result() for worker in details_workers)
+    # workers finish in arbitrary order
+    results.sort(key=lambda row: row.zamek_id)
     return results
 
 
-def get_counties() -> dict[tuple[str, str], str]:
+async def get_counties(client: httpx.AsyncClient) -> dict[tuple[str, str], str]:
     results = {}
-    keep_running = True
-    offset = 0
-    step = 100
-    with httpx.Client() as client:
-        while keep_running:
-            url = URL_POWIATY_TEMPLATE.format(limitstart=offset)
-            response = client.get(url=url)
-            response.raise_for_status()
-            print(f"get_counties() - offset: {offset} - Response status: {response.status_code} - url: {url}")
-            soup = BeautifulSoup(markup=response.text, features="html.parser")
-            main_section = soup.find(id="main_full")
-            tables = main_section.find_all("table")
-            if len(tables) < 2:
-                raise Exception("Expected at least two tables in HTML.")
-            # html is broken and missing tbody
-            if len(tables[1].find_all("tr", recursive=False)) == 0:
-                keep_running = False
-                break
-            for row in tables[1].find_all("tr", recursive=False):
-                kod_woj = ""
-                kod_pow = ""
-                nazwa = ""
-                for i, val in enumerate(row.select("td")):
-                    match i:
-                        case 0:
-                            pass
-                        case 1:
-                            kod_woj = val.text.strip()
-                        case 2:
-                            kod_pow = val.text.strip()
-                        case 3:
-                            nazwa = val.text.strip()
-                if kod_woj and kod_pow:
-                    results[(kod_woj, kod_pow)] = nazwa
-            offset += step
+    rows = await get_all_listing_rows(
+        client=client,
+        url_template=URL_POWIATY_TEMPLATE,
+        container_id="main_full",
+        label="get_counties",
+    )
+    for row in rows:
+        kod_woj = ""
+        kod_pow = ""
+        nazwa = ""
+        for i, val in enumerate(row.select("td")):
+            match i:
+                case 0:
+                    pass
+                case 1:
+                    kod_woj = val.text.strip()
+                case 2:
+                    kod_pow = val.text.strip()
+                case 3:
+                    nazwa = val.text.strip()
+        if kod_woj and kod_pow:
+            results[(kod_woj, kod_pow)] = nazwa
     return results
 
 
-def get_municipalities() -> dict[tuple[str, str, str], str]:
+async def get_municipalities(client: httpx.AsyncClient) -> dict[tuple[str, str, str], str]:
     results = {}
-    keep_running = True
-    offset = 0
-    step = 100
-    with httpx.Client() as client:
-        while keep_running:
-            url = URL_GMINY_TEMPLATE.format(limitstart=offset)
-            response = client.get(url=url)
-            response.raise_for_status()
-            print(f"get_municipalities() - offset: {offset} - Response status: {response.status_code} - url: {url}")
-            soup = BeautifulSoup(markup=response.text, features="html.parser")
-            main_section = soup.find(id="main_full")
-            tables = main_section.find_all("table")
-            if len(tables) < 2:
-                raise Exception("Expected at least two tables in HTML.")
-            # html is broken and missing tbody
-            if len(tables[1].find_all("tr", recursive=False)) == 0:
-                keep_running = False
-                break
-            for row in tables[1].find_all("tr", recursive=False):
-                kod_woj = ""
-                kod_pow = ""
-                kod_gmi = ""
-                nazwa = ""
-                for i, val in enumerate(row.select("td")):
-                    match i:
-                        case 0:
-                            pass
-                        case 1:
-                            kod_woj = val.text.strip()
-                        case 2:
-                            kod_pow = val.text.strip()
-                        case 3:
-                            kod_gmi = val.text.strip()
-                        case 4:
-                            nazwa = val.text.strip()
-                if kod_woj and kod_pow:
-                    results[(kod_woj, kod_pow, kod_gmi)] = nazwa
-            offset += step
+    rows = await get_all_listing_rows(
+        client=client,
+        url_template=URL_GMINY_TEMPLATE,
+        container_id="main_full",
+        label="get_municipalities",
+    )
+    for row in rows:
+        kod_woj = ""
+        kod_pow = ""
+        kod_gmi = ""
+        nazwa = ""
+        for i, val in enumerate(row.select("td")):
+            match i:
+                case 0:
+                    pass
+                case 1:
+                    kod_woj = val.text.strip()
+                case 2:
+                    kod_pow = val.text.strip()
+                case 3:
+                    kod_gmi = val.text.strip()
+                case 4:
+                    nazwa = val.text.strip()
+        if kod_woj and kod_pow:
+            results[(kod_woj, kod_pow, kod_gmi)] = nazwa
     return results
 
 
-def main() -> None:
-    print("Hello from zawody.py!")
-    county_dict = get_counties()
+async def fetch_dictionaries(client: httpx.AsyncClient) -> tuple[dict[tuple[str, str], str], dict[tuple[str, str, str], str]]:
+    county_dict, municipality_dict = await asyncio.gather(
+        get_counties(client=client),
+        get_municipalities(client=client),
+    )
+    return county_dict, municipality_dict
+
+
+async def get_dictionaries(client: httpx.AsyncClient) -> tuple[dict[tuple[str, str], str], dict[tuple[str, str, str], str]]:
+    county_dict, municipality_dict = await get_cached_dictionaries(source="zamkisp", fetch=lambda: fetch_dictionaries(client=client))
     print(f"Utworzono słownik powiatów ({len(county_dict)} rekordów).")
-    municipality_dict = get_municipalities()
     print(f"Utworzono słownik gmin ({len(municipality_dict)} rekordów).")
-    data = asyncio.run(get_castles(county_dict=county_dict, municipality_dict=municipality_dict))
-    geojson_dict = to_geojson(data)
-    with open(f"zamkisp_{date.today().isoformat()}.geojson", "w", encoding="utf-8") as f:
-        json.dump(geojson_dict, f, indent=2)
+    return county_dict, municipality_dict
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    add_common_arguments(parser, workers=DEFAULT_WORKERS)
+    parser.add_argument("--since", type=Path, help="previous output, unchanged entries are carried forward from it")
+    args = parser.parse_args()
+    apply_common_arguments(args)
+    print("Hello from zawody.py!")
+    snapshot = load_snapshot(path=args.since, id_property="zamek_id") if args.since else None
+    output_path = Path(f"zamkisp_{date.today().isoformat()}{FORMATS[args.format]}")
+    # sequence formats are written as the rows arrive, a FeatureCollection at the end in zamek_id order
+    streaming = args.format != "geojson"
+    # only the columnar exports are built from the store, it is filled only when one is requested
+    store = RecordStore(column_types=COLUMN_TYPES)
+
+    def write_row(writer: FeatureWriter, row: CastleListRow) -> None:
+        feature = to_feature(row)
+        writer.write(feature)
+        if args.export:
+            store.append(feature)
+
+    # rows taken from the journal go through on_row again, so the output is complete after a resume
+    with CrawlJournal(path=JOURNAL_DIR / "zamkisp.journal.sqlite", resume=args.resume) as journal:
+        with FeatureWriter(path=output_path, format=args.format) as writer, METRICS.progress(args.progress):
+            data = asyncio.run(
+                get_castles(
+                    workers=args.workers,
+                    snapshot=snapshot,
+                    refresh_days=args.refresh_days,
+                    parse_workers=args.parse_workers,
+                    on_row=(lambda row: write_row(writer, row)) if streaming else None,
+                    journal=journal,
+                )
+            )
+            if not streaming:
+                for row in data:
+                    write_row(writer, row)
+                # the FeatureCollection needed the rows sorted, the export only needs the columns
+                data.clear()
+    if streaming and args.wrap:
+        wrap_feature_collection(path=output_path, output_path=output_path.with_suffix(".geojson"))
+    if args.export:
+        export(store=store, path=output_path, formats=args.export)
+    METRICS.write_summary(output_path.with_suffix(".metrics.json"))
     print("Done.")
 
 